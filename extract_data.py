@@ -353,36 +353,19 @@ def load_database(database_file):
 
 def check_game_running():
     """Verifica si el juego está en ejecución"""
-    # Lista de posibles procesos del juego en Windows
-    game_processes = ["isaac-ng.exe", "isaac.exe", "Rebirth.exe", "Afterbirth.exe", "AfterbirthPlus.exe", "RepentanceDX11.exe", "RepentanceDX9.exe"]
+    # Usar el monitor de procesos del servidor (lee /proc o la API de Win32, sin subprocesos)
+    server_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server")
+    if server_dir not in sys.path:
+        sys.path.insert(0, server_dir)
     
     try:
-        import subprocess
-        
-        # Intentar con wmic
-        try:
-            process_list = subprocess.run(['wmic', 'process', 'get', 'name'], 
-                                         capture_output=True, text=True, encoding='cp850')
-            
-            process_output = process_list.stdout.lower()
-            
-            for process in game_processes:
-                if process.lower() in process_output:
-                    logger.info(f"Juego detectado: {process}")
-                    return True
-        except:
-            # Intentar con tasklist como plan B
-            for process in game_processes:
-                try:
-                    result = subprocess.run(['tasklist', '/FI', f'IMAGENAME eq {process}'], 
-                                           capture_output=True, text=True, encoding='cp850')
-                    if process in result.stdout:
-                        logger.info(f"Juego detectado con tasklist: {process}")
-                        return True
-                except:
-                    pass
-    except:
-        logger.warning("No se pudo verificar si el juego está en ejecución")
+        import process_monitor
+        running, process = process_monitor.find_game_process()
+        if running:
+            logger.info(f"Juego detectado: {process}")
+            return True
+    except Exception as e:
+        logger.warning(f"No se pudo verificar si el juego está en ejecución: {str(e)}")
     
     logger.info("Juego no detectado en ejecución")
     return False
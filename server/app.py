@@ -4,112 +4,198 @@ Servidor web para visualizar los datos del mod DEM.
 Proporciona visualización en tiempo real, análisis estadístico y preprocesamiento para ML.
 """
 
+# El modo asíncrono (eventlet/gevent) debe aplicarse antes de importar el resto de módulos
+import async_mode
+ASYNC_MODE = async_mode.configure()
+
 import os
 import json
 import time
 import threading
 import hashlib
+import functools
+import base64
+import bisect
 import logging
-import pandas as pd
-import numpy as np
-import matplotlib
-matplotlib.use('Agg')  # Usar backend sin GUI
-import matplotlib.pyplot as plt
 from datetime import datetime
 from collections import Counter, defaultdict
-from flask import Flask, jsonify, render_template, send_from_directory, request, Response
-from flask_socketio import SocketIO
+from flask import Flask, jsonify, render_template, send_from_directory, send_file, request, Response, url_for, g
+from flask_socketio import SocketIO, join_room, leave_room
 import shutil
 import game_manager  # Importar el módulo para gestionar acciones del juego
+import metrics
+import partitions
+import salvage_parser
+import compression
+import topics
+import single_flight
+import scheduler
+import render_service
+import room_heatmaps
+import feature_store
+import dataset_export
+import feature_extraction
+import profiler
+import config_service
+import json_encoding
+import lazy
+import shared_state
+import vision_stream
+import mimetypes
 import subprocess
 import sys
 import math
 
-# Cargar configuración desde config.json
+# Dependencias pesadas: se importan la primera vez que se usan (ver lazy.py)
+numpy_render = lazy.module("numpy_render")
+
+# Configuración de config.json: se valida una vez y se recarga al cambiar el archivo
+# (ver config_service.py). Las peticiones y tareas leen app_config.current; CONFIG es la
+# configuración de arranque, para los valores que solo se aplican al reiniciar.
 CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
 try:
-    with open(CONFIG_FILE, 'r') as f:
-        CONFIG = json.load(f)
-    logging.info(f"Configuración cargada desde {CONFIG_FILE}")
-except Exception as e:
-    logging.error(f"Error al cargar la configuración desde {CONFIG_FILE}: {str(e)}")
-    CONFIG = {}  # Configuración predeterminada
+    app_config = config_service.ConfigService(CONFIG_FILE)
+except config_service.ConfigError as e:
+    sys.exit(f"No se puede arrancar con {CONFIG_FILE}: {str(e)}")
+CONFIG = app_config.current.raw
 
 # Configuración
-DATABASE_FILE = CONFIG.get('database', {}).get('file', "dem_database.json")
 STATIC_FOLDER = "static"
 TEMPLATE_FOLDER = "templates"
 PORT = CONFIG.get('server', {}).get('port', 5000)
-UPDATE_INTERVAL = CONFIG.get('server', {}).get('update_interval', 20)  # segundos entre actualizaciones automáticas
-EMIT_THROTTLE = CONFIG.get('server', {}).get('emit_throttle', 5)       # segundos mínimos entre emisiones a clientes 
-GAME_CHECK_INTERVAL = CONFIG.get('server', {}).get('game_check_interval', 15)  # segundos entre verificaciones de estado del juego
-CAPTURE_FRAME_RATE = CONFIG.get('data_capture', {}).get('frame_rate', 5)  # capturar cada N frames
-CAPTURE_KEY_EVENTS = CONFIG.get('events', {}).get('key_events', {}).get('enabled', True)  # capturar eventos clave
-VERBOSE_LOGGING = CONFIG.get('advanced', {}).get('verbose_logging', True)  # aumentar detalle de logs
+SCHEDULER_MAX_CONCURRENT = CONFIG.get('server', {}).get('scheduler_max_concurrent', scheduler.DEFAULT_MAX_CONCURRENT)
 LOG_FILE = "server.log"
 DATA_DIR = CONFIG.get('paths', {}).get('data_dir', "data")
 PROCESSED_DATA_DIR = CONFIG.get('paths', {}).get('processed_data_dir', "processed_data")
 RECEIVED_DATA_DIR = CONFIG.get('paths', {}).get('received_data_dir', "received_data")
 LOGS_DIR = CONFIG.get('paths', {}).get('logs_dir', "logs")
+RENDER_WORKERS = CONFIG.get('server', {}).get('render_workers', render_service.DEFAULT_WORKERS)  # trabajadores que dibujan los gráficos
+RENDERER = CONFIG.get('server', {}).get('renderer')  # numpy o matplotlib; sin valor, el de cada gráfico
+EXPORTS_DIR = CONFIG.get('exports', {}).get('dir', os.path.join(PROCESSED_DATA_DIR, "exports"))
+EXPORT_ROWS_PER_SHARD = CONFIG.get('exports', {}).get('rows_per_shard', dataset_export.DEFAULT_ROWS_PER_SHARD)
+MAX_EXPORTS = CONFIG.get('exports', {}).get('max_exports', dataset_export.DEFAULT_MAX_EXPORTS)  # exportaciones conservadas
+SHARED_STATE = CONFIG.get('server', {}).get('shared_state', {})  # memory (un proceso) o sqlite (varios)
+MESSAGE_QUEUE = CONFIG.get('server', {}).get('message_queue')  # p. ej. redis://localhost:6379/0 (varios procesos)
 
 # Variables globales
-game_status = {"running": False, "process": None, "pid": None, "last_check": datetime.now().isoformat()}
-last_emit_time = 0
-check_game_status_thread = None
-updating_data = False  # Flag para controlar actualizaciones simultáneas
+services_started = False  # create_app ya lanzó las tareas en segundo plano
 
-# Configurar logging
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG if VERBOSE_LOGGING else logging.INFO)
-
-# Crear el directorio de logs si no existe
-if not os.path.exists(LOGS_DIR):
-    os.makedirs(LOGS_DIR)
-
-# Configurar handler para archivo
-file_handler = logging.FileHandler(os.path.join(LOGS_DIR, LOG_FILE))
-file_handler.setLevel(logging.DEBUG)
-
-# Configurar handler para consola
-console_handler = logging.StreamHandler()
-console_handler.setLevel(logging.INFO)
-
-# Formato de log
-formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
-file_handler.setFormatter(formatter)
-console_handler.setFormatter(formatter)
-
-# Añadir handlers al logger
-logger.addHandler(file_handler)
-logger.addHandler(console_handler)
+logger.setLevel(logging.DEBUG if app_config.current.verbose_logging else logging.INFO)
 
-# Reducir verbosidad de loggers externos
-logging.getLogger('werkzeug').setLevel(logging.WARNING)
-logging.getLogger('socketio').setLevel(logging.WARNING)
-logging.getLogger('engineio').setLevel(logging.WARNING)
+def setup_logging():
+    """Handlers de archivo (LOGS_DIR/server.log) y consola del logger del servidor"""
+    if logger.handlers:
+        return
+    os.makedirs(LOGS_DIR, exist_ok=True)
+    
+    # Configurar handler para archivo
+    file_handler = logging.FileHandler(os.path.join(LOGS_DIR, LOG_FILE))
+    file_handler.setLevel(logging.DEBUG)
+    
+    # Configurar handler para consola
+    console_handler = logging.StreamHandler()
+    console_handler.setLevel(logging.INFO)
+    
+    # Formato de log
+    formatter = logging.Formatter('%(asctime)s [%(levelname)s] %(message)s')
+    file_handler.setFormatter(formatter)
+    console_handler.setFormatter(formatter)
+    logger.addHandler(file_handler)
+    logger.addHandler(console_handler)
+    
+    # Reducir verbosidad de loggers externos
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    logging.getLogger('socketio').setLevel(logging.WARNING)
+    logging.getLogger('engineio').setLevel(logging.WARNING)
 
-# Asegurar que existan los directorios necesarios
-os.makedirs(STATIC_FOLDER, exist_ok=True)
-os.makedirs(TEMPLATE_FOLDER, exist_ok=True)
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
-os.makedirs(RECEIVED_DATA_DIR, exist_ok=True)
+def ensure_directories():
+    """Crea los directorios de trabajo del servidor si no existen"""
+    for directory in (STATIC_FOLDER, TEMPLATE_FOLDER, DATA_DIR, PROCESSED_DATA_DIR, RECEIVED_DATA_DIR):
+        os.makedirs(directory, exist_ok=True)
 
 app = Flask(__name__, 
             static_folder=STATIC_FOLDER,
             template_folder=TEMPLATE_FOLDER)
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Con message_queue los mensajes emitidos llegan a los clientes de todos los procesos
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode=ASYNC_MODE,
+                    serializer=json_encoding.Packet, message_queue=MESSAGE_QUEUE)
+
+# Estado compartido entre procesos (ver shared_state.py): estado del juego, hash y
+# versión de los datos, los temas y el cerrojo de la ingesta. Con un solo proceso vive en memoria.
+state = shared_state.open_state(SHARED_STATE)
+# Publicación por temas con deltas versionados; con varios procesos las versiones se comparten
+topic_hub = topics.TopicHub(socketio, store=state if state.shared else None)
+leader = shared_state.LeaderElection(state, ttl=SHARED_STATE.get('lease_ttl', shared_state.DEFAULT_LEASE_TTL))
+INGEST_LOCK_TTL = 600  # Máximo que un proceso caído puede retener el cerrojo de la ingesta
+EXPORT_LOCK_TIMEOUT = 10.0  # Espera máxima para registrar una exportación (cerrojo entre procesos)
+vision_status = {"status": "stopped", "config": {}, "last_change": None}  # Estado del sistema de visión
+# Último frame del sistema de visión, codificado en JPEG, para /api/vision/frame y la transmisión MJPEG
+frame_buffer = vision_stream.FrameBuffer(app_config.current.stream_quality, app_config.current.stream_max_fps)
+EXTERNAL_FRAME_TIMEOUT = 2.0  # Sin frames del sistema de visión durante este tiempo se usan frames simulados
+vision_simulation = {"running": False, "last_external": 0.0}
+vision_simulation_lock = threading.Lock()
+# Lo último que este proceso envió a sus clientes, para que cada proceso avise de lo que hizo otro
+published_state = {"data_hash": None, "game_status": None}
+# Índice de eventos ordenados para la paginación por cursor (se reconstruye al cambiar la versión)
+events_index = {"version": None, "keys": [], "events": [], "by_instance": {}}
+events_index_lock = threading.Lock()
+# Estadísticas y resumen de partidas de la versión actual de los datos, compartidos por todas las conexiones
+stats_cache = {"version": None, "stats": None, "runs": None}
+stats_cache_lock = threading.Lock()
+# Histogramas por sala de cada partición (los mantiene la ingesta) y su fusión
+room_heatmaps_cache = {"version": None, "stores": {}, "merged": None}
+room_heatmaps_lock = threading.Lock()
 
-# Variable para controlar el thread de actualización
-update_thread = None
-game_check_thread = None
-thread_stop_event = threading.Event()
-last_data_hash = None  # Hash para verificar si los datos han cambiado
+def database_sources():
+    """[(instancia, archivo)] de la base de datos por defecto y de cada partición existente"""
+    config = app_config.current
+    return [(partitions.DEFAULT_INSTANCE, config.database_file)] + partitions.list_partitions(config.partitions_dir)
 
+@async_mode.offload
+@metrics.timed(metrics.INGEST_STAGE_SECONDS, stage="load")
 def load_database():
-    """Cargar la base de datos"""
-    if not os.path.exists(DATABASE_FILE):
-        logger.warning(f"Base de datos {DATABASE_FILE} no encontrada, creando una nueva")
+    """Cargar la base de datos, fusionando las particiones de cada instancia"""
+    config = app_config.current
+    partition_files = partitions.list_partitions(config.partitions_dir)
+    if not partition_files:
+        return read_database_file(config.database_file)
+    
+    databases = []
+    if os.path.exists(config.database_file):
+        databases.append((partitions.DEFAULT_INSTANCE, read_database_file(config.database_file)))
+    for instance, db_file in partition_files:
+        databases.append((instance, read_database_file(db_file)))
+    database = partitions.merge_databases(databases)
+    logger.info(f"Base de datos fusionada: {len(database['events'])} eventos de {len(databases)} particiones")
+    return database
+
+def iter_database_events(instance=None):
+    """
+    Genera los eventos de la base de datos y de cada partición leyendo los archivos
+    por bloques, sin cargarlos completos en memoria. Un archivo corrupto lanza
+    ValueError (tras los eventos ya generados): quien consume los eventos decide
+    cómo fallar, en lugar de recibir en silencio solo una parte.
+    """
+    sources = database_sources()
+    partitioned = len(sources) > 1
+    for name, db_file in sources:
+        if (instance and name != instance) or not os.path.exists(db_file):
+            continue
+        try:
+            with open(db_file, 'rb') as f:
+                for event in salvage_parser.iter_json_events(f):
+                    if partitioned:
+                        event.setdefault(partitions.SOURCE_FIELD, name)
+                    yield event
+        except ValueError as e:
+            logger.error(f"Error al leer {db_file} en streaming: {str(e)}")
+            raise ValueError(f"{db_file}: {str(e)}") from e
+
+def read_database_file(db_file):
+    """Leer un archivo de base de datos"""
+    if not os.path.exists(db_file):
+        logger.warning(f"Base de datos {db_file} no encontrada, creando una nueva")
         return {
             "events": [],
             "metadata": {
@@ -120,7 +206,7 @@ def load_database():
         }
     
     try:
-        with open(DATABASE_FILE, 'r', encoding='utf-8') as f:
+        with open(db_file, 'r', encoding='utf-8') as f:
             database = json.load(f)
             logger.info(f"Base de datos cargada: {len(database.get('events', []))} eventos")
             return database
@@ -136,6 +222,8 @@ def load_database():
             }
         }
 
+@async_mode.offload
+@metrics.timed(metrics.INGEST_STAGE_SECONDS, stage="stats")
 def get_event_stats(database):
     """Obtener estadísticas de eventos"""
     events = database.get("events", [])
@@ -330,309 +418,684 @@ def calculate_data_hash(database):
     hash_str = json.dumps(data_to_hash, sort_keys=True)
     return hashlib.md5(hash_str.encode()).hexdigest()
 
-def check_game_status():
-    """Comprueba si el juego está en ejecución y notifica a los clientes."""
-    global game_status
+def run_extract_script(*args, instance=None):
+    """
+    Ejecuta extract_data.py y registra sus métricas por etapa.
+    Devuelve el resultado de subprocess.run sin la línea de métricas en stdout.
+    """
+    config = app_config.current
+    if not instance:
+        # La misma base de datos que leen las peticiones (database.file se recarga en caliente)
+        args += ("--db", config.database_file)
+    else:
+        args += ("--instance", instance, "--partitions-dir", config.partitions_dir)
+        data_path = config.instances.get(instance, {}).get("data_path")
+        if not data_path:
+            # Sin su propio archivo leería el de la partición por defecto (eventos duplicados)
+            logger.error(f"La instancia {instance} no tiene data_path; no se extraerá")
+            return subprocess.CompletedProcess(args=list(args), returncode=1, stdout="",
+                                               stderr=f"Instancia {instance} sin data_path")
+        args += ("--data-path", data_path)
+    
+    start_time = time.perf_counter()
+    result = subprocess.run(["python", "extract_data.py", *args, "--emit-metrics"],
+                            capture_output=True, text=True)
+    metrics.INGEST_EXTRACTION_SECONDS.observe(time.perf_counter() - start_time)
+    metrics.INGEST_RUNS.inc(result="success" if result.returncode == 0 else "error")
+    
+    output_lines = []
+    for line in (result.stdout or "").splitlines():
+        if line.startswith(metrics.EXTRACTION_METRICS_PREFIX):
+            try:
+                extraction_metrics = json.loads(line[len(metrics.EXTRACTION_METRICS_PREFIX):])
+                metrics.record_extraction_metrics(extraction_metrics)
+                if extraction_metrics.get("counters", {}).get("events_new", 0) > 0:
+                    bump_data_version()
+            except ValueError as e:
+                logger.warning(f"Métricas de extracción inválidas: {str(e)}")
+        else:
+            output_lines.append(line)
+    result.stdout = "\n".join(output_lines)
+    return result
+
+def run_ingest(*args):
+    """
+    Ejecuta la extracción de la partición por defecto y de cada instancia configurada.
+    Las instancias escriben en particiones distintas, así que se ejecutan en paralelo.
+    Devuelve un único resultado con la salida combinada.
+    """
+    instances = list(app_config.current.instances)
+    if not instances:
+        return run_extract_script(*args)
+    
+    results = {}
+    def run(instance):
+        results[instance] = run_extract_script(*args, instance=instance)
+    
+    workers = [threading.Thread(target=run, args=(instance,)) for instance in [None, *instances]]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    
+    ordered = [(instance or partitions.DEFAULT_INSTANCE, results[instance]) for instance in [None, *instances]]
+    return subprocess.CompletedProcess(
+        args=[result.args for _, result in ordered],
+        returncode=max(result.returncode for _, result in ordered),
+        stdout="\n".join(f"[{name}] {line}" for name, result in ordered for line in (result.stdout or "").splitlines()),
+        stderr="\n".join(f"[{name}] {line}" for name, result in ordered for line in (result.stderr or "").splitlines())
+    )
+
+def refresh_data():
+    """
+    Ejecuta la ingesta y, si los datos cambiaron, regenera las visualizaciones y
+    avisa a los clientes. Devuelve el resultado de la actualización.
+    """
+    logger.info("Ejecutando actualización de datos...")
+    
+    # Una sola ingesta a la vez entre todos los procesos del servidor
+    with state.lock("ingest", ttl=INGEST_LOCK_TTL, timeout=INGEST_LOCK_TTL):
+        return ingest_and_publish()
+
+def ingest_and_publish():
+    """Ingesta (con el cerrojo de refresh_data) y publicación de los datos si cambiaron"""
+    game_status = get_game_status()
+    # Ejecutar con forzado para que no verifique si el juego está en ejecución
+    result = run_ingest("--keep-originals", "--force")
+    update_info = {
+        "success": result.returncode == 0,
+        "output": result.stdout,
+        "error": result.stderr,
+        "timestamp": datetime.now().isoformat(),
+        "data_changed": False,
+        "game_running": game_status.get("running", False),
+        "game_info": {
+            "process": game_status.get("process"),
+            "pid": game_status.get("pid")
+        }
+    }
+    if not update_info["success"]:
+        return update_info
     
-    # Inicializar el estado
+    database = load_database()
+    
+    # Comprobar si los datos han cambiado usando hash
+    current_hash = calculate_data_hash(database)
+    update_info["data_changed"] = current_hash != state.get("last_data_hash")
+    state.set("last_data_hash", current_hash)
+    published_state["data_hash"] = current_hash
+    
+    if update_info["data_changed"]:
+        try:
+            stats = get_event_stats(database)
+            # Generar visualizaciones y enviar datos a los clientes conectados
+            generate_visualizations(database)
+            publish_data_update(database, stats, update_info)
+            logger.info("Datos actualizados y enviados a clientes conectados")
+        except Exception as e:
+            logger.error(f"Error al emitir datos actualizados: {str(e)}")
+            logger.exception("Detalles del error:")
+    else:
+        logger.info("Actualización completada: No hay cambios en los datos")
+    return update_info
+
+# Una sola ingesta a la vez: /api/refresh, manual_update y el hilo automático
+# se unen a la que esté en curso o reutilizan la que acaba de terminar bien
+refresh_flight = single_flight.SingleFlight(refresh_data, min_interval=app_config.current.refresh_min_interval,
+                                            name="Actualización de datos", success=lambda r: r["success"])
+
+def request_refresh(source):
+    """Solicita una actualización al coordinador y registra cómo se resolvió"""
+    outcome = refresh_flight.run()
+    metrics.REFRESH_REQUESTS.inc(source=source, result=outcome.how)
+    if outcome.shared:
+        logger.info(f"Actualización ({source}) resuelta con una ejecución compartida ({outcome.how}, "
+                    f"hace {outcome.age:.1f} s)")
+    return outcome
+
+def bump_data_version():
+    """Incrementa la versión de los datos, invalidando los ETag de las APIs"""
+    version = state.incr("data_version")
+    metrics.DATA_VERSION.set(version)
+    return version
+
+def get_data_version():
+    """
+    Versión actual de los datos sin cargar la base de datos: el contador de ingesta
+    más una huella (mtime y tamaño) de los archivos, que detecta extracciones
+    ejecutadas fuera del servidor.
+    """
+    db_files = [db_file for _, db_file in database_sources()]
+    fingerprint = []
+    for db_file in db_files:
+        try:
+            stat = os.stat(db_file)
+            fingerprint.append(f"{db_file}:{stat.st_mtime_ns}:{stat.st_size}")
+        except OSError:
+            continue
+    return f"{state.counter('data_version')}-{hashlib.md5('|'.join(fingerprint).encode()).hexdigest()[:16]}"
+
+def conditional_get(endpoint, version=None, variant=None, vary=()):
+    """
+    Decorador para APIs de solo lectura: añade un ETag fuerte derivado de la versión
+    de los datos y de la URL, y responde 304 a If-None-Match sin cargar la base de datos.
+    version permite usar otra función de versión (por defecto get_data_version).
+    Si la respuesta depende también de cabeceras de la petición, variant() devuelve
+    la parte del ETag que depende de ellas (por ejemplo el formato negociado con
+    Accept) y vary son esas cabeceras, que se añaden a Vary también en los 304.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            url_hash = hashlib.md5(request.full_path.encode()).hexdigest()[:8]
+            etag = f"{(version or get_data_version)()}-{url_hash}"
+            if variant is not None:
+                try:
+                    etag = f"{etag}-{variant()}"
+                except ValueError:
+                    # Petición no válida: la vista responde con el error
+                    return view(*args, **kwargs)
+            
+            if request.if_none_match:
+                # La compresión añade la codificación al ETag: aceptar también esas variantes
+                candidates = [etag] + [f"{etag}-{encoding}" for encoding in compression.SUFFIXES]
+                matched = next((c for c in candidates if request.if_none_match.contains(c)), None)
+                if matched:
+                    metrics.HTTP_CONDITIONAL_REQUESTS.inc(endpoint=endpoint, result="hit")
+                    response = Response(status=304)
+                    response.set_etag(matched)
+                    response.vary.add('Accept-Encoding')
+                    for header in vary:
+                        response.vary.add(header)
+                    return response
+                metrics.HTTP_CONDITIONAL_REQUESTS.inc(endpoint=endpoint, result="miss")
+            else:
+                metrics.HTTP_CONDITIONAL_REQUESTS.inc(endpoint=endpoint, result="unconditional")
+            
+            response = app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+                for header in vary:
+                    response.vary.add(header)
+            return response
+        return wrapper
+    return decorator
+
+def refresh_stats_cache():
+    """Recalcula estadísticas y partidas si cambió la versión de los datos"""
+    version = get_data_version()
+    with stats_cache_lock:
+        if stats_cache["version"] != version:
+            database = load_database()
+            stats_cache.update(version=version,
+                               stats=json_encoding.normalize(get_event_stats(database)),
+                               runs=get_run_summaries(database))
+        return stats_cache
+
+def get_current_stats():
+    """Estadísticas normalizadas de la versión actual de los datos (calculadas una vez por versión)"""
+    return refresh_stats_cache()["stats"]
+
+def get_current_runs():
+    """Resumen por partida de la versión actual de los datos"""
+    return refresh_stats_cache()["runs"]
+
+def get_run_summaries(database):
+    """Resumen de cada partida (seed): eventos, último nivel y último timestamp"""
+    runs = {}
+    for event in database.get("events", []):
+        game_data = event.get("game_data") or {}
+        seed = game_data.get("seed")
+        if seed is None:
+            continue
+        run = runs.setdefault(str(seed), {"events": 0, "level": 0, "last_timestamp": 0,
+                                          "instance": event.get(partitions.SOURCE_FIELD, partitions.DEFAULT_INSTANCE)})
+        run["events"] += 1
+        level = game_data.get("level")
+        if isinstance(level, (int, float)) and level > run["level"]:
+            run["level"] = level
+        timestamp = event.get("timestamp")
+        if isinstance(timestamp, (int, float)) and timestamp > run["last_timestamp"]:
+            run["last_timestamp"] = timestamp
+    return runs
+
+def publish_data_update(database, stats, update_info):
+    """
+    Notifica una actualización de datos: el mensaje completo data_updated a los
+    clientes sin suscripción y solo los cambios a los suscritos a stats y runs.
+    """
+    # Las estadísticas ya normalizadas (las de la caché) se devuelven tal cual, sin copiarlas
+    stats = json_encoding.normalize(stats)
+    socketio.emit('data_updated', {
+        "stats": stats,
+        "update_info": json_encoding.normalize(update_info)
+    }, room=topics.LEGACY_ROOM)
+    topic_hub.publish("stats", stats)
+    topic_hub.publish("runs", get_run_summaries(database))
+
+def get_game_status():
+    """Estado del juego compartido por todos los procesos (lo actualiza el líder)"""
+    return state.get("game_status") or {"running": False, "process": None, "pid": None,
+                                        "last_check": datetime.now().isoformat()}
+
+def publish_game_status(game_status):
+    """Notifica el estado del juego a clientes sin suscripción y al tema game_status"""
+    published_state["game_status"] = game_status
+    socketio.emit('game_status_change', game_status, room=topics.LEGACY_ROOM)
+    topic_hub.publish("game_status", game_status)
+
+def event_sort_key(event):
+    """Clave de orden estable de los eventos: (timestamp, event_id, instancia)"""
+    timestamp = event.get("timestamp", 0)
+    if not isinstance(timestamp, (int, float)):
+        try:
+            timestamp = float(timestamp)
+        except (TypeError, ValueError):
+            timestamp = 0
+    return (timestamp, str(event.get("event_id", "")),
+            event.get(partitions.SOURCE_FIELD, partitions.DEFAULT_INSTANCE))
+
+def get_events_index(instance=None):
+    """
+    Devuelve (claves, eventos) ordenados por event_sort_key. La base de datos solo
+    se carga y ordena cuando cambia la versión de los datos; el resto de páginas
+    se sirven buscando en el índice.
+    """
+    version = get_data_version()
+    with events_index_lock:
+        if events_index["version"] != version:
+            keyed = sorted(((event_sort_key(e), e) for e in load_database().get("events", [])),
+                           key=lambda item: item[0])
+            events_index.update(version=version,
+                                keys=[key for key, _ in keyed],
+                                events=[event for _, event in keyed],
+                                by_instance={})
+        if not instance:
+            return events_index["keys"], events_index["events"]
+        
+        # Subíndice por instancia, construido la primera vez que se pide
+        if instance not in events_index["by_instance"]:
+            positions = [i for i, key in enumerate(events_index["keys"]) if key[2] == instance]
+            events_index["by_instance"][instance] = ([events_index["keys"][i] for i in positions],
+                                                     [events_index["events"][i] for i in positions])
+        return events_index["by_instance"][instance]
+
+@async_mode.offload
+def load_room_heatmaps():
+    """
+    Carga los histogramas por sala de cada partición. Si falta el archivo de una
+    partición (datos anteriores a los mapas por sala) se construyen en memoria
+    recorriendo su base de datos en streaming. El archivo solo lo escribe
+    extract_data.py, con el cerrojo de ingesta: escribirlo aquí podría
+    sobrescribir los histogramas de una ingesta más reciente.
+    """
+    sources = database_sources()
+    stores = {}
+    for name, db_file in sources:
+        if not os.path.exists(db_file):
+            continue
+        path = room_heatmaps.store_path(db_file)
+        store = room_heatmaps.RoomHeatmaps.load(path)
+        if store is None:
+            logger.info(f"Construyendo los mapas de calor por sala de {db_file}")
+            store = room_heatmaps.RoomHeatmaps()
+            store.add_events(iter_database_events(name))
+        stores[name] = store
+    return stores
+
+def get_room_heatmaps(instance=None):
+    """Histogramas por sala de la versión actual de los datos (todas las particiones o una)"""
+    version = get_data_version()
+    with room_heatmaps_lock:
+        if room_heatmaps_cache["version"] != version:
+            room_heatmaps_cache.update(version=version, stores=load_room_heatmaps(), merged=None)
+        if instance:
+            return room_heatmaps_cache["stores"].get(instance)
+        if room_heatmaps_cache["merged"] is None:
+            merged = room_heatmaps.RoomHeatmaps()
+            for store in room_heatmaps_cache["stores"].values():
+                merged.merge(store)
+            room_heatmaps_cache["merged"] = merged
+        return room_heatmaps_cache["merged"]
+
+def encode_cursor(key):
+    """Codifica la clave del último evento de una página como cursor opaco"""
+    return base64.urlsafe_b64encode(json.dumps(list(key)).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor):
+    """Decodifica un cursor de encode_cursor (ValueError si no es válido)"""
+    try:
+        timestamp, event_id, instance = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except Exception as e:
+        raise ValueError(f"Cursor inválido: {str(e)}")
+    if not isinstance(timestamp, (int, float)):
+        raise ValueError("Cursor inválido: timestamp no numérico")
+    return (timestamp, str(event_id), str(instance))
+
+def on_game_status_change(status):
+    """Suscriptor del monitor de procesos: actualiza el estado compartido y notifica a los clientes."""
+    if not leader.is_leader:
+        return
+    game_status = {
+        'running': status['running'],
+        'process': status['process'],
+        'pid': status['pid'],
+        'last_check': datetime.now().isoformat()
+    }
+    state.set("game_status", game_status)
+    logger.info(f"Cambio de estado del juego detectado: {'en ejecución' if status['running'] else 'no detectado'}")
+    
+    # Enviar actualizaciones por SocketIO
+    try:
+        publish_game_status(game_status)
+        logger.info(f"Estado del juego enviado a clientes")
+    except Exception as e:
+        logger.error(f"Error al enviar actualización de estado del juego: {str(e)}")
+
+def init_game_status():
+    """
+    Estado inicial del juego al ser elegido líder; a partir de aquí los cambios
+    llegan a través del monitor
+    """
     game_running, process_name = game_manager.is_game_running()
     game_status = {
         'running': game_running,
         'process': process_name,
-        'pid': None,
+        'pid': game_manager.monitor.get_status()['pid'],
         'last_check': datetime.now().isoformat()
     }
+    state.set("game_status", game_status)
     
     # Emitir estado inicial
     try:
-        socketio.emit('game_status_change', game_status, namespace='/')
+        publish_game_status(game_status)
         logger.info(f"Estado inicial del juego: {'en ejecución' if game_running else 'no detectado'}")
     except Exception as e:
         logger.error(f"Error al enviar estado inicial del juego: {str(e)}")
     
-    # Bucle principal de verificación
-    last_check_time = time.time()
-    while not thread_stop_event.is_set():
-        try:
-            # Control de tiempo más preciso
-            current_time = time.time()
-            elapsed = current_time - last_check_time
-            
-            # Si no ha pasado el intervalo completo, dormir solo el tiempo restante
-            if elapsed < GAME_CHECK_INTERVAL:
-                # Dormir en incrementos pequeños para poder responder rápidamente al evento thread_stop_event
-                sleep_time = min(1.0, GAME_CHECK_INTERVAL - elapsed)
-                time.sleep(sleep_time)
-                continue
-            
-            # Registrar el momento de la verificación
-            last_check_time = current_time
-            logger.debug(f"Verificando estado del juego (intervalo: {GAME_CHECK_INTERVAL}s)")
-            
-            # Verificar si el juego está en ejecución usando game_manager
-            game_running, process_name = game_manager.is_game_running()
-            
-            # Si el estado cambió, actualizar y notificar a los clientes
-            if game_running != game_status.get('running', False):
-                logger.info(f"Cambio de estado del juego detectado: {'en ejecución' if game_running else 'no detectado'}")
-                
-                game_status = {
-                    'running': game_running,
-                    'process': process_name,
-                    'pid': None,
-                    'last_check': datetime.now().isoformat()
-                }
-                
-                # Enviar actualizaciones por SocketIO
-                try:
-                    socketio.emit('game_status_change', game_status, namespace='/')
-                    logger.info(f"Estado del juego enviado a clientes")
-                except Exception as e:
-                    logger.error(f"Error al enviar actualización de estado del juego: {str(e)}")
-            else:
-                logger.debug(f"Estado del juego sin cambios: {'en ejecución' if game_running else 'no detectado'}")
-                    
-        except Exception as e:
-            logger.error(f"Error al verificar el estado del juego: {str(e)}")
-            # En caso de error, esperar un poco antes de intentar de nuevo
-            time.sleep(1.0)
-            
-    logger.info("Hilo de verificación de estado del juego detenido")
+
+def on_elected():
+    """Este proceso pasa a ser el líder: toma el estado del juego (las tareas ya comprueban leader.is_leader)"""
+    socketio.start_background_task(init_game_status)
+
+def check_game_status():
+    """Tarea programada: comprueba si el juego está en ejecución (el monitor notifica los cambios)"""
+    logger.debug(f"Verificando estado del juego (intervalo: {app_config.current.game_check_interval}s)")
+    # El monitor vigila el PID conocido o recorre /proc; no lanza subprocesos
+    status = game_manager.monitor.check()
+    game_status = get_game_status()
+    game_status['last_check'] = datetime.now().isoformat()
+    state.set("game_status", game_status)
+    logger.debug(f"Estado del juego: {'en ejecución' if status['running'] else 'no detectado'}")
 
 def update_data_background():
-    """Función de actualización de datos en segundo plano"""
-    global last_data_hash, game_status
-    last_emission_time = 0  # Última vez que se emitió una actualización
-    
-    while not thread_stop_event.is_set():
-        logger.info("Ejecutando actualización automática de datos...")
-        
+    """Tarea programada de actualización automática de datos (solo con el juego en ejecución)"""
+    if not get_game_status().get("running", False):
+        logger.info("Juego no detectado en ejecución. Se omitirá la actualización automática.")
+        return
+    logger.info("Juego en ejecución detectado. Realizando actualización normal.")
+    # Comparte el coordinador con las actualizaciones manuales: si hay una
+    # en curso (o acaba de terminar) se usa su resultado
+    outcome = request_refresh("background")
+    if not outcome.result["success"]:
+        raise RuntimeError(f"Error en actualización automática: {outcome.result['error']}")
+
+def record_job(job, seconds, error):
+    """Registra en las métricas cada ejecución de una tarea programada"""
+    metrics.JOB_SECONDS.observe(seconds, job=job.name)
+    metrics.JOB_RUNS.inc(job=job.name, result="error" if error else "success")
+
+# Tareas de mantenimiento en segundo plano: un solo bucle con prioridades y sin solapamientos
+job_scheduler = scheduler.Scheduler(start_task=socketio.start_background_task,
+                                    max_concurrent=SCHEDULER_MAX_CONCURRENT, on_finish=record_job)
+
+def job_trigger(name, default_interval, config=None):
+    """Disparador de una tarea: el de server.jobs en config.json o el intervalo por defecto"""
+    spec = (config or app_config.current).jobs.get(name, {})
+    try:
+        if "interval" in spec or "cron" in spec:
+            return scheduler.make_trigger(spec)
+    except ValueError as e:
+        logger.error(f"Disparador no válido para la tarea {name}: {str(e)}")
+    return scheduler.IntervalTrigger(default_interval)
+
+def sync_shared_state():
+    """
+    Tarea programada con varios procesos: avisa a los clientes de este proceso de
+    los cambios de estado del juego, de datos y de los temas que hizo otro
+    (normalmente el líder). Con message_queue los mensajes de cada proceso ya
+    llegan a todos los clientes y los temas están en el estado compartido, así
+    que solo se anota lo publicado.
+    """
+    game_status = state.get("game_status")
+    if game_status is not None and game_status != published_state["game_status"]:
+        published_state["game_status"] = game_status
+        if not MESSAGE_QUEUE:
+            socketio.emit('game_status_change', game_status, room=topics.LEGACY_ROOM)
+    data_hash = state.get("last_data_hash")
+    if data_hash is not None and data_hash != published_state["data_hash"]:
+        published_state["data_hash"] = data_hash
+        if not MESSAGE_QUEUE:
+            socketio.emit('data_updated', {
+                "stats": topic_hub.snapshot("stats")[1] or get_current_stats(),
+                "update_info": {"data_changed": True, "game_running": (game_status or {}).get("running", False),
+                                "timestamp": datetime.now().isoformat()}
+            }, room=topics.LEGACY_ROOM)
+    if not MESSAGE_QUEUE:
+        for topic in topic_hub.topics:
+            topic_hub.forward(topic)
+
+def leader_only(func):
+    """Tarea que solo ejecuta el proceso líder (en el resto no hace nada)"""
+    @functools.wraps(func)
+    def wrapper():
+        if not leader.is_leader:
+            logger.debug(f"Tarea {func.__name__} omitida: este proceso no es el líder")
+            return
+        return func()
+    return wrapper
+
+# Tareas del servidor: (nombre, función, opción del intervalo por defecto, prioridad, ejecutar al arrancar).
+# La comprobación del juego y la actualización automática solo las ejecuta el líder.
+JOBS = (("game_status", leader_only(check_game_status), "game_check_interval", 0, False),
+        ("data_update", leader_only(update_data_background), "update_interval", 5, True))
+if state.shared:
+    JOBS += (("shared_sync", sync_shared_state, "shared_sync_interval", 1, False),)
+
+def configure_jobs():
+    """Registra las tareas programadas del servidor (prioridad: número menor, más prioritaria)"""
+    config = app_config.current
+    for name, func, interval_option, priority, run_at_start in JOBS:
+        spec = config.jobs.get(name, {})
+        job_scheduler.add(name, func, job_trigger(name, getattr(config, interval_option), config),
+                          priority=spec.get("priority", priority), run_at_start=run_at_start,
+                          enabled=spec.get("enabled", True))
+
+def apply_job_config(config):
+    """Aplica a las tareas ya registradas el disparador, la prioridad y la activación de config"""
+    for name, _, interval_option, priority, _ in JOBS:
+        job = job_scheduler.jobs.get(name)
+        if job is None:
+            continue
+        spec = config.jobs.get(name, {})
+        trigger = job_trigger(name, getattr(config, interval_option), config)
+        if trigger.describe() != job.trigger.describe():
+            job_scheduler.reschedule(name, trigger)
+        if spec.get("priority", priority) != job.priority:
+            job_scheduler.reschedule(name, priority=spec.get("priority", priority))
+        if spec.get("enabled", True) != job.enabled:
+            job_scheduler.set_enabled(name, spec.get("enabled", True))
+
+def publish_visualization(chart, info):
+    """Avisa a los clientes de que hay una imagen nueva de un gráfico"""
+    if app_config.current.compression_enabled:
         try:
-            # Usar el estado global del juego
-            game_running = game_status.get("running", False)
-            
-            if game_running:
-                logger.info("Juego en ejecución detectado. Realizando actualización normal.")
-                result = subprocess.run(["python", "extract_data.py", "--keep-originals"], 
-                                       capture_output=True, text=True)
-            else:
-                logger.info("Juego no detectado en ejecución. Se omitirá la actualización automática.")
-                # No actualizar nada si el juego no está corriendo
-                time.sleep(UPDATE_INTERVAL)
-                continue
-            
-            update_data = {
-                "success": result.returncode == 0,
-                "output": result.stdout,
-                "error": result.stderr,
-                "timestamp": datetime.now().isoformat(),
-                "game_running": game_running,
-                "game_info": {
-                    "process": game_status.get("process"),
-                    "pid": game_status.get("pid")
-                }
-            }
-            
-            if update_data["success"]:
-                # Cargar base de datos actualizada
-                database = load_database()
-                
-                # Comprobar si los datos han cambiado usando hash
-                current_hash = calculate_data_hash(database)
-                current_time = time.time()
-                time_since_last_emission = current_time - last_emission_time
-                
-                # Solo emitir si los datos cambiaron Y ha pasado suficiente tiempo desde la última emisión
-                if current_hash != last_data_hash and time_since_last_emission >= EMIT_THROTTLE:
-                    # Actualizar el hash y el tiempo de emisión
-                    last_data_hash = current_hash
-                    last_emission_time = current_time
-                    
-                    try:
-                        # Obtener estadísticas y enviar a clientes - asegurar que sean serializables
-                        stats = get_event_stats(database)
-                        sanitized_stats = sanitize_for_json(stats)
-                        sanitized_update = sanitize_for_json(update_data)
-                        
-                        socketio.emit('data_updated', {
-                            "stats": sanitized_stats,
-                            "update_info": sanitized_update
-                        })
-                        logger.info("Datos actualizados y enviados a clientes conectados")
-                        
-                        # Generar visualizaciones actualizadas
-                        generate_visualizations(database)
-                    except Exception as e:
-                        logger.error(f"Error al emitir datos actualizados: {str(e)}")
-                        logger.exception("Detalles del error:")
-                elif current_hash != last_data_hash:
-                    logger.info("Datos actualizados pero no enviados (throttling)")
-                    last_data_hash = current_hash
-                else:
-                    logger.info("No hay cambios en los datos")
-            else:
-                logger.error(f"Error en actualización automática: {update_data['error']}")
-                
+            compression.precompress_file(os.path.join(STATIC_FOLDER, "visualizations", render_service.CHARTS[chart]["file"]))
         except Exception as e:
-            logger.error(f"Error en thread de actualización: {str(e)}")
-            logger.exception("Detalles del error:")
-        
-        # Esperar hasta la siguiente actualización
-        for _ in range(UPDATE_INTERVAL):
-            if thread_stop_event.is_set():
-                break
-            time.sleep(1)
+            logger.error(f"Error al precomprimir la visualización {chart}: {str(e)}")
+    socketio.emit('visualization_ready', {"chart": chart, **info}, room=topics.LEGACY_ROOM)
+    topic_hub.publish("visualizations", visualization_renderer.status())
+
+# Los gráficos se dibujan fuera del hilo de actualización; solo se redibujan los que cambiaron
+visualization_renderer = render_service.RenderService(os.path.join(STATIC_FOLDER, "visualizations"),
+                                                      RENDER_WORKERS, on_ready=publish_visualization,
+                                                      renderer=RENDERER)
+
+# Exportaciones del historial completo de características en segundo plano
+dataset_exporter = dataset_export.ExportManager(EXPORTS_DIR, iter_database_events,
+                                                start_task=socketio.start_background_task,
+                                                run_blocking=async_mode.run_blocking,
+                                                max_exports=MAX_EXPORTS,
+                                                lock=lambda: state.lock("exports", timeout=EXPORT_LOCK_TIMEOUT))
+
+def ml_features_version():
+    """
+    Versión de las características para ML: cambia cuando la ingesta actualiza el
+    almacén de una partición (su meta.json) o cambia una base de datos. None si
+    no hay ninguna base de datos.
+    """
+    parts = []
+    for name, db_file in database_sources():
+        db_version = feature_store.file_version(db_file)
+        if db_version is None:
+            continue
+        meta_file = os.path.join(feature_extraction.store_path(db_file), feature_extraction.META_FILE)
+        parts.append(f"{name}:{db_version}:{feature_store.file_version(meta_file)}")
+    return hashlib.md5("|".join(parts).encode()).hexdigest()[:16] if parts else None
+
+def load_ml_features():
+    """
+    Características para ML de todas las particiones, del almacén que mantiene la
+    ingesta. Si falta (o la base de datos cambió fuera de la ingesta) se extraen
+    recorriendo la base de datos en streaming, sin tocar el almacén: solo lo
+    escribe extract_data.py.
+    """
+    sources = database_sources()
+    tables = []
+    for name, db_file in sources:
+        if not os.path.exists(db_file):
+            continue
+        table = feature_extraction.load_store(feature_extraction.store_path(db_file), source_file=db_file)
+        if table is None:
+            logger.info(f"Extrayendo las características para ML de {db_file}")
+            table = feature_extraction.extract(iter_database_events(name))
+        tables.append(table)
+    return feature_extraction.concat(tables)
+
+# Tabla de características ML en memoria, recargada cuando cambia su versión. Se sirve
+# directamente de los almacenes por partición: no se reescribe ningún archivo con todo
+# el historial en cada actualización.
+ml_feature_cache = feature_store.FeatureCache(
+    ml_features_version,
+    async_mode.offload(lambda version: feature_store.FeatureTable(feature_extraction.COLUMN_NAMES,
+                                                                  load_ml_features(), version)))
+
+@async_mode.offload
+@metrics.timed(metrics.INGEST_STAGE_SECONDS, stage="visualization")
+def prepare_visualizations(events):
+    """Devuelve los datos de entrada de cada gráfico"""
+    return render_service.collect_inputs(events)
 
 def generate_visualizations(database):
-    """Genera visualizaciones basadas en los datos actuales"""
+    """
+    Encarga al pool de renderizado los gráficos cuyos datos cambiaron. No espera a
+    las imágenes: se avisa a los clientes cuando están listas (tema visualizations
+    y evento visualization_ready).
+    """
     events = database.get("events", [])
     if not events:
         logger.warning("No hay eventos para generar visualizaciones")
-        return
+        return {}
 
+    results = {}
     try:
-        # Crear directorio para visualizaciones (asegurarse de que exista la ruta completa)
-        vis_dir = os.path.join(STATIC_FOLDER, "visualizations")
-        os.makedirs(vis_dir, exist_ok=True)
-        
-        # Verificar y registrar las rutas para debug
-        abs_vis_dir = os.path.abspath(vis_dir)
-        logger.info(f"Directorio de visualizaciones: {abs_vis_dir}")
-        
-        # Generar un archivo de prueba para verificar permisos
-        test_file = os.path.join(vis_dir, 'test.txt')
-        try:
-            with open(test_file, 'w') as f:
-                f.write('test')
-            logger.info(f"Archivo de prueba creado: {test_file}")
-            os.remove(test_file)
-        except Exception as e:
-            logger.error(f"Error al crear archivo de prueba: {str(e)}")
-        
-        # 1. Mapa de calor de posiciones del jugador
-        player_positions = []
-        for event in events:
-            if event.get("event_type") == "frame_state" and "data" in event:
-                player_data = event.get("data", {}).get("player", {})
-                if "position" in player_data and player_data["position"] is not None:
-                    pos = player_data["position"]
-                    if pos is not None and "x" in pos and "y" in pos and pos["x"] is not None and pos["y"] is not None:
-                        player_positions.append((pos.get("x", 0), pos.get("y", 0)))
-        
-        if player_positions:
-            plt.figure(figsize=(10, 8))
-            positions = np.array(player_positions)
-            plt.hist2d(positions[:, 0], positions[:, 1], bins=50, cmap='hot')
-            plt.colorbar(label='Frecuencia')
-            plt.title('Mapa de Calor - Posiciones del Jugador')
-            plt.xlabel('Posición X')
-            plt.ylabel('Posición Y')
-            plt.tight_layout()
-            
-            # Guardar con ruta absoluta y manejar errores
-            heatmap_path = os.path.join(abs_vis_dir, 'player_heatmap.png')
-            try:
-                plt.savefig(heatmap_path)
-                logger.info(f"Mapa de calor guardado: {heatmap_path}")
-            except Exception as e:
-                logger.error(f"Error al guardar mapa de calor: {str(e)}")
-                
-            plt.close()
-            
-        else:
-            logger.warning("No hay suficientes posiciones de jugador para generar el mapa de calor")
-        
-        # 2. Distribución de tipos de eventos
-        event_types = Counter([str(e.get("event_type")) for e in events if e.get("event_type") is not None])
-        if event_types:
-            plt.figure(figsize=(12, 6))
-            types = list(event_types.keys())
-            counts = list(event_types.values())
-            plt.bar(types, counts)
-            plt.title('Distribución de Tipos de Eventos')
-            plt.xlabel('Tipo de Evento')
-            plt.ylabel('Cantidad')
-            plt.xticks(rotation=45, ha='right')
-            plt.tight_layout()
-            
-            distribution_path = os.path.join(abs_vis_dir, 'event_distribution.png')
-            try:
-                plt.savefig(distribution_path)
-                logger.info(f"Distribución de eventos guardada: {distribution_path}")
-            except Exception as e:
-                logger.error(f"Error al guardar distribución: {str(e)}")
-                
-            plt.close()
-            logger.info("Distribución de eventos generada")
-        else:
-            logger.warning("No hay suficientes tipos de eventos para generar la distribución")
-        
-        # 3. Preprocesamiento para ML
-        frame_states = [e for e in events if e.get("event_type") == "frame_state"]
-        if len(frame_states) > 10:
-            # Crear conjunto de datos mínimo para ML
-            ml_data = []
-            for state in frame_states[:1000]:  # Limitar a 1000 estados para el ejemplo
-                data = state.get("data", {})
-                player = data.get("player", {})
-                inputs = data.get("inputs", {})
-                player_position = player.get("position", {})
-                player_velocity = player.get("velocity", {})
-                player_health = player.get("health", {})
-                
-                # Extraer características relevantes con validación de None
-                features = {
-                    "frame_count": data.get("frame_count", 0),
-                    "player_x": player_position.get("x", 0) if player_position is not None else 0,
-                    "player_y": player_position.get("y", 0) if player_position is not None else 0,
-                    "player_vx": player_velocity.get("x", 0) if player_velocity is not None else 0,
-                    "player_vy": player_velocity.get("y", 0) if player_velocity is not None else 0,
-                    "player_health": player_health.get("hearts", 0) if player_health is not None else 0,
-                    "input_left": inputs.get("LEFT", 0) if inputs is not None else 0,
-                    "input_right": inputs.get("RIGHT", 0) if inputs is not None else 0,
-                    "input_up": inputs.get("UP", 0) if inputs is not None else 0,
-                    "input_down": inputs.get("DOWN", 0) if inputs is not None else 0,
-                    "shoot_left": inputs.get("SHOOT_LEFT", 0) if inputs is not None else 0,
-                    "shoot_right": inputs.get("SHOOT_RIGHT", 0) if inputs is not None else 0,
-                    "shoot_up": inputs.get("SHOOT_UP", 0) if inputs is not None else 0,
-                    "shoot_down": inputs.get("SHOOT_DOWN", 0) if inputs is not None else 0,
-                    "timestamp": state.get("timestamp", 0)
-                }
-                ml_data.append(features)
-            
-            if ml_data:
-                # Convertir a DataFrame
-                df = pd.DataFrame(ml_data)
-                # Asegurar que existe el directorio
-                os.makedirs(PROCESSED_DATA_DIR, exist_ok=True)
-                ml_file = os.path.join(PROCESSED_DATA_DIR, "ml_features.csv")
-                df.to_csv(ml_file, index=False)
-                logger.info(f"Datos para ML generados: {len(ml_data)} registros")
-                
-                # Crear gráfico de algunas características
-                plt.figure(figsize=(12, 6))
-                plt.plot(df["timestamp"], df["player_x"], label="Posición X")
-                plt.plot(df["timestamp"], df["player_y"], label="Posición Y")
-                plt.title('Trayectoria del Jugador')
-                plt.xlabel('Timestamp')
-                plt.ylabel('Coordenadas')
-                plt.legend()
-                plt.tight_layout()
-                
-                trajectory_path = os.path.join(abs_vis_dir, 'player_trajectory.png')
-                try:
-                    plt.savefig(trajectory_path)
-                    logger.info(f"Trayectoria guardada: {trajectory_path}")
-                except Exception as e:
-                    logger.error(f"Error al guardar trayectoria: {str(e)}")
-                    
-                plt.close()
-        else:
-            logger.warning("No hay suficientes estados para generar la trayectoria")
-    
+        # El pool se usa desde el bucle de eventos, no desde el pool de hilos nativos
+        inputs = prepare_visualizations(events)
+        results = visualization_renderer.submit(get_data_version(), inputs)
+        logger.info(f"Visualizaciones solicitadas: {results}")
     except Exception as e:
         logger.error(f"Error al generar visualizaciones: {str(e)}")
         logger.exception("Detalles del error:")
+    return results
+
+# Perfilador por muestreo de las peticiones HTTP (server.profiling en config.json). Solo en
+# modo threading: con eventlet/gevent cProfile registraría el trabajo de todas las corrutinas
+request_profiler = profiler.SamplingProfiler(app_config.current.profiling_enabled,
+                                            app_config.current.profiling_sample_rate,
+                                            supported=async_mode.mode == "threading")
+
+@app.before_request
+def start_request_timer():
+    """Marca el inicio de la petición y activa el perfilador si le toca muestra"""
+    g.request_start = time.perf_counter()
+    g.request_profile = request_profiler.start()
+
+# Se registra antes que compress_response para ejecutarse después (Flask los llama en orden
+# inverso), de modo que la latencia incluye la compresión. En las respuestas en streaming
+# mide el tiempo hasta que empieza el envío.
+@app.after_request
+def record_request_latency(response):
+    """Registra la latencia de la petición en el histograma de su ruta"""
+    start = g.get('request_start')
+    if start is not None:
+        metrics.HTTP_REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=request.endpoint or "unmatched",
+                                             method=request.method, status=response.status_code)
+    return response
+
+@app.teardown_request
+def stop_request_profile(error=None):
+    """Detiene el perfilador de la petición (también si terminó con una excepción)"""
+    profile = g.pop('request_profile', None)
+    if profile is not None:
+        request_profiler.stop(profile, request.endpoint or "unmatched", time.perf_counter() - g.request_start)
+
+@app.after_request
+def compress_response(response):
+    """Comprime las respuestas dinámicas grandes según Accept-Encoding"""
+    config = app_config.current
+    if (not config.compression_enabled or response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or 'Content-Encoding' in response.headers
+            or not compression.is_compressible(response.mimetype)):
+        return response
+    
+    data = response.get_data()
+    if len(data) < config.compression_min_size:
+        return response
+    
+    response.vary.add('Accept-Encoding')
+    encoding = compression.negotiate(request.accept_encodings)
+    if not encoding:
+        return response
+    
+    with metrics.HTTP_COMPRESSION_SECONDS.time(encoding=encoding):
+        compressed = compression.compress(data, encoding)
+    metrics.HTTP_COMPRESSION_BYTES.inc(len(data), stage="original")
+    metrics.HTTP_COMPRESSION_BYTES.inc(len(compressed), stage="compressed")
+    
+    response.set_data(compressed)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+def serve_static(filename):
+    """Sirve archivos estáticos usando la variante precomprimida si el cliente la acepta"""
+    if app_config.current.compression_enabled:
+        encoding, variant = compression.find_precompressed(os.path.join(app.static_folder, filename),
+                                                           request.accept_encodings)
+        if variant:
+            mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+            response = send_from_directory(app.static_folder, filename + compression.SUFFIXES[encoding],
+                                           mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            response.vary.add('Accept-Encoding')
+            return response
+    response = app.send_static_file(filename)
+    response.vary.add('Accept-Encoding')
+    return response
+
+app.view_functions['static'] = serve_static
 
 # Rutas web
 
@@ -772,58 +1235,50 @@ def api_control_sequence():
         }), 500
 
 # Funciones para manejar la configuración
-def load_configuration():
-    """Carga la configuración desde el archivo"""
-    config_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
-    try:
-        with open(config_file_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    except Exception as e:
-        logger.error(f"Error al cargar configuración desde {config_file_path}: {str(e)}")
-        return {
-            "server": {
-                "port": 5000,
-                "update_interval": 20,
-                "emit_throttle": 5,
-                "game_check_interval": 10
-            },
-            "database": {
-                "file": "dem_database.json",
-                "backup_interval": 3600,
-                "max_events": 100000
-            },
-            "data_capture": {
-                "frame_rate": 5,
-                "capture_player_data": True,
-                "capture_enemy_data": True
-            }
-        }
-
 def save_configuration(config_data):
-    """Guarda la configuración al archivo"""
-    config_file_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+    """
+    Guarda la configuración en config.json (con copia de seguridad) y la publica.
+    Lanza config_service.ConfigError si no es válida.
+    """
     try:
         # Hacer una copia de seguridad antes de guardar
-        if os.path.exists(config_file_path):
+        if os.path.exists(CONFIG_FILE):
             backup_dir = os.path.join(LOGS_DIR, "backups")
             os.makedirs(backup_dir, exist_ok=True)
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_file = os.path.join(backup_dir, f"config_{timestamp}.json")
-            shutil.copy2(config_file_path, backup_file)
+            shutil.copy2(CONFIG_FILE, backup_file)
         
-        # Guardar nueva configuración
-        with open(config_file_path, 'w', encoding='utf-8') as f:
-            json.dump(config_data, f, indent=4)
+        # Guardar nueva configuración (se valida y se publica a los componentes)
+        app_config.save(config_data)
         return True
-    except Exception as e:
-        logger.error(f"Error al guardar configuración en {config_file_path}: {str(e)}")
+    except OSError as e:
+        logger.error(f"Error al guardar configuración en {CONFIG_FILE}: {str(e)}")
         return False
 
+def apply_config(old, new):
+    """Aplica una configuración recién publicada a los componentes en ejecución"""
+    logger.setLevel(logging.DEBUG if new.verbose_logging else logging.INFO)
+    refresh_flight.min_interval = new.refresh_min_interval
+    # Solo si cambió en config.json, para no deshacer lo hecho con /api/admin/profile
+    if (old.profiling_enabled, old.profiling_sample_rate) != (new.profiling_enabled, new.profiling_sample_rate):
+        request_profiler.configure(new.profiling_enabled, new.profiling_sample_rate)
+    apply_job_config(new)
+    frame_buffer.configure(new.stream_quality, new.stream_max_fps)
+    # Notificar a clientes conectados
+    socketio.emit('config_updated', {
+        "message": "Configuración actualizada",
+        "version": new.version,
+        "changed": new.changed_keys(old),
+        "timestamp": datetime.now().isoformat()
+    })
+
+app_config.subscribe(apply_config)
+
 @app.route('/api/config', methods=['GET'])
 def api_get_config():
     """API para obtener la configuración actual"""
-    config_data = load_configuration()
-    return jsonify(config_data)
+    return jsonify(app_config.current.as_dict())
 
 @app.route('/api/config', methods=['POST'])
 def api_update_config():
@@ -844,49 +1299,101 @@ def api_update_config():
         # Guardar configuración
         if save_configuration(config_data):
             logger.info("Configuración actualizada correctamente")
-            # Notificar a clientes conectados
-            socketio.emit('config_updated', {
-                "message": "Configuración actualizada",
-                "timestamp": datetime.now().isoformat()
-            })
-            return jsonify({"success": True, "message": "Configuración actualizada correctamente"})
+            return jsonify({"success": True, "message": "Configuración actualizada correctamente",
+                            "version": app_config.current.version})
         else:
             return jsonify({"error": "Error al guardar la configuración"}), 500
-            
+    
+    except config_service.ConfigError as e:
+        return jsonify({"error": "Configuración no válida", "errors": e.errors}), 400
     except Exception as e:
         logger.error(f"Error en api_update_config: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/config/reload', methods=['POST'])
 def api_reload_config():
-    """API para recargar la configuración sin reiniciar el servidor"""
+    """API para recargar la configuración sin reiniciar el servidor (también se recarga sola al cambiar el archivo)"""
+    app_config.reload(force=True)
+    if app_config.last_error:
+        return jsonify({"error": app_config.last_error, "version": app_config.current.version}), 400
+    logger.info("Configuración recargada correctamente")
+    return jsonify({"success": True, "message": "Configuración recargada correctamente",
+                    "version": app_config.current.version})
+
+@app.route('/api/admin/config')
+def api_admin_config():
+    """Estado del servicio de configuración: versión publicada, vigilancia del archivo y último error"""
+    return jsonify(app_config.status())
+
+@app.route('/api/admin/cluster')
+def api_admin_cluster():
+    """Procesos del servidor: estado compartido, líder de las tareas en segundo plano y cola de mensajes"""
+    return jsonify({
+        "shared_state": state.describe(),
+        "leader": leader.status(),
+        "message_queue": bool(MESSAGE_QUEUE),
+        "data_version": state.counter("data_version"),
+    })
+
+@app.route('/api/admin/jobs')
+def api_admin_jobs():
+    """Tareas programadas: disparador, prioridad, duración, última y próxima ejecución"""
+    return jsonify(job_scheduler.status())
+
+@app.route('/api/admin/jobs/<name>', methods=['POST'])
+def api_admin_job_action(name):
+    """Acción sobre una tarea: run (ejecutar ya), pause o resume"""
+    action = (request.get_json(silent=True) or request.values).get('action', 'run')
     try:
-        global UPDATE_INTERVAL, EMIT_THROTTLE, GAME_CHECK_INTERVAL, CAPTURE_FRAME_RATE, CAPTURE_KEY_EVENTS, VERBOSE_LOGGING
-        
-        # Cargar configuración
-        config_data = load_configuration()
-        
-        # Actualizar variables globales
-        if 'server' in config_data:
-            server_config = config_data['server']
-            UPDATE_INTERVAL = server_config.get('update_interval', UPDATE_INTERVAL)
-            EMIT_THROTTLE = server_config.get('emit_throttle', EMIT_THROTTLE)
-            GAME_CHECK_INTERVAL = server_config.get('game_check_interval', GAME_CHECK_INTERVAL)
-        
-        if 'data_capture' in config_data:
-            capture_config = config_data['data_capture']
-            CAPTURE_FRAME_RATE = capture_config.get('frame_rate', CAPTURE_FRAME_RATE)
-        
-        if 'advanced' in config_data:
-            advanced_config = config_data['advanced']
-            VERBOSE_LOGGING = advanced_config.get('verbose_logging', VERBOSE_LOGGING)
-        
-        logger.info("Configuración recargada correctamente")
-        return jsonify({"success": True, "message": "Configuración recargada correctamente"})
-        
-    except Exception as e:
-        logger.error(f"Error al recargar configuración: {str(e)}")
-        return jsonify({"error": str(e)}), 500
+        if action == 'run':
+            if not job_scheduler.run_now(name):
+                return jsonify({"error": f"La tarea {name} ya está en ejecución"}), 409
+        elif action in ('pause', 'resume'):
+            job_scheduler.set_enabled(name, action == 'resume')
+        else:
+            return jsonify({"error": "action debe ser run, pause o resume"}), 400
+    except KeyError:
+        return jsonify({"error": f"Tarea desconocida: {name}"}), 404
+    logger.info(f"Tarea {name}: acción {action} solicitada")
+    return jsonify({"success": True, "job": name, "action": action})
+
+@app.route('/api/admin/routes')
+def api_admin_routes():
+    """Latencia por ruta: peticiones, media y percentiles aproximados (segundos), por tiempo total"""
+    routes = metrics.HTTP_REQUEST_SECONDS.summary()
+    routes.sort(key=lambda route: -(route["avg"] or 0) * route["count"])
+    return jsonify({"routes": routes})
+
+@app.route('/api/admin/profile')
+def api_admin_profile():
+    """Funciones más costosas de las peticiones muestreadas (?sort=cumulative|tottime|ncalls&limit=30)"""
+    try:
+        limit = int(request.args.get('limit', profiler.DEFAULT_TOP))
+        return jsonify(request_profiler.hot(request.args.get('sort', 'cumulative'), max(1, limit)))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/admin/profile', methods=['POST'])
+def api_admin_profile_action():
+    """Acción sobre el perfilador: enable (con sample_rate opcional), disable o reset"""
+    params = request.get_json(silent=True) or request.values
+    action = params.get('action')
+    if action == 'enable' and not request_profiler.supported:
+        return jsonify({"error": f"El perfilado solo está disponible en modo threading (modo {async_mode.mode})"}), 409
+    try:
+        if action == 'enable':
+            request_profiler.configure(True, params.get('sample_rate'))
+        elif action == 'disable':
+            request_profiler.configure(False)
+        elif action == 'reset':
+            request_profiler.reset()
+        else:
+            return jsonify({"error": "action debe ser enable, disable o reset"}), 400
+    except (TypeError, ValueError):
+        return jsonify({"error": "sample_rate debe ser un entero"}), 400
+    logger.info(f"Perfilador: acción {action} (1 de cada {request_profiler.sample_rate} peticiones)")
+    return jsonify({"success": True, "action": action, "enabled": request_profiler.enabled,
+                    "sample_rate": request_profiler.sample_rate})
 
 @app.route('/api/config/defaults', methods=['GET'])
 def api_get_default_config():
@@ -896,7 +1403,9 @@ def api_get_default_config():
             "port": 5000,
             "update_interval": 20,
             "emit_throttle": 5,
-            "game_check_interval": 10
+            "refresh_min_interval": 5,
+            "game_check_interval": 10,
+            "profiling": {"enabled": False, "sample_rate": profiler.DEFAULT_SAMPLE_RATE}
         },
         "database": {
             "file": "dem_database.json",
@@ -947,33 +1456,20 @@ def api_get_default_config():
     }
     return jsonify(default_config)
 
-# Función de sanitización para JSON que debe definirse antes de su uso
-def sanitize_for_json(obj):
-    """Asegura que todos los objetos sean serializables a JSON"""
-    if isinstance(obj, dict):
-        return {str(k): sanitize_for_json(v) for k, v in obj.items() 
-                if k is not None and v is not None}
-    elif isinstance(obj, list):
-        return [sanitize_for_json(item) for item in obj if item is not None]
-    elif obj is None:
-        return ""
-    elif isinstance(obj, (int, float, str, bool)):
-        return obj
-    elif hasattr(obj, 'to_dict'):  # Para objetos que implementan to_dict
-        return sanitize_for_json(obj.to_dict())
-    else:
-        return str(obj)  # Convertir otros tipos a string
-
 @app.route('/api/stats')
+@conditional_get("stats")
 def api_stats():
     """API para obtener estadísticas"""
     try:
         database = load_database()
+        instance = request.args.get('instance')
+        if instance:
+            database = {"events": partitions.filter_by_instance(database.get("events", []), instance),
+                        "metadata": database.get("metadata", {})}
         stats = get_event_stats(database)
         
-        # Verificar que todos los valores sean serializables
-        sanitized_stats = sanitize_for_json(stats)
-        return jsonify(sanitized_stats)
+        # Sin None y con tipos serializables (ver json_encoding.normalize)
+        return jsonify(json_encoding.normalize(stats))
     except Exception as e:
         logger.error(f"Error en api_stats: {str(e)}")
         return jsonify({
@@ -988,18 +1484,26 @@ def api_stats():
         })
 
 @app.route('/api/events')
+@conditional_get("events")
 def api_events():
-    """API para obtener todos los eventos (con paginación)"""
-    database = load_database()
-    
+    """
+    API para obtener todos los eventos (con paginación).
+    Con el parámetro cursor (vacío para la primera página) se usa paginación por
+    clave, ordenada por (timestamp, event_id) y estable aunque lleguen eventos nuevos.
+    """
     # Parámetros de paginación
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 100, type=int)
     
     # Limitar per_page a un máximo razonable
-    per_page = min(per_page, 1000)
+    per_page = max(1, min(per_page, 1000))
     
-    events = database.get("events", [])
+    cursor = request.args.get('cursor')
+    if cursor is not None:
+        return api_events_by_cursor(cursor, per_page, request.args.get('instance'))
+    
+    database = load_database()
+    events = partitions.filter_by_instance(database.get("events", []), request.args.get('instance'))
     total = len(events)
     
     # Calcular índices para la paginación
@@ -1019,111 +1523,355 @@ def api_events():
         }
     })
 
+def api_events_by_cursor(cursor, per_page, instance=None):
+    """Página de eventos posteriores al cursor, buscando en el índice ordenado"""
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    keys, events = get_events_index(instance)
+    start_idx = bisect.bisect_right(keys, after) if after is not None else 0
+    page_events = events[start_idx:start_idx + per_page]
+    end_idx = start_idx + len(page_events)
+    
+    # Aunque no haya más eventos se devuelve un cursor: al reutilizarlo
+    # se obtienen solo los eventos que se ingieran después
+    return jsonify({
+        "events": page_events,
+        "metadata": {
+            "total": len(events),
+            "per_page": per_page,
+            "has_more": end_idx < len(events),
+            "next_cursor": encode_cursor(keys[end_idx - 1]) if page_events else cursor
+        }
+    })
+
+def ndjson_response(events):
+    """
+    Respuesta en streaming con un evento JSON por línea (application/x-ndjson).
+    Si la lectura falla a mitad, la última línea es {"error": ...} y la conexión se
+    corta sin terminar la respuesta, para que el cliente no la tome por completa.
+    """
+    def generate():
+        try:
+            for event in events:
+                yield json.dumps(event) + "\n"
+        except ValueError as e:
+            yield json.dumps({"error": str(e)}) + "\n"
+            raise
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/api/events/<event_type>')
+@conditional_get("events_by_type")
 def api_events_by_type(event_type):
-    """API para obtener eventos por tipo"""
+    """API para obtener eventos por tipo (format=ndjson para recibirlos en streaming)"""
+    if request.args.get('format') == 'ndjson':
+        events = iter_database_events(request.args.get('instance'))
+        return ndjson_response(e for e in events if e.get("event_type") == event_type)
+    
     database = load_database()
-    events = [e for e in database.get("events", []) if e.get("event_type") == event_type]
+    events = partitions.filter_by_instance(database.get("events", []), request.args.get('instance'))
+    events = [e for e in events if e.get("event_type") == event_type]
     return jsonify(events)
 
 @app.route('/api/events/seed/<seed>')
+@conditional_get("events_by_seed")
 def api_events_by_seed(seed):
-    """API para obtener eventos por seed"""
+    """API para obtener eventos por seed (format=ndjson para recibirlos en streaming)"""
+    if request.args.get('format') == 'ndjson':
+        seed = int(seed)
+        events = iter_database_events(request.args.get('instance'))
+        return ndjson_response(e for e in events if e.get("game_data", {}).get("seed") == seed)
+    
     database = load_database()
-    events = [e for e in database.get("events", []) if e.get("game_data", {}).get("seed") == int(seed)]
+    events = partitions.filter_by_instance(database.get("events", []), request.args.get('instance'))
+    events = [e for e in events if e.get("game_data", {}).get("seed") == int(seed)]
     return jsonify(events)
 
+@app.route('/api/heatmaps/rooms')
+@conditional_get("heatmap_rooms")
+def api_heatmap_rooms():
+    """API con las salas que tienen mapa de calor (filtros room_shape, level, kind e instance)"""
+    kind = request.args.get('kind')
+    if kind is not None and kind not in room_heatmaps.KINDS:
+        return jsonify({"error": f"kind debe ser uno de {', '.join(room_heatmaps.KINDS)}"}), 400
+    
+    store = get_room_heatmaps(request.args.get('instance'))
+    rooms = store.summary(room_shape=request.args.get('room_shape', type=int),
+                          level=request.args.get('level', type=int), kind=kind) if store else []
+    return jsonify({"bin_size": room_heatmaps.BIN_SIZE, "total": len(rooms), "rooms": rooms})
+
+@app.route('/api/heatmaps/tile/<kind>/<int:room_shape>/<int(signed=True):room_id>/<int:level>')
+@conditional_get("heatmap_tile")
+def api_heatmap_tile(kind, room_shape, room_id, level):
+    """
+    Mapa de calor de una sala como PNG, o sus conteos con format=json.
+    Opciones: cmap, cell (píxeles por celda), norm (linear o log) e instance.
+    """
+    if kind not in room_heatmaps.KINDS:
+        return jsonify({"error": f"kind debe ser uno de {', '.join(room_heatmaps.KINDS)}"}), 404
+    cmap = request.args.get('cmap', 'hot')
+    norm = request.args.get('norm', 'linear')
+    cell = request.args.get('cell', 10, type=int)
+    if cmap not in render_service.CMAPS or norm not in ("linear", "log") or not 1 <= cell <= 40:
+        return jsonify({"error": "Parámetros no válidos (cmap, norm=linear|log, cell entre 1 y 40)"}), 400
+    
+    store = get_room_heatmaps(request.args.get('instance'))
+    counts = store.get(room_shape, room_id, level, kind) if store else None
+    if counts is None:
+        return jsonify({"error": "No hay datos para esta sala"}), 404
+    
+    if request.args.get('format') == 'json':
+        x_min, x_max, y_min, y_max = room_heatmaps.extent(room_shape)
+        return jsonify({"room_shape": room_shape, "room_id": room_id, "level": level, "kind": kind,
+                        "bin_size": room_heatmaps.BIN_SIZE,
+                        "extent": {"x_min": x_min, "x_max": x_max, "y_min": y_min, "y_max": y_max},
+                        "total": int(counts.sum()), "counts": counts.tolist()})
+    return Response(numpy_render.encode_png(numpy_render.counts_image(counts, cmap, cell, norm)),
+                    mimetype="image/png")
+
+@app.route('/api/instances')
+def api_instances():
+    """API para obtener las particiones de ingesta de cada instancia del juego"""
+    database = load_database()
+    found = database.get("metadata", {}).get("partitions")
+    if found is None:
+        found = {partitions.DEFAULT_INSTANCE: {
+            "total_events": len(database.get("events", [])),
+            "last_update": database.get("metadata", {}).get("last_update")
+        }}
+    
+    config = app_config.current
+    return jsonify({
+        "instances": {
+            name: {**found.get(name, {"total_events": 0, "last_update": None}),
+                   "configured": name in config.instances,
+                   "data_path": config.instances.get(name, {}).get("data_path")}
+            for name in sorted(set(found) | set(config.instances))
+        },
+        "partitions_dir": os.path.abspath(config.partitions_dir)
+    })
+
+def ml_features_format():
+    """Formato de /api/ml/features negociado con el parámetro format o con Accept"""
+    return feature_store.negotiate(request.args.get('format'), request.accept_mimetypes)
+
 @app.route('/api/ml/features')
+@conditional_get("ml_features", version=lambda: ml_features_version() or "none", variant=ml_features_format,
+                 vary=('Accept',))
 def api_ml_features():
-    """API para obtener características procesadas para ML"""
-    ml_file = os.path.join(PROCESSED_DATA_DIR, "ml_features.csv")
-    
-    if not os.path.exists(ml_file):
+    """
+    API para obtener características procesadas para ML. La tabla se mantiene en
+    memoria por versión de los datos. Parámetros: columns (separadas por comas),
+    start y stop (rango de filas) y format (npz, arrow o json; también se acepta
+    el tipo MIME en Accept). Sin formato se devuelven registros JSON, como mucho
+    feature_store.JSON_DEFAULT_ROWS filas si no se indica stop.
+    """
+    try:
+        table = ml_feature_cache.get()
+    except Exception as e:
+        logger.error(f"Error al cargar las características ML: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    if table is None or table.rows == 0:
         return jsonify({"error": "No hay datos de ML disponibles"}), 404
     
     try:
-        df = pd.read_csv(ml_file)
-        # Convertir a formato JSON
-        records = df.to_dict(orient='records')
-        return jsonify({
-            "features": records,
+        fmt = ml_features_format()
+        columns = [c.strip() for c in request.args.get('columns', '').split(',') if c.strip()]
+        rows = slice(request.args.get('start', type=int), request.args.get('stop', type=int))
+        start, stop, _ = rows.indices(table.rows)
+        if fmt == "json" and request.args.get('stop') is None:
+            stop = min(stop, start + feature_store.JSON_DEFAULT_ROWS)
+        selection = table.select(columns, start, stop)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    
+    if fmt == "json":
+        response = jsonify({
+            "features": selection.to_records(),
             "metadata": {
-                "columns": list(df.columns),
-                "shape": df.shape
+                "columns": selection.columns,
+                "shape": [selection.rows, len(selection.columns)],
+                "start": start,
+                "stop": max(start, stop),
+                "total_rows": table.rows
             }
         })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    else:
+        body = selection.to_npz() if fmt == "npz" else selection.to_arrow()
+        response = Response(body, mimetype=feature_store.MIMETYPES[fmt])
+        response.headers['Content-Disposition'] = f'inline; filename="ml_features.{fmt}"'
+        response.headers['X-Total-Rows'] = str(table.rows)
+    return response
 
 @app.route('/api/ml/download')
+@conditional_get("ml_download", version=lambda: ml_features_version() or "none")
 def api_ml_download():
-    """API para descargar el conjunto de datos ML completo"""
-    ml_file = os.path.join(PROCESSED_DATA_DIR, "ml_features.csv")
-    
-    if not os.path.exists(ml_file):
+    """
+    API para descargar el conjunto de datos ML completo (ml_features.csv). El CSV
+    se genera por bloques desde la tabla en memoria mientras se envía.
+    """
+    try:
+        table = ml_feature_cache.get()
+    except Exception as e:
+        logger.error(f"Error al cargar las características ML: {str(e)}")
+        return jsonify({"error": str(e)}), 500
+    if table is None or table.rows == 0:
         return jsonify({"error": "No hay datos de ML disponibles"}), 404
     
-    return send_from_directory(
-        PROCESSED_DATA_DIR, 
-        "ml_features.csv", 
-        as_attachment=True
-    )
+    response = Response(table.to_csv_blocks(), mimetype='text/csv')
+    response.headers['Content-Disposition'] = 'attachment; filename="ml_features.csv"'
+    response.headers['X-Total-Rows'] = str(table.rows)
+    return response
 
-@app.route('/api/refresh')
-def api_refresh():
-    """API para refrescar los datos (ejecuta extract_data.py)"""
-    global last_data_hash
-    import subprocess
-    
-    # Ejecutar con forzado para que no verifique si el juego está en ejecución
-    result = subprocess.run(["python", "extract_data.py", "--keep-originals", "--force"], capture_output=True, text=True)
+@app.route('/api/ml/exports', methods=['GET', 'POST'])
+def api_ml_exports():
+    """
+    GET: exportaciones disponibles. POST: lanza una exportación del historial
+    completo (JSON o parámetros: format, rows_per_shard, instance) y responde
+    202 con su manifiesto; si ya existe una con los mismos datos la devuelve.
+    """
+    if request.method == 'GET':
+        return jsonify({"exports": dataset_exporter.list(), "formats": dataset_export.available_formats()})
     
-    update_data = {
-        "success": result.returncode == 0,
-        "output": result.stdout,
-        "error": result.stderr,
-        "timestamp": datetime.now().isoformat()
-    }
+    params = request.get_json(silent=True) or request.values
+    instance = params.get('instance') or None
+    if instance and instance not in app_config.current.instances and instance != partitions.DEFAULT_INSTANCE:
+        return jsonify({"error": f"Instancia desconocida: {instance}"}), 404
+    try:
+        manifest = dataset_exporter.start(params.get('format', 'csv'),
+                                          int(params.get('rows_per_shard', EXPORT_ROWS_PER_SHARD)),
+                                          instance=instance, data_version=get_data_version())
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except TimeoutError as e:
+        return jsonify({"error": str(e)}), 503
+    status = 202 if manifest["status"] == "running" else 200
+    response = jsonify(manifest)
+    response.status_code = status
+    response.headers['Location'] = url_for('api_ml_export', export_id=manifest["export_id"])
+    return response
+
+@app.route('/api/ml/exports/<export_id>')
+def api_ml_export(export_id):
+    """Manifiesto de una exportación: estado, fragmentos, filas y SHA-256 de cada uno"""
+    manifest = dataset_exporter.manifest(export_id)
+    if manifest is None:
+        return jsonify({"error": "Exportación no encontrada"}), 404
+    return jsonify(manifest)
+
+@app.route('/api/ml/exports/<export_id>/<shard>')
+def api_ml_export_shard(export_id, shard):
+    """Descarga de un fragmento con soporte de Range (para reanudar) y ETag"""
+    path = dataset_exporter.shard_path(export_id, shard)
+    if path is None:
+        return jsonify({"error": "Fragmento no encontrado o exportación sin terminar"}), 404
+    response = send_from_directory(os.path.dirname(os.path.abspath(path)), shard,
+                                   as_attachment=True, conditional=True)
+    response.headers['Accept-Ranges'] = "bytes"
+    return response
+
+@app.route('/api/visualizations/list')
+def api_visualizations_list():
+    """Visualizaciones disponibles con la URL de la imagen más reciente"""
+    status = visualization_renderer.status()
+    visualizations = []
+    for chart, spec in render_service.CHARTS.items():
+        info = status.get(chart)
+        if info is None:
+            # Imágenes de una ejecución anterior del servidor
+            path = os.path.join(STATIC_FOLDER, "visualizations", spec["file"])
+            if not os.path.exists(path):
+                continue
+            info = {"title": spec["title"],
+                    "url": f"/static/visualizations/{spec['file']}?v={int(os.path.getmtime(path))}"}
+        visualizations.append({"name": chart, "title": info["title"], "url": info["url"],
+                               "rendered_at": info.get("rendered_at")})
+    return jsonify(visualizations)
+
+@app.route('/api/visualizations/<chart>')
+def api_visualization(chart):
+    """
+    Imagen de un gráfico con parámetros propios (por ejemplo ?bins=80&cmap=viridis
+    o ?renderer=matplotlib). Si aún no está en la caché se encarga y se responde 202.
+    """
+    if chart not in render_service.CHARTS:
+        return jsonify({"error": f"Gráfico desconocido: {chart}"}), 404
+    try:
+        params = render_service.parse_params(chart, request.args, visualization_renderer.renderer)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     
-    # Si la actualización fue exitosa, notificar a los clientes
-    if update_data["success"]:
-        database = load_database()
-        
-        # Comprobar si los datos han cambiado
-        current_hash = calculate_data_hash(database)
-        data_changed = current_hash != last_data_hash
-        last_data_hash = current_hash
-        
-        stats = get_event_stats(database)
-        
-        # Solo enviar notificación si los datos han cambiado
-        if data_changed:
-            # Generar visualizaciones
-            generate_visualizations(database)
-            
-            # Enviar datos sanitizados
-            sanitized_stats = sanitize_for_json(stats)
-            sanitized_update = sanitize_for_json(update_data)
-            
-            socketio.emit('data_updated', {
-                "stats": sanitized_stats,
-                "update_info": sanitized_update
-            })
-            logger.info("Datos actualizados manualmente y enviados a clientes")
-        else:
-            logger.info("Actualización manual: No hay cambios en los datos")
-    else:
-        logger.error(f"Error en actualización manual: {update_data['error']}")
+    state, path = visualization_renderer.render_variant(chart, params)
+    if state == "no_data":
+        return jsonify({"error": "No hay datos para este gráfico"}), 404
+    if state == "pending":
+        response = jsonify({"status": "pending", "chart": chart, "params": params})
+        response.status_code = 202
+        response.headers['Retry-After'] = "1"
+        return response
+    response = send_file(path, mimetype="image/png")
+    # La clave de la imagen depende de sus datos y parámetros
+    response.headers['Cache-Control'] = "private, max-age=60"
+    return response
+
+@app.route('/api/metrics')
+def api_metrics():
+    """API con las métricas de ingesta en formato de texto de Prometheus"""
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+@app.route('/api/refresh')
+def api_refresh():
+    """
+    API para refrescar los datos (ejecuta extract_data.py). Las solicitudes
+    simultáneas comparten una sola ejecución y reciben su resultado.
+    """
+    try:
+        outcome = request_refresh("api")
+    except Exception as e:
+        logger.error(f"Error en actualización manual: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
     
-    return jsonify(sanitize_for_json(update_data))
+    if not outcome.result["success"]:
+        logger.error(f"Error en actualización manual: {outcome.result['error']}")
+    return jsonify(json_encoding.normalize(dict(outcome.result, coalesced=outcome.how)))
+
+def ensure_topics_published():
+    """Publica el estado actual de los temas que aún no tienen ninguna versión"""
+    if topic_hub.version("stats") == 0:
+        topic_hub.publish("stats", get_current_stats())
+    if topic_hub.version("runs") == 0:
+        topic_hub.publish("runs", get_current_runs())
+    if topic_hub.version("game_status") == 0:
+        topic_hub.publish("game_status", get_game_status())
+    if topic_hub.version("vision") == 0:
+        topic_hub.publish("vision", vision_status)
+    if topic_hub.version("visualizations") == 0:
+        topic_hub.publish("visualizations", visualization_renderer.status())
+
+def subscribe_client(sid, requested_topics, versions=None):
+    """Suscribe un cliente a temas y le envía lo necesario para sincronizarse"""
+    if isinstance(requested_topics, str):
+        requested_topics = [requested_topics]
+    ensure_topics_published()
+    return topic_hub.subscribe(sid, requested_topics or [], versions,
+                               join_room=join_room, leave_room=leave_room)
 
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
     """Gestionar conexión de cliente WebSocket"""
     logger.info(f"Cliente conectado: {request.sid}")
-    # Enviar estadísticas actuales al cliente que se conecta
-    database = load_database()
-    stats = get_event_stats(database)
+    
+    # Clientes que se suscriben a temas al conectar: solo reciben sus temas
+    if isinstance(auth, dict) and auth.get("topics"):
+        subscribe_client(request.sid, auth["topics"], auth.get("versions"))
+        return
+    join_room(topics.LEGACY_ROOM)
+    
+    # Enviar estadísticas actuales al cliente que se conecta (no se recalculan por conexión)
+    stats = get_current_stats()
+    game_status = get_game_status()
     
     # Enviar estado actual del juego con el formato correcto
     socketio.emit('game_status_change', {
@@ -1135,7 +1883,7 @@ def handle_connect():
     
     # Enviar estadísticas
     socketio.emit('data_updated', {
-        "stats": sanitize_for_json(stats), 
+        "stats": stats, 
         "update_info": {
             "game_running": game_status.get("running", False),
             "timestamp": datetime.now().isoformat()
@@ -1147,87 +1895,45 @@ def handle_disconnect():
     """Gestionar desconexión de cliente WebSocket"""
     logger.info(f"Cliente desconectado: {request.sid}")
 
-def update_data():
-    """Actualiza los datos ejecutando el script extract_data.py y devuelve el resultado"""
-    import subprocess
-    global last_data_hash
-    
-    logger.info("Ejecutando actualización de datos...")
-    
-    try:
-        # Ejecutar el script de extracción con la opción de mantener archivos originales
-        result = subprocess.run(["python", "extract_data.py", "--keep-originals", "--force"], 
-                               capture_output=True, text=True)
-        
-        update_info = {
-            "success": result.returncode == 0,
-            "output": result.stdout,
-            "error": result.stderr,
-            "timestamp": datetime.now().isoformat()
-        }
-        
-        # Si la actualización fue exitosa, verificar cambios y notificar
-        if update_info["success"]:
-            database = load_database()
-            
-            # Comprobar si los datos han cambiado
-            current_hash = calculate_data_hash(database)
-            data_changed = current_hash != last_data_hash
-            last_data_hash = current_hash
-            
-            if data_changed:
-                stats = get_event_stats(database)
-                # Generar visualizaciones
-                generate_visualizations(database)
-                
-                # Enviar datos actualizados a todos los clientes
-                socketio.emit('data_updated', {
-                    "stats": sanitize_for_json(stats),
-                    "update_info": sanitize_for_json(update_info)
-                })
-                logger.info("Datos actualizados y enviados a clientes")
-                return True
-            else:
-                logger.info("Actualización completada: No hay cambios en los datos")
-                return False
-        else:
-            logger.error(f"Error en actualización de datos: {update_info['error']}")
-            return False
-    except Exception as e:
-        logger.error(f"Error en función update_data: {str(e)}")
-        return False
+@socketio.on('subscribe')
+def handle_subscribe(data):
+    """Suscribe al cliente a temas: {"topics": [...], "versions": {tema: versión conocida}}"""
+    data = data or {}
+    accepted = subscribe_client(request.sid, data.get("topics", []), data.get("versions"))
+    return {"success": True, "topics": accepted}
+
+@socketio.on('unsubscribe')
+def handle_unsubscribe(data):
+    """Cancela la suscripción a los temas indicados"""
+    topic_hub.unsubscribe(request.sid, (data or {}).get("topics", []), leave_room)
+    return {"success": True}
+
+@socketio.on('resync')
+def handle_resync(data):
+    """Reenvía la instantánea completa de un tema a un cliente que perdió deltas"""
+    topic_hub.resync(request.sid, (data or {}).get("topic"))
+    return {"success": True}
 
 @socketio.on('manual_update')
 def handle_manual_update(data):
     """Procesa una solicitud de actualización manual de datos."""
+    logger.info("Solicitud manual de actualización de datos recibida")
+    update_start_time = time.time()
     try:
-        global updating_data
-        logger.info("Solicitud manual de actualización de datos recibida")
-        
-        if updating_data:
-            logger.info("Ya hay una actualización en curso, ignorando solicitud")
-            return {"success": False, "error": "Ya hay una actualización en curso"}
-        
-        # Iniciar proceso de actualización
-        updating_data = True
-        update_start_time = time.time()
-        
-        try:
-            update_result = update_data()
-            
-            if update_result:
-                logger.info(f"Actualización manual completada en {time.time() - update_start_time:.2f} segundos")
-                return {"success": True}
-            else:
-                logger.warning("La actualización manual no encontró cambios")
-                return {"success": False, "error": "No se encontraron cambios"}
-        finally:
-            updating_data = False
-            
+        outcome = request_refresh("socket")
     except Exception as e:
         logger.error(f"Error en actualización manual: {str(e)}")
-        updating_data = False
         return {"success": False, "error": str(e)}
+    
+    update_info = outcome.result
+    if not update_info["success"]:
+        logger.error(f"Error en actualización de datos: {update_info['error']}")
+        return {"success": False, "error": update_info["error"], "coalesced": outcome.how}
+    if update_info["data_changed"]:
+        logger.info(f"Actualización manual completada en {time.time() - update_start_time:.2f} segundos")
+        return {"success": True, "coalesced": outcome.how}
+    logger.warning("La actualización manual no encontró cambios")
+    return {"success": False, "error": "No se encontraron cambios", "coalesced": outcome.how}
 
 @socketio.on('start_game')
 def handle_start_game(data):
@@ -1273,16 +1979,19 @@ def api_metadata():
     system_info = {
         "server_version": "2.0",
         "python_version": os.popen('python --version').read().strip(),
-        "database_file": os.path.abspath(DATABASE_FILE),
+        "database_file": os.path.abspath(app_config.current.database_file),
         "server_start_time": datetime.now().isoformat(),
         "available_endpoints": [
             "/api/stats",
             "/api/events",
             "/api/events/<event_type>",
             "/api/events/seed/<seed>",
+            "/api/instances",
             "/api/ml/features",
             "/api/ml/download",
+            "/api/ml/exports",
             "/api/refresh",
+            "/api/metrics",
             "/api/metadata"
         ]
     }
@@ -1292,6 +2001,13 @@ def api_metadata():
         "system_info": system_info
     })
 
+def set_vision_status(status, config=None):
+    """Actualiza el estado del sistema de visión y lo publica en el tema vision"""
+    vision_status.update(status=status, last_change=datetime.now().isoformat())
+    if config is not None:
+        vision_status["config"] = json_encoding.normalize(config)
+    topic_hub.publish("vision", vision_status)
+
 # Ruta para gestionar el sistema de visión por computadora
 @app.route('/api/vision', methods=['GET', 'POST'])
 def vision_system():
@@ -1303,9 +2019,7 @@ def vision_system():
     try:
         if request.method == 'GET':
             # Para solicitudes GET, simplemente devolvemos el estado actual
-            status = {'status': 'stopped'}
-            # Añadir más información sobre el estado si está disponible
-            return jsonify(status)
+            return jsonify(dict(vision_status, stream=frame_buffer.status()))
             
         elif request.method == 'POST':
             data = request.json
@@ -1339,6 +2053,7 @@ def vision_system():
                 
                 # Aquí se iniciaría el sistema real
                 # Por ahora devolvemos un estado simulado
+                set_vision_status("running", config)
                 return jsonify({
                     'status': 'success',
                     'message': 'Sistema de visión iniciado correctamente'
@@ -1349,6 +2064,7 @@ def vision_system():
                 logger.info("Deteniendo sistema de visión")
                 
                 # Aquí se detendría el sistema real
+                set_vision_status("stopped")
                 return jsonify({
                     'status': 'success',
                     'message': 'Sistema de visión detenido correctamente'
@@ -1379,72 +2095,102 @@ def vision_system():
             'message': str(e)
         })
 
+def simulated_jpeg():
+    """Frame simulado codificado en JPEG (en el pool de hilos nativos en eventlet/gevent)"""
+    return vision_stream.encode_jpeg(vision_stream.simulated_frame(), frame_buffer.quality)
+
+def external_frames_active():
+    return time.time() - vision_simulation["last_external"] < EXTERNAL_FRAME_TIMEOUT
+
+def simulate_vision_frames():
+    """
+    Publica frames simulados a max_fps mientras haya clientes de la transmisión
+    (termina tras EXTERNAL_FRAME_TIMEOUT segundos sin ninguno) y el sistema de
+    visión no esté enviando frames
+    """
+    idle_since = time.monotonic()
+    try:
+        while frame_buffer.clients > 0 or time.monotonic() - idle_since < EXTERNAL_FRAME_TIMEOUT:
+            started = time.monotonic()
+            if frame_buffer.clients > 0:
+                idle_since = started
+            if not external_frames_active():
+                frame_buffer.publish_jpeg(async_mode.run_blocking(simulated_jpeg))
+            time.sleep(max(0.0, 1.0 / frame_buffer.max_fps - (time.monotonic() - started)))
+    except Exception as e:
+        logger.error(f"Error al generar frames de visión simulados: {str(e)}")
+    finally:
+        with vision_simulation_lock:
+            vision_simulation["running"] = False
+
+def ensure_vision_frames():
+    """Arranca la simulación de frames si no hay otra en marcha"""
+    if not vision_stream.HAS_PILLOW:
+        return
+    with vision_simulation_lock:
+        if vision_simulation["running"]:
+            return
+        vision_simulation["running"] = True
+    socketio.start_background_task(simulate_vision_frames)
+
 # Endpoints para el sistema de visión por computadora
-@app.route('/api/vision/frame')
+@app.route('/api/vision/frame', methods=['GET'])
 def vision_frame():
     """
-    Devuelve el frame actual del sistema de visión o una imagen simulada
+    Devuelve el último frame del sistema de visión en JPEG, desde memoria. Sin
+    frames recientes del sistema de visión se publica antes un frame simulado.
+    """
+    if not external_frames_active() and frame_buffer.clients == 0:
+        try:
+            frame_buffer.publish_jpeg(async_mode.run_blocking(simulated_jpeg))
+        except Exception as e:
+            logger.error(f"Error al generar frame de visión simulado: {str(e)}")
+    frame = frame_buffer.latest()
+    if frame is None:
+        return send_from_directory(os.path.join(app.static_folder, 'img'), 'waiting.png')
+    response = Response(frame.jpeg, mimetype='image/jpeg')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+@app.route('/api/vision/frame', methods=['POST'])
+def publish_vision_frame():
     """
+    El sistema de visión publica aquí cada frame (cuerpo: la imagen, JPEG o PNG);
+    los JPEG se guardan tal cual y el resto se codifica con la calidad configurada
+    """
+    data = request.get_data(cache=False)
+    if not data:
+        return jsonify({"error": "Se requiere la imagen en el cuerpo de la petición"}), 400
     try:
-        # Crear una imagen simulada con matplotlib
-        plt.figure(figsize=(8, 6))
-        
-        # Fondo negro
-        plt.fill([0, 8, 8, 0], [0, 0, 6, 6], 'k')
-        
-        # Dibujar al jugador (círculo verde)
-        player_x = 4 + 0.5 * np.sin(time.time())
-        player_y = 3 + 0.3 * np.cos(time.time() * 1.5)
-        plt.plot(player_x, player_y, 'o', markersize=15, color='lime')
-        
-        # Dibujar enemigos (círculos rojos)
-        enemy_positions = [
-            (2 + 0.7 * np.sin(time.time() * 0.7), 2 + 0.7 * np.cos(time.time() * 0.5)),
-            (6 + 0.5 * np.sin(time.time() * 0.5), 4 + 0.6 * np.cos(time.time() * 0.7))
-        ]
-        for x, y in enemy_positions:
-            plt.plot(x, y, 'o', markersize=12, color='red')
-        
-        # Dibujar items (círculos azules)
-        item_position = (3.5 + 0.3 * np.sin(time.time() * 0.3), 5 + 0.2 * np.cos(time.time() * 0.3))
-        plt.plot(item_position[0], item_position[1], 'o', markersize=8, color='cyan')
-        
-        # Dibujar puertas (rectángulos amarillos)
-        door_x, door_y = 8, 3
-        plt.fill([door_x-0.5, door_x, door_x, door_x-0.5], 
-                 [door_y-0.5, door_y-0.5, door_y+0.5, door_y+0.5], 'yellow')
-        
-        # Configurar la visualización
-        plt.xlim(0, 8)
-        plt.ylim(0, 6)
-        plt.axis('off')
-        
-        # Guardar la imagen
-        img_path = os.path.join(app.static_folder, 'img', 'vision_simulation.png')
-        os.makedirs(os.path.dirname(img_path), exist_ok=True)
-        plt.savefig(img_path, bbox_inches='tight', pad_inches=0.1, dpi=100)
-        plt.close()
-            
-        return send_from_directory(os.path.dirname(img_path), os.path.basename(img_path))
-    except Exception as e:
-        logger.error(f"Error al generar frame de visión simulado: {str(e)}")
-        
-        # Si hay un error, devolver una imagen de placeholder
-        placeholder_path = os.path.join(app.static_folder, 'img', 'waiting.png')
-        
-        # Si no existe la carpeta o la imagen, crear una imagen simple
-        if not os.path.exists(placeholder_path):
-            os.makedirs(os.path.dirname(placeholder_path), exist_ok=True)
-            
-            # Crear una imagen simple usando matplotlib
-            plt.figure(figsize=(8, 6))
-            plt.text(0.5, 0.5, 'Error en el sistema de visión', 
-                     horizontalalignment='center', verticalalignment='center', fontsize=18, color='red')
-            plt.axis('off')
-            plt.savefig(placeholder_path, bbox_inches='tight', pad_inches=0.1)
-            plt.close()
-            
-        return send_from_directory(os.path.dirname(placeholder_path), os.path.basename(placeholder_path))
+        if data[:2] == vision_stream.JPEG_MAGIC:
+            seq = frame_buffer.publish_jpeg(data)
+        else:
+            seq = frame_buffer.publish_jpeg(async_mode.run_blocking(vision_stream.encode_jpeg, data,
+                                                                    frame_buffer.quality))
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 415
+    except (OSError, ValueError) as e:
+        return jsonify({"error": f"Imagen no válida: {str(e)}"}), 400
+    vision_simulation["last_external"] = time.time()
+    return jsonify({"success": True, "seq": seq})
+
+@app.route('/api/vision/stream')
+def vision_stream_mjpeg():
+    """
+    Transmisión MJPEG (multipart/x-mixed-replace) del último frame, para usar como
+    src de un <img>. ?fps= limita los frames por segundo (como mucho vision.stream.max_fps);
+    a los clientes lentos se les envía siempre el frame más reciente.
+    """
+    fps = request.args.get('fps', type=float)
+    fps = min(fps, frame_buffer.max_fps) if fps and fps > 0 else frame_buffer.max_fps
+    if frame_buffer.latest() is None and not vision_stream.HAS_PILLOW:
+        return jsonify({"error": "No hay frames del sistema de visión"}), 503
+    stream = frame_buffer.stream(fps)
+    ensure_vision_frames()
+    response = Response(stream, mimetype=f'multipart/x-mixed-replace; boundary={vision_stream.BOUNDARY}')
+    response.headers['Cache-Control'] = 'no-store'
+    response.headers['X-Accel-Buffering'] = 'no'  # Sin búfer en proxies como nginx
+    return response
 
 @app.route('/api/vision/detection')
 def vision_detection():
@@ -1552,21 +2298,34 @@ def vision_detection():
             'message': str(e)
         }), 500
 
+def create_app(start_services=True):
+    """
+    Inicializa el servidor y devuelve la aplicación Flask: logging, directorios de
+    trabajo y, con start_services, los archivos estáticos precomprimidos, la elección
+    del líder, la vigilancia de config.json y las tareas programadas. Importar app.py no hace nada de esto, así
+    que las herramientas que solo lo importan arrancan rápido; para desplegar con
+    un servidor WSGI se usa app:create_app().
+    """
+    global services_started
+    setup_logging()
+    ensure_directories()
+    if start_services and not services_started:
+        services_started = True
+        # Precomprimir los archivos estáticos en segundo plano: mientras tanto se sirven sin comprimir
+        if app_config.current.compression_enabled:
+            socketio.start_background_task(async_mode.run_blocking, compression.precompress_static, STATIC_FOLDER)
+        # Elección del líder (el que vigila el juego y actualiza los datos; con un solo
+        # proceso, siempre este) y tareas programadas
+        game_manager.monitor.subscribe(on_game_status_change)
+        leader.on_elected = on_elected
+        leader.elect()
+        leader.start(socketio.start_background_task)
+        app_config.start(socketio.start_background_task)
+        configure_jobs()
+        job_scheduler.start()
+    return app
+
 if __name__ == "__main__":
-    # Crear directorios si no existen
-    os.makedirs(STATIC_FOLDER, exist_ok=True)
-    os.makedirs(TEMPLATE_FOLDER, exist_ok=True)
-    
-    # Iniciar thread de actualización automática
-    thread_stop_event.clear()
-    update_thread = threading.Thread(target=update_data_background)
-    update_thread.daemon = True
-    update_thread.start()
-    
-    # Iniciar thread de verificación del juego
-    game_check_thread = threading.Thread(target=check_game_status)
-    game_check_thread.daemon = True
-    game_check_thread.start()
-    
-    logger.info(f"Servidor iniciado en http://localhost:{PORT}")
-    socketio.run(app, host="0.0.0.0", port=PORT, debug=True, allow_unsafe_werkzeug=True) 
\ No newline at end of file
+    create_app()
+    logger.info(f"Servidor iniciado en http://localhost:{PORT} (modo {ASYNC_MODE})")
+    socketio.run(app, host="0.0.0.0", port=PORT, debug=True, allow_unsafe_werkzeug=True)
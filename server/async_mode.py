@@ -0,0 +1,165 @@
+#!/usr/bin/env python
+"""
+Modo asíncrono del servidor: threading (por defecto), eventlet o gevent.
+
+El modo se elige con la variable de entorno DEM_ASYNC_MODE o con
+server.async_mode en config.json. Con eventlet o gevent cada cliente
+Socket.IO es una corrutina ligera, y las operaciones bloqueantes de
+almacenamiento (leer y parsear la base de datos, calcular estadísticas,
+generar gráficos) se ejecutan en un pool de hilos nativos para no detener el
+bucle de eventos.
+
+configure() debe llamarse antes de importar cualquier módulo que use
+sockets, hilos o subprocess (es lo primero que hace app.py).
+"""
+
+import os
+import json
+import logging
+import functools
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor, wait as wait_futures
+
+logger = logging.getLogger(__name__)
+
+MODES = ("threading", "eventlet", "gevent")
+ENV_VAR = "DEM_ASYNC_MODE"
+DEFAULT_POOL_SIZE = 8
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+
+mode = "threading"
+
+# Creado antes del monkey patching: es local a cada hilo nativo
+_worker_state = threading.local()
+
+
+def _server_config():
+    try:
+        with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f).get('server', {})
+    except Exception:
+        return {}
+
+
+def configure(requested=None, pool_size=None):
+    """
+    Aplica el modo asíncrono (monkey patching incluido) y devuelve el modo activo.
+    Si la librería del modo pedido no está instalada se usa threading.
+    """
+    global mode
+    if multiprocessing.current_process().name != "MainProcess":
+        # Proceso hijo del pool de renderizado (spawn importa de nuevo el módulo
+        # principal): no necesita el bucle de eventos
+        return mode
+    server_config = _server_config()
+    requested = (requested or os.environ.get(ENV_VAR) or server_config.get('async_mode') or "threading").lower()
+    pool_size = pool_size or server_config.get('worker_pool_size', DEFAULT_POOL_SIZE)
+
+    if requested not in MODES:
+        logger.warning(f"Modo asíncrono desconocido '{requested}', se usará threading")
+        requested = "threading"
+
+    try:
+        if requested == "eventlet":
+            import eventlet
+            eventlet.monkey_patch()
+            from eventlet import tpool
+            tpool.set_num_threads(pool_size)
+        elif requested == "gevent":
+            from gevent import monkey
+            monkey.patch_all()
+            import gevent
+            gevent.get_hub().threadpool.maxsize = pool_size
+    except ImportError as e:
+        logger.warning(f"No se puede usar el modo {requested} ({str(e)}), se usará threading")
+        requested = "threading"
+
+    mode = requested
+    return mode
+
+
+def _call_in_worker(func, args, kwargs):
+    _worker_state.active = True
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _worker_state.active = False
+
+
+def run_blocking(func, *args, **kwargs):
+    """
+    Ejecuta una función bloqueante en el pool de hilos nativos (eventlet/gevent)
+    y espera su resultado sin bloquear el bucle de eventos. En modo threading, o
+    si ya se está dentro del pool, la llama directamente.
+    """
+    if mode == "threading" or getattr(_worker_state, "active", False):
+        return func(*args, **kwargs)
+    if mode == "eventlet":
+        from eventlet import tpool
+        return tpool.execute(_call_in_worker, func, args, kwargs)
+    import gevent
+    return gevent.get_hub().threadpool.apply(_call_in_worker, (func, args, kwargs))
+
+
+def offload(func):
+    """Decorador: la función siempre se ejecuta mediante run_blocking"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return run_blocking(func, *args, **kwargs)
+    return wrapper
+
+
+class NativeExecutor:
+    """
+    Executor con la interfaz de concurrent.futures para eventlet/gevent: cada
+    tarea espera en una corrutina a run_blocking, así el trabajo se hace en el
+    pool de hilos nativos (un ThreadPoolExecutor creado tras el monkey patching
+    usaría corrutinas y bloquearía el bucle de eventos). Como mucho max_workers
+    tareas a la vez; los callbacks de los futures se ejecutan en la corrutina.
+    """
+
+    def __init__(self, max_workers):
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._futures = set()
+
+    def submit(self, func, *args, **kwargs):
+        future = Future()
+        self._futures.add(future)
+        future.add_done_callback(self._futures.discard)
+        _spawn(self._run, future, func, args, kwargs)
+        return future
+
+    def _run(self, future, func, args, kwargs):
+        with self._slots:
+            if not future.set_running_or_notify_cancel():
+                return
+            try:
+                result = run_blocking(func, *args, **kwargs)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    def shutdown(self, wait=True):
+        if wait:
+            wait_futures(list(self._futures))
+
+
+def _spawn(func, *args):
+    if mode == "eventlet":
+        import eventlet
+        eventlet.spawn(func, *args)
+    else:
+        import gevent
+        gevent.spawn(func, *args)
+
+
+def thread_executor(max_workers, thread_name_prefix=""):
+    """
+    Pool para trabajo bloqueante en hilos: un ThreadPoolExecutor en modo
+    threading y un NativeExecutor con eventlet o gevent
+    """
+    if mode == "threading":
+        return ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=thread_name_prefix)
+    return NativeExecutor(max_workers)
@@ -0,0 +1,144 @@
+#!/usr/bin/env python
+"""
+Benchmark de compresión de respuestas: bytes transmitidos y coste de CPU.
+
+Construye las respuestas reales de /api/events, /api/stats y /api/ml/features
+con datos sintéticos, además de los archivos estáticos, y mide para cada
+codificación el tamaño resultante y el tiempo de compresión y descompresión.
+
+Uso (desde la carpeta server):
+    python benchmarks/bench_compression.py --events 5000 --repeat 5
+"""
+
+import os
+import sys
+import gzip
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, SERVER_DIR)
+
+import compression
+import generate_events
+
+
+def encoders():
+    """Configuraciones a comparar: (nombre, comprimir, descomprimir)"""
+    configs = [
+        ("gzip-1", lambda d: compression.compress(d, "gzip", 1), gzip.decompress),
+        (f"gzip-{compression.GZIP_LEVEL} (dinámico)", lambda d: compression.compress(d, "gzip"), gzip.decompress),
+        (f"gzip-{compression.STATIC_GZIP_LEVEL} (estático)",
+         lambda d: compression.compress(d, "gzip", compression.STATIC_GZIP_LEVEL), gzip.decompress),
+    ]
+    if compression.BROTLI_AVAILABLE:
+        import brotli
+        configs += [
+            (f"br-{compression.BROTLI_QUALITY} (dinámico)", lambda d: compression.compress(d, "br"), brotli.decompress),
+            (f"br-{compression.STATIC_BROTLI_QUALITY} (estático)",
+             lambda d: compression.compress(d, "br", compression.STATIC_BROTLI_QUALITY), brotli.decompress),
+        ]
+    return configs
+
+
+def build_payloads(num_events, seed):
+    """Genera los cuerpos de respuesta de las APIs con el propio servidor"""
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+    import app
+    app.logger.setLevel(logging.WARNING)
+
+    events = generate_events.generate_dataset(num_events, seed=seed)
+    with open(app.DATABASE_FILE, 'w', encoding='utf-8') as f:
+        json.dump(generate_events.to_database(events), f)
+    app.generate_visualizations(app.load_database())
+
+    client = app.app.test_client()
+    payloads = []
+    for name, url in [("/api/events (100)", "/api/events?per_page=100"),
+                      ("/api/events (1000)", "/api/events?per_page=1000"),
+                      ("/api/stats", "/api/stats"),
+                      ("/api/ml/features", "/api/ml/features")]:
+        # Sin Accept-Encoding para obtener el cuerpo sin comprimir
+        response = client.get(url)
+        if response.status_code == 200:
+            payloads.append((name, response.get_data()))
+    return payloads
+
+
+def static_payloads():
+    """Archivos estáticos del repositorio"""
+    payloads = []
+    static_dir = os.path.join(SERVER_DIR, "static")
+    for root, _, files in os.walk(static_dir):
+        for filename in sorted(files):
+            if filename.endswith(compression.STATIC_EXTENSIONS):
+                with open(os.path.join(root, filename), 'rb') as f:
+                    payloads.append((os.path.relpath(os.path.join(root, filename), SERVER_DIR), f.read()))
+    return payloads
+
+
+def measure(func, data, repeat):
+    """Mediana en milisegundos de repeat ejecuciones; devuelve (ms, resultado)"""
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(data)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2], result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de compresión de respuestas')
+    parser.add_argument('--events', type=int, default=5000, help='Eventos sintéticos en la base de datos')
+    parser.add_argument('--repeat', type=int, default=5, help='Repeticiones por medición')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla del generador')
+    parser.add_argument('--output', help='Guardar los resultados en un archivo JSON')
+    args = parser.parse_args()
+
+    # app.py escribe logs y directorios relativos al directorio actual
+    workdir = tempfile.mkdtemp(prefix="dem_bench_")
+    cwd = os.getcwd()
+    try:
+        os.chdir(workdir)
+        os.makedirs("logs", exist_ok=True)
+        payloads = build_payloads(args.events, args.seed)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+    payloads += static_payloads()
+
+    if not compression.BROTLI_AVAILABLE:
+        print("Nota: brotli no está instalado, solo se mide gzip")
+
+    results = []
+    print(f"{'respuesta':<46}{'codificación':<24}{'bytes':>12}{'ratio':>8}{'comprimir ms':>14}{'descomprimir ms':>17}")
+    for name, data in payloads:
+        print(f"{name:<46}{'identity':<24}{len(data):>12,}{1:>8.2f}{0:>14.2f}{0:>17.2f}")
+        for encoding, compress, decompress in encoders():
+            compress_ms, compressed = measure(compress, data, args.repeat)
+            decompress_ms, restored = measure(decompress, compressed, args.repeat)
+            assert restored == data
+            ratio = len(compressed) / len(data) if data else 1
+            print(f"{'':<46}{encoding:<24}{len(compressed):>12,}{ratio:>8.2f}{compress_ms:>14.2f}{decompress_ms:>17.2f}")
+            results.append({"response": name, "encoding": encoding, "original_bytes": len(data),
+                            "compressed_bytes": len(compressed), "ratio": round(ratio, 4),
+                            "compress_ms": round(compress_ms, 3), "decompress_ms": round(decompress_ms, 3)})
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
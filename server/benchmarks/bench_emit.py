@@ -0,0 +1,115 @@
+#!/usr/bin/env python
+"""
+Benchmark de la codificación de las estadísticas que se emiten por Socket.IO.
+
+Compara el camino anterior (sanitize_for_json, que reconstruye cada
+diccionario y lista, y el paquete Socket.IO estándar) con
+json_encoding.normalize (un recorrido que solo copia lo que cambia) y
+json_encoding.Packet. Se mide lo que hace una emisión: preparar el mensaje
+data_updated y crear y codificar el paquete (incluida la detección de datos
+binarios), para estadísticas con miles de tipos de evento. También se
+mide un mensaje con contadores de NumPy (np.int64), que el camino anterior
+convertía en texto.
+
+Uso (desde la carpeta server):
+    python benchmarks/bench_emit.py --event-types 100,1000,10000,50000 --repeat 50
+"""
+
+import os
+import sys
+import time
+import random
+import argparse
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.insert(0, SERVER_DIR)
+
+import numpy as np  # noqa: E402
+from socketio import packet  # noqa: E402
+
+import json_encoding  # noqa: E402
+
+
+def sanitize_for_json(obj):
+    """Sanitización anterior de app.py"""
+    if isinstance(obj, dict):
+        return {str(k): sanitize_for_json(v) for k, v in obj.items()
+                if k is not None and v is not None}
+    elif isinstance(obj, list):
+        return [sanitize_for_json(item) for item in obj if item is not None]
+    elif obj is None:
+        return ""
+    elif isinstance(obj, (int, float, str, bool)):
+        return obj
+    elif hasattr(obj, 'to_dict'):
+        return sanitize_for_json(obj.to_dict())
+    else:
+        return str(obj)
+
+
+def make_stats(event_types, rng, numpy_counts=False):
+    """Estadísticas con la forma de get_event_stats y event_types tipos de evento"""
+    counts = {f"event_type_{index:05d}": rng.randint(1, 100000) for index in range(event_types)}
+    if numpy_counts:
+        counts = {name: np.int64(count) for name, count in counts.items()}
+    return {
+        "total_events": sum(int(count) for count in counts.values()),
+        "event_types": counts,
+        "time_range": {"min": 1700000000.0, "max": 1700003600.5},
+        "player_stats": {"positions_captured": 12345, "health_records": 12000},
+        "enemy_stats": {"total_enemies": 54321, "positions_captured": 50000},
+        "unique_seeds": 42,
+        "last_update": datetime.now().isoformat(),
+    }
+
+
+def encode_packet(payload, packet_class, prepare):
+    """Lo que hace socketio.emit('data_updated', ...): preparar el mensaje y crear y codificar el paquete"""
+    message = {"stats": prepare(payload["stats"]), "update_info": prepare(payload["update_info"])}
+    return packet_class(packet.EVENT, data=["data_updated", message], namespace="/").encode()
+
+
+def measure(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return samples[len(samples) // 2], samples[int(len(samples) * 0.95)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la codificación de las emisiones de estadísticas')
+    parser.add_argument('--event-types', default="100,1000,10000,50000", help='Tipos de evento, separados por comas')
+    parser.add_argument('--repeat', type=int, default=50, help='Emisiones medidas por caso')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla del generador')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    update_info = {"data_changed": True, "new_events": 1234, "error": None, "timestamp": datetime.now().isoformat()}
+
+    print(f"{'tipos':>8} {'contadores':<10}{'anterior ms':>13}{'p95':>8}{'nuevo ms':>11}{'p95':>8}{'mejora':>9}")
+    for count in (int(value) for value in args.event_types.split(",")):
+        for numpy_counts in (False, True):
+            payload = {"stats": make_stats(count, rng, numpy_counts), "update_info": update_info}
+            legacy = encode_packet(payload, packet.Packet, sanitize_for_json)
+            current = encode_packet(payload, json_encoding.Packet, json_encoding.normalize)
+            if not numpy_counts and legacy != current:
+                print("ERROR: los paquetes codificados no coinciden")
+                return 1
+            legacy_median, legacy_p95 = measure(lambda: encode_packet(payload, packet.Packet, sanitize_for_json),
+                                                 args.repeat)
+            new_median, new_p95 = measure(lambda: encode_packet(payload, json_encoding.Packet, json_encoding.normalize),
+                                          args.repeat)
+            print(f"{count:>8} {'numpy' if numpy_counts else 'int':<10}{legacy_median * 1000:>13.3f}"
+                  f"{legacy_p95 * 1000:>8.3f}{new_median * 1000:>11.3f}{new_p95 * 1000:>8.3f}"
+                  f"{legacy_median / new_median:>8.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
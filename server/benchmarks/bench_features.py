@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+"""
+Benchmark de extracción de características para ML.
+
+Compara la extracción fila a fila anterior (un diccionario por frame y un
+DataFrame de registros, sin los enemigos) con feature_extraction.extract
+(listas planas y cálculo por lotes con NumPy, incluida la distancia al enemigo
+más cercano), y mide la actualización incremental del almacén: añadir una
+ingesta pequeña frente a reconstruirlo con todos los eventos.
+
+Uso (desde la carpeta server):
+    python benchmarks/bench_features.py --events 200000 --repeat 3
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, SERVER_DIR)
+
+import pandas as pd  # noqa: E402
+
+import generate_events  # noqa: E402
+import feature_extraction  # noqa: E402
+
+
+def legacy_features(frame_states):
+    """Extracción anterior de write_ml_features (sin el límite de 1000 frames)"""
+    ml_data = []
+    for state in frame_states:
+        data = state.get("data", {})
+        player = data.get("player", {})
+        inputs = data.get("inputs", {})
+        player_position = player.get("position", {})
+        player_velocity = player.get("velocity", {})
+        player_health = player.get("health", {})
+        ml_data.append({
+            "frame_count": data.get("frame_count", 0),
+            "player_x": player_position.get("x", 0) if player_position is not None else 0,
+            "player_y": player_position.get("y", 0) if player_position is not None else 0,
+            "player_vx": player_velocity.get("x", 0) if player_velocity is not None else 0,
+            "player_vy": player_velocity.get("y", 0) if player_velocity is not None else 0,
+            "player_health": player_health.get("hearts", 0) if player_health is not None else 0,
+            "input_left": inputs.get("LEFT", 0) if inputs is not None else 0,
+            "input_right": inputs.get("RIGHT", 0) if inputs is not None else 0,
+            "input_up": inputs.get("UP", 0) if inputs is not None else 0,
+            "input_down": inputs.get("DOWN", 0) if inputs is not None else 0,
+            "shoot_left": inputs.get("SHOOT_LEFT", 0) if inputs is not None else 0,
+            "shoot_right": inputs.get("SHOOT_RIGHT", 0) if inputs is not None else 0,
+            "shoot_up": inputs.get("SHOOT_UP", 0) if inputs is not None else 0,
+            "shoot_down": inputs.get("SHOOT_DOWN", 0) if inputs is not None else 0,
+            "timestamp": state.get("timestamp", 0)
+        })
+    return pd.DataFrame(ml_data)
+
+
+def best_of(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de extracción de características para ML')
+    parser.add_argument('--events', type=int, default=200000, help='Eventos sintéticos')
+    parser.add_argument('--entity-density', type=float, default=4.0, help='Media de enemigos por sala')
+    parser.add_argument('--repeat', type=int, default=3, help='Repeticiones (se toma la mejor)')
+    parser.add_argument('--increment', type=int, default=1000, help='Eventos de una ingesta incremental')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla del generador')
+    args = parser.parse_args()
+
+    events = generate_events.generate_dataset(args.events, entity_density=args.entity_density, seed=args.seed)
+    frame_states = [e for e in events if e.get("event_type") == "frame_state"]
+    frames = len(frame_states)
+    print(f"{len(events)} eventos, {frames} frame_state")
+
+    results = [
+        ("fila a fila (anterior)", best_of(lambda: legacy_features(frame_states), args.repeat)),
+        ("por columnas", best_of(lambda: feature_extraction.extract(events), args.repeat)),
+    ]
+    print(f"{'extracción':<26}{'segundos':>10}{'frames/s':>14}{'frames/min':>14}")
+    for name, seconds in results:
+        print(f"{name:<26}{seconds:>10.3f}{frames / seconds:>14,.0f}{frames * 60 / seconds:>14,.0f}")
+
+    workdir = tempfile.mkdtemp(prefix="dem_features_")
+    try:
+        path = os.path.join(workdir, feature_extraction.STORE_DIR)
+        increment = events[-args.increment:]
+        rebuild = best_of(lambda: (shutil.rmtree(path, ignore_errors=True),
+                                   feature_extraction.update_store(path, [], all_events=events[:-args.increment])),
+                          args.repeat)
+        append = best_of(lambda: feature_extraction.update_store(path, increment), args.repeat)
+        load = best_of(lambda: feature_extraction.load_store(path), args.repeat)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print()
+    print(f"Almacén: reconstruir {rebuild * 1000:.1f} ms, añadir {args.increment} eventos {append * 1000:.1f} ms, "
+          f"cargar {load * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,187 @@
+#!/usr/bin/env python
+"""
+Benchmark de ingesta, almacenamiento y estadísticas con datos sintéticos.
+
+Mide process_log_file, save_database y load_database (extract_data.py) y
+get_event_stats (app.py) para cada tamaño indicado, registrando el throughput
+y el pico de memoria residente (RSS). Cada tamaño se ejecuta en un proceso
+independiente dentro de un directorio temporal para que las mediciones de
+memoria no se contaminen entre sí.
+
+Uso (desde la carpeta server):
+    python benchmarks/bench_ingest.py --sizes 10000,100000,1000000 --output resultados.json
+
+Nota: con la densidad por defecto cada frame_state ocupa ~2.5 KB, por lo que
+1M de eventos requiere varios GB de memoria y disco. Use --entity-density para
+reducir el tamaño de los eventos.
+"""
+
+import os
+import gc
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import importlib.util
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+ROOT_DIR = os.path.dirname(SERVER_DIR)
+
+DEFAULT_SIZES = "10000,100000,1000000"
+STAGES = ["generate", "process_log_file", "save_database", "load_database", "get_event_stats"]
+
+
+def peak_rss_mb():
+    """Pico de memoria residente del proceso en MB (None si no está disponible)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux devuelve KB; macOS devuelve bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _load_root_extract_data():
+    """Importa extract_data.py de la raíz sin chocar con server/extract_data.py"""
+    spec = importlib.util.spec_from_file_location("dem_extract_data", os.path.join(ROOT_DIR, "extract_data.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def run_child(size, runs, entity_density, seed):
+    """Ejecuta todas las etapas para un tamaño y devuelve los resultados"""
+    sys.path.insert(0, BENCH_DIR)
+    sys.path.insert(0, SERVER_DIR)
+    import generate_events
+
+    results = {"events": size, "stages": {}}
+
+    # Los módulos escriben logs y directorios relativos al directorio actual
+    os.makedirs("logs", exist_ok=True)
+    extract_data = _load_root_extract_data()
+    extract_data.ensure_directories_exist()
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+    import app
+    app.logger.setLevel(logging.WARNING)
+    results["baseline_rss_mb"] = round(peak_rss_mb(), 1) if peak_rss_mb() is not None else None
+
+    def record(stage, elapsed, nbytes=None):
+        entry = {
+            "seconds": round(elapsed, 4),
+            "events_per_second": round(size / elapsed, 1) if elapsed > 0 else None,
+            "peak_rss_mb": round(peak_rss_mb(), 1) if peak_rss_mb() is not None else None
+        }
+        if nbytes is not None:
+            entry["mb_per_second"] = round(nbytes / (1024 * 1024) / elapsed, 2) if elapsed > 0 else None
+        results["stages"][stage] = entry
+
+    # 1. Generar el log sintético que leería el extractor
+    start = time.perf_counter()
+    events = generate_events.generate_dataset(size, runs=runs, entity_density=entity_density, seed=seed)
+    os.makedirs("dem_logs", exist_ok=True)
+    log_file = os.path.join("dem_logs", "synthetic.json")
+    with open(log_file, 'w', encoding='utf-8') as f:
+        json.dump(events, f)
+    del events
+    gc.collect()
+    log_bytes = os.path.getsize(log_file)
+    record("generate", time.perf_counter() - start, log_bytes)
+    results["log_file_mb"] = round(log_bytes / (1024 * 1024), 2)
+
+    database = extract_data.load_database("missing_database.json")
+
+    # 2. Procesar el log (parseo, enriquecimiento y deduplicación)
+    start = time.perf_counter()
+    new_events = extract_data.process_log_file(log_file, database, keep_originals=True)
+    record("process_log_file", time.perf_counter() - start, log_bytes)
+    results["new_events"] = new_events
+
+    # 3. Guardar la base de datos
+    db_file = "dem_database.json"
+    start = time.perf_counter()
+    extract_data.save_database(database, db_file)
+    elapsed = time.perf_counter() - start
+    db_bytes = os.path.getsize(db_file)
+    record("save_database", elapsed, db_bytes)
+    results["database_file_mb"] = round(db_bytes / (1024 * 1024), 2)
+
+    del database
+    gc.collect()
+
+    # 4. Cargar la base de datos
+    start = time.perf_counter()
+    database = extract_data.load_database(db_file)
+    record("load_database", time.perf_counter() - start, db_bytes)
+
+    # 5. Calcular estadísticas
+    start = time.perf_counter()
+    app.get_event_stats(database)
+    record("get_event_stats", time.perf_counter() - start)
+
+    return results
+
+
+def print_table(all_results):
+    print(f"{'eventos':>10}  {'etapa':<18}{'segundos':>10}{'eventos/s':>14}{'MB/s':>10}{'pico RSS MB':>13}")
+    for result in all_results:
+        if "error" in result:
+            print(f"{result['events']:>10}  ERROR: {result['error']}")
+            continue
+        for stage in STAGES:
+            entry = result["stages"].get(stage)
+            if not entry:
+                continue
+            mbps = entry.get("mb_per_second")
+            rss = entry.get("peak_rss_mb")
+            print(f"{result['events']:>10}  {stage:<18}{entry['seconds']:>10.3f}"
+                  f"{entry['events_per_second'] or 0:>14,.0f}"
+                  f"{(f'{mbps:.1f}' if mbps is not None else '-'):>10}"
+                  f"{(f'{rss:.1f}' if rss is not None else '-'):>13}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de ingesta con eventos sintéticos')
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='Tamaños separados por comas')
+    parser.add_argument('--runs', type=int, default=5, help='Partidas por conjunto de datos')
+    parser.add_argument('--entity-density', type=float, default=4.0, help='Media de enemigos por sala')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla del generador')
+    parser.add_argument('--output', help='Guardar los resultados en un archivo JSON')
+    parser.add_argument('--child', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_child(args.child, args.runs, args.entity_density, args.seed)))
+        return 0
+
+    all_results = []
+    for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+        workdir = tempfile.mkdtemp(prefix="dem_bench_")
+        try:
+            command = [sys.executable, os.path.abspath(__file__), "--child", str(size),
+                       "--runs", str(args.runs), "--entity-density", str(args.entity_density),
+                       "--seed", str(args.seed)]
+            completed = subprocess.run(command, cwd=workdir, capture_output=True, text=True)
+            if completed.returncode != 0:
+                all_results.append({"events": size, "error": completed.stderr.strip().splitlines()[-1:]})
+            else:
+                all_results.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_table(all_results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(all_results, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
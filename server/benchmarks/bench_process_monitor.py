@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark de la latencia de verificación del proceso del juego.
+
+Compara el método anterior (lanzar tasklist / ps -A y buscar el nombre en la
+salida) con process_monitor: recorrido completo de procesos, vigilancia de un
+PID conocido y lectura desde la caché.
+
+Uso (desde la carpeta server):
+    python benchmarks/bench_process_monitor.py --iterations 200
+"""
+
+import os
+import sys
+import time
+import platform
+import argparse
+import subprocess
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import process_monitor
+
+
+def legacy_check():
+    """Reproduce la verificación anterior de game_manager.is_game_running"""
+    if platform.system() == 'Windows':
+        output = subprocess.check_output("tasklist /FO CSV /NH", shell=True,
+                                         stderr=subprocess.DEVNULL).decode('utf-8', errors='ignore')
+    else:
+        output = subprocess.check_output(['ps', '-A'], stderr=subprocess.DEVNULL).decode('utf-8', errors='ignore')
+    output_lower = output.lower()
+    return any(name.lower() in output_lower for name in process_monitor.DEFAULT_PROCESS_NAMES)
+
+
+def measure(func, iterations):
+    """Ejecuta func varias veces y devuelve (media, p95, máximo) en milisegundos"""
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return sum(samples) / len(samples), samples[int(len(samples) * 0.95) - 1], samples[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de verificación del proceso del juego')
+    parser.add_argument('--iterations', type=int, default=100, help='Repeticiones por método')
+    args = parser.parse_args()
+
+    scan_monitor = process_monitor.ProcessMonitor(cache_duration=0)
+    pid_monitor = process_monitor.ProcessMonitor(cache_duration=0)
+    pid_monitor.watch_pid(os.getpid())
+    cached_monitor = process_monitor.ProcessMonitor()
+    cached_monitor.check()
+
+    def monitor_scan():
+        scan_monitor.watch_pid(None)
+        scan_monitor.check()
+
+    results = [
+        ("subprocess (anterior)", measure(legacy_check, args.iterations)),
+        (f"monitor: recorrido ({scan_monitor.backend})", measure(monitor_scan, args.iterations)),
+        ("monitor: PID vigilado", measure(pid_monitor.check, args.iterations)),
+        ("monitor: caché", measure(cached_monitor.get_status, args.iterations)),
+    ]
+
+    print(f"Sistema: {platform.system()} - {args.iterations} iteraciones por método")
+    print(f"{'Método':<34}{'media (ms)':>12}{'p95 (ms)':>12}{'máx (ms)':>12}")
+    for name, (mean, p95, worst) in results:
+        print(f"{name:<34}{mean:>12.3f}{p95:>12.3f}{worst:>12.3f}")
+
+    baseline = results[0][1][0]
+    for name, (mean, _, _) in results[1:]:
+        if mean > 0:
+            print(f"{name}: {baseline / mean:.1f}x más rápido que el método anterior")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+"""
+Benchmark de renderizado de visualizaciones: NumPy frente a matplotlib.
+
+Cada renderizador se mide en un proceso nuevo para que la memoria y el tiempo
+de importación no se mezclen: extracción de los datos de entrada, primer
+renderizado de los tres gráficos (incluye importar matplotlib), mediana de los
+renderizados siguientes, tamaño de los PNG y memoria residente máxima. El
+renderizador matplotlib usa el mismo código de dibujo que generate_visualizations
+antes de separar el renderizado.
+
+También se mide la memoria del servidor tras importar app.py, con y sin
+matplotlib cargado.
+
+Uso (desde la carpeta server):
+    python benchmarks/bench_render.py --events 20000 --repeat 5
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.insert(0, BENCH_DIR)
+sys.path.insert(0, SERVER_DIR)
+
+
+def rss_mb():
+    """Memoria residente actual en MB (solo Linux)"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def peak_rss_mb():
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        return None
+
+
+def measure_renderer(renderer, events_file, repeat):
+    """Proceso de medición de un renderizador; imprime el resultado en JSON"""
+    import render_service
+
+    with open(events_file, 'r', encoding='utf-8') as f:
+        events = json.load(f)["events"]
+    rss_start = rss_mb()
+
+    start = time.perf_counter()
+    inputs = render_service.collect_inputs(events)
+    inputs_ms = (time.perf_counter() - start) * 1000
+
+    workdir = tempfile.mkdtemp(prefix="dem_render_")
+    result = {"renderer": renderer, "inputs_ms": round(inputs_ms, 1), "charts": {}}
+    try:
+        first_total = 0
+        for chart, spec in render_service.CHARTS.items():
+            if chart not in inputs:
+                continue
+            params = dict(spec["params"], renderer=renderer)
+            path = os.path.join(workdir, spec["file"])
+            first = render_service.render_chart(chart, inputs[chart], params, path)
+            first_total += first
+            samples = sorted(render_service.render_chart(chart, inputs[chart], params, path) for _ in range(repeat))
+            result["charts"][chart] = {"first_ms": round(first * 1000, 1),
+                                       "median_ms": round(samples[len(samples) // 2] * 1000, 1),
+                                       "png_bytes": os.path.getsize(path)}
+        result["first_total_ms"] = round(first_total * 1000, 1)
+        result["warm_total_ms"] = round(sum(c["median_ms"] for c in result["charts"].values()), 1)
+        result["rss_delta_mb"] = round(rss_mb() - rss_start, 1)
+        result["peak_rss_mb"] = round(peak_rss_mb(), 1)
+        result["matplotlib_loaded"] = "matplotlib" in sys.modules
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(result))
+
+
+def measure_server():
+    """Proceso de medición de la memoria del servidor tras importar app.py"""
+    import logging
+    logging.disable(logging.CRITICAL)
+    workdir = tempfile.mkdtemp(prefix="dem_render_app_")
+    os.chdir(workdir)
+    os.makedirs("logs", exist_ok=True)
+    try:
+        import app  # noqa: F401
+        result = {"app_rss_mb": round(rss_mb(), 1), "matplotlib_loaded": "matplotlib" in sys.modules}
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot  # noqa: F401
+        result["app_with_matplotlib_rss_mb"] = round(rss_mb(), 1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(result))
+
+
+def run_child(*args):
+    output = subprocess.run([sys.executable, os.path.abspath(__file__), *args],
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de renderizado de visualizaciones')
+    parser.add_argument('--events', type=int, default=20000, help='Eventos sintéticos')
+    parser.add_argument('--repeat', type=int, default=5, help='Renderizados en caliente por gráfico')
+    parser.add_argument('--renderers', default="numpy,matplotlib", help='Renderizadores separados por comas')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla del generador')
+    parser.add_argument('--output', help='Guardar los resultados en un archivo JSON')
+    parser.add_argument('--measure', help=argparse.SUPPRESS)
+    parser.add_argument('--events-file', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.measure == "server":
+        measure_server()
+        return 0
+    if args.measure:
+        measure_renderer(args.measure, args.events_file, args.repeat)
+        return 0
+
+    import generate_events
+    import render_service
+
+    workdir = tempfile.mkdtemp(prefix="dem_render_")
+    try:
+        events_file = os.path.join(workdir, "events.json")
+        events = generate_events.generate_dataset(args.events, seed=args.seed)
+        with open(events_file, 'w', encoding='utf-8') as f:
+            json.dump(generate_events.to_database(events), f)
+
+        results = []
+        for renderer in [r.strip() for r in args.renderers.split(",") if r.strip()]:
+            if renderer == "matplotlib" and not render_service.MATPLOTLIB_AVAILABLE:
+                print("matplotlib no está instalado, se omite")
+                continue
+            print(f"Midiendo {renderer} con {args.events} eventos...", flush=True)
+            results.append(run_child("--measure", renderer, "--events-file", events_file,
+                                     "--repeat", str(args.repeat)))
+        server = run_child("--measure", "server")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(f"{'renderizador':<13}{'gráfico':<20}{'primero ms':>12}{'mediana ms':>12}{'PNG bytes':>12}")
+    for r in results:
+        for chart, c in r["charts"].items():
+            print(f"{r['renderer']:<13}{chart:<20}{c['first_ms']:>12}{c['median_ms']:>12}{c['png_bytes']:>12,}")
+    print()
+    print(f"{'renderizador':<13}{'entradas ms':>12}{'primero total ms':>18}{'caliente total ms':>19}"
+          f"{'RSS +MB':>9}{'RSS máx MB':>12}")
+    for r in results:
+        print(f"{r['renderer']:<13}{r['inputs_ms']:>12}{r['first_total_ms']:>18}{r['warm_total_ms']:>19}"
+              f"{r['rss_delta_mb']:>9}{r['peak_rss_mb']:>12}")
+    print()
+    print(f"Servidor (app.py importado): {server['app_rss_mb']} MB"
+          f" (matplotlib cargado: {'sí' if server['matplotlib_loaded'] else 'no'});"
+          f" con matplotlib.pyplot: {server['app_with_matplotlib_rss_mb']} MB")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"renderers": results, "server": server}, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
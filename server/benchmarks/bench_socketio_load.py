@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""
+Prueba de carga de Socket.IO: capacidad de conexiones concurrentes y latencia
+de emisión en cada modo asíncrono del servidor.
+
+Para cada modo se arranca app.py en un proceso aparte (en un directorio
+temporal con una base de datos sintética), se conectan N clientes WebSocket
+repartidos en varios procesos y se emiten varias difusiones a todos ellos,
+midiendo cuánto tarda cada cliente en recibirlas.
+
+Uso (desde la carpeta server):
+    python benchmarks/bench_socketio_load.py --modes threading,eventlet,gevent --clients 500
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import argparse
+import tempfile
+import threading
+import subprocess
+import multiprocessing
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path.insert(0, BENCH_DIR)
+
+
+def percentile(samples, fraction):
+    if not samples:
+        return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_rss_mb(pid):
+    """Memoria residente del servidor en MB (solo Linux)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+
+
+def serve(mode, port):
+    """Proceso servidor: app.py en el modo indicado con un evento de prueba para difundir"""
+    os.environ["DEM_ASYNC_MODE"] = mode
+    sys.path.insert(0, SERVER_DIR)
+    import logging
+    logging.getLogger().setLevel(logging.WARNING)
+    import app
+    app.logger.setLevel(logging.WARNING)
+
+    @app.socketio.on('bench_broadcast')
+    def bench_broadcast(data):
+        app.socketio.emit('bench', {"seq": data["seq"], "sent": time.time(), "stats": app.get_current_stats()})
+        return {"emitted_at": time.time()}
+
+    print(f"READY {app.ASYNC_MODE}", flush=True)
+    app.socketio.run(app.app, host="127.0.0.1", port=port, log_output=False, allow_unsafe_werkzeug=True)
+
+
+def client_worker(url, count, connect_timeout, results, done):
+    """Proceso cliente: abre count conexiones y registra la latencia de cada difusión"""
+    import socketio
+
+    latencies = []
+    connect_times = []
+    failures = []
+    lock = threading.Lock()
+    clients = []
+
+    def connect_one():
+        client = socketio.Client(reconnection=False)
+
+        @client.on('bench')
+        def on_bench(data):
+            with lock:
+                latencies.append((data["seq"], time.time() - data["sent"]))
+
+        start = time.perf_counter()
+        try:
+            client.connect(url, transports=['websocket'], wait_timeout=connect_timeout)
+            with lock:
+                connect_times.append(time.perf_counter() - start)
+                clients.append(client)
+        except Exception as e:
+            with lock:
+                failures.append(str(e))
+
+    threads = [threading.Thread(target=connect_one) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    results.put(("connected", len(clients), len(failures)))
+
+    done.wait()
+    with lock:
+        results.put(("result", connect_times, latencies, failures[:5]))
+    for client in clients:
+        try:
+            client.disconnect()
+        except Exception:
+            pass
+
+
+def run_mode(mode, args):
+    """Arranca el servidor en el modo dado, lanza los clientes y devuelve el resumen"""
+    import socketio
+    import generate_events
+
+    workdir = tempfile.mkdtemp(prefix="dem_load_")
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    server = None
+    try:
+        os.makedirs(os.path.join(workdir, "logs"))
+        events = generate_events.generate_dataset(args.events, seed=args.seed)
+        with open(os.path.join(workdir, "dem_database.json"), 'w', encoding='utf-8') as f:
+            json.dump(generate_events.to_database(events), f)
+
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), "--serve", mode, "--port", str(port)],
+                                  cwd=workdir, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        ready = server.stdout.readline().split()
+        if not ready or ready[0] != "READY":
+            return {"mode": mode, "error": "el servidor no arrancó"}
+        active_mode = ready[1]
+        time.sleep(0.5)
+
+        ctx = multiprocessing.get_context("spawn")
+        results = ctx.Queue()
+        done = ctx.Event()
+        per_process = [args.clients // args.processes + (1 if i < args.clients % args.processes else 0)
+                       for i in range(args.processes)]
+        workers = [ctx.Process(target=client_worker, args=(url, n, args.connect_timeout, results, done))
+                   for n in per_process if n]
+
+        connect_start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        connected = failed = 0
+        for _ in workers:
+            _, ok, ko = results.get()
+            connected += ok
+            failed += ko
+        connect_wall = time.perf_counter() - connect_start
+        rss_connected = server_rss_mb(server.pid)
+
+        # Difusiones desde un cliente de control
+        control = socketio.Client(reconnection=False)
+        control.connect(url, transports=['websocket'])
+        emit_calls = []
+        for seq in range(args.broadcasts):
+            start = time.perf_counter()
+            control.call('bench_broadcast', {"seq": seq}, timeout=120)
+            emit_calls.append(time.perf_counter() - start)
+            time.sleep(args.interval)
+        time.sleep(2)
+        control.disconnect()
+
+        done.set()
+        connect_times, latencies, failures = [], [], []
+        for _ in workers:
+            _, times, lats, errors = results.get()
+            connect_times += times
+            latencies += [latency for _, latency in lats]
+            failures += errors
+        for worker in workers:
+            worker.join(timeout=30)
+
+        expected = connected * args.broadcasts
+        return {
+            "mode": active_mode,
+            "clients": args.clients,
+            "connected": connected,
+            "failed": failed,
+            "connect_wall_s": round(connect_wall, 2),
+            "connect_p50_ms": round(percentile(connect_times, 0.5) * 1000, 1) if connect_times else None,
+            "connect_p99_ms": round(percentile(connect_times, 0.99) * 1000, 1) if connect_times else None,
+            "delivered": len(latencies),
+            "delivery_ratio": round(len(latencies) / expected, 4) if expected else 0,
+            "emit_call_p50_ms": round(percentile(emit_calls, 0.5) * 1000, 1),
+            "latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 1) if latencies else None,
+            "latency_p99_ms": round(percentile(latencies, 0.99) * 1000, 1) if latencies else None,
+            "latency_max_ms": round(max(latencies) * 1000, 1) if latencies else None,
+            "server_rss_mb": round(rss_connected, 1) if rss_connected else None,
+            "sample_errors": failures[:3]
+        }
+    finally:
+        if server is not None:
+            server.terminate()
+            try:
+                server.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga de Socket.IO por modo asíncrono')
+    parser.add_argument('--modes', default="threading,eventlet,gevent", help='Modos separados por comas')
+    parser.add_argument('--clients', type=int, default=500, help='Clientes concurrentes')
+    parser.add_argument('--processes', type=int, default=4, help='Procesos que reparten los clientes')
+    parser.add_argument('--broadcasts', type=int, default=10, help='Difusiones a todos los clientes')
+    parser.add_argument('--interval', type=float, default=0.5, help='Segundos entre difusiones')
+    parser.add_argument('--events', type=int, default=2000, help='Eventos sintéticos en la base de datos')
+    parser.add_argument('--connect-timeout', type=float, default=30, help='Tiempo máximo de conexión por cliente')
+    parser.add_argument('--seed', type=int, default=42, help='Semilla del generador')
+    parser.add_argument('--output', help='Guardar los resultados en un archivo JSON')
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve(args.serve, args.port)
+        return 0
+
+    all_results = []
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        print(f"Probando modo {mode} con {args.clients} clientes...", flush=True)
+        all_results.append(run_mode(mode, args))
+
+    print(f"{'modo':<11}{'conectados':>11}{'fallos':>8}{'conexión p50/p99 ms':>22}"
+          f"{'entregas':>10}{'latencia p50/p99/máx ms':>27}{'RSS MB':>9}")
+    for r in all_results:
+        if "error" in r:
+            print(f"{r['mode']:<11} ERROR: {r['error']}")
+            continue
+        connect = f"{r['connect_p50_ms']}/{r['connect_p99_ms']}"
+        latency = f"{r['latency_p50_ms']}/{r['latency_p99_ms']}/{r['latency_max_ms']}"
+        print(f"{r['mode']:<11}{r['connected']:>11}{r['failed']:>8}{connect:>22}"
+              f"{r['delivery_ratio']:>10.1%}{latency:>27}{r['server_rss_mb'] or '-':>9}")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(all_results, f, indent=2)
+        print(f"Resultados guardados en {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
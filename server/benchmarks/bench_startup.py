@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Benchmark del tiempo de arranque del servidor.
+
+Cada medición es un proceso nuevo con "python -X importtime" que importa
+app.py y llama a create_app(start_services=False): se toma el tiempo
+acumulado de importar app (según -X importtime), el de create_app y qué
+módulos pesados quedaron cargados. pandas, NumPy, matplotlib y pyarrow se
+importan bajo demanda (lazy.py) y no deberían cargarse al arrancar.
+
+El script termina con código 1 si la mediana supera el presupuesto (--budget-ms,
+por defecto DEFAULT_BUDGET_MS; 0 lo desactiva) o si se cargó alguno de los
+módulos prohibidos. Lo ejecuta el flujo de CI .github/workflows/startup.yml.
+
+Uso (desde la carpeta server):
+    python benchmarks/bench_startup.py --repeat 5
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SERVER_DIR = os.path.dirname(BENCH_DIR)
+
+FORBIDDEN_MODULES = "pandas,numpy,matplotlib,pyarrow"
+# import app tarda unos 310 ms en un equipo de desarrollo: margen para máquinas de CI más lentas
+DEFAULT_BUDGET_MS = 600
+
+
+def measure_app(forbidden):
+    """Proceso de medición: importa app.py y llama a create_app; imprime el resultado en JSON"""
+    import logging
+    logging.disable(logging.CRITICAL)
+    sys.path.insert(0, SERVER_DIR)
+    workdir = tempfile.mkdtemp(prefix="dem_startup_")
+    os.chdir(workdir)
+    try:
+        start = time.perf_counter()
+        import app
+        import_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        app.create_app(start_services=False)
+        create_ms = (time.perf_counter() - start) * 1000
+        result = {"import_ms": round(import_ms, 1), "create_app_ms": round(create_ms, 1),
+                  "loaded": [name for name in forbidden if name in sys.modules]}
+    finally:
+        os.chdir(SERVER_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+    print(json.dumps(result))
+
+
+def parse_importtime(stderr):
+    """{módulo: (propio_us, acumulado_us)} a partir de la salida de -X importtime"""
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        modules.setdefault(name.strip(), (int(self_us), int(cumulative_us)))
+    return modules
+
+
+def run_child(forbidden):
+    process = subprocess.run([sys.executable, "-X", "importtime", os.path.abspath(__file__),
+                              "--measure", "--forbidden", ",".join(forbidden)],
+                             capture_output=True, text=True, check=True)
+    result = json.loads(process.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(process.stderr)
+    result["importtime_ms"] = round(modules.get("app", (0, 0))[1] / 1000, 1)
+    result["modules"] = modules
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del tiempo de arranque del servidor')
+    parser.add_argument('--repeat', type=int, default=5, help='Procesos de medición (se toma la mediana)')
+    parser.add_argument('--budget-ms', type=float, default=DEFAULT_BUDGET_MS,
+                        help='Presupuesto para importar app.py (código 1 si se supera; 0 lo desactiva)')
+    parser.add_argument('--forbidden', default=FORBIDDEN_MODULES,
+                        help='Módulos que no deben cargarse al arrancar, separados por comas')
+    parser.add_argument('--top', type=int, default=10, help='Módulos más lentos a mostrar')
+    parser.add_argument('--output', help='Guardar los resultados en un archivo JSON')
+    parser.add_argument('--measure', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    forbidden = [name for name in args.forbidden.split(",") if name]
+    if args.measure:
+        measure_app(forbidden)
+        return 0
+
+    runs = [run_child(forbidden) for _ in range(args.repeat)]
+    runs.sort(key=lambda run: run["importtime_ms"])
+    median = runs[len(runs) // 2]
+
+    print(f"{'medición':<28}{'mediana ms':>12}{'mín ms':>10}{'máx ms':>10}")
+    for key, name in (("importtime_ms", "import app (-X importtime)"), ("import_ms", "import app (reloj)"),
+                      ("create_app_ms", "create_app")):
+        values = sorted(run[key] for run in runs)
+        print(f"{name:<28}{values[len(values) // 2]:>12.1f}{values[0]:>10.1f}{values[-1]:>10.1f}")
+
+    print()
+    print("Módulos de primer nivel más lentos (acumulado, mediana):")
+    top_level = {name: times for name, times in median["modules"].items() if "." not in name}
+    for name, (_, cumulative) in sorted(top_level.items(), key=lambda item: -item[1][1])[:args.top]:
+        print(f"  {name:<30}{cumulative / 1000:>10.1f} ms")
+
+    failures = []
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+    if loaded:
+        failures.append(f"módulos cargados al arrancar: {', '.join(loaded)}")
+    if args.budget_ms and median["importtime_ms"] > args.budget_ms:
+        failures.append(f"import app tarda {median['importtime_ms']:.1f} ms (presupuesto {args.budget_ms:.0f} ms)")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({"runs": [{key: value for key, value in run.items() if key != "modules"} for run in runs],
+                       "budget_ms": args.budget_ms, "failures": failures}, f, indent=2)
+
+    print()
+    if failures:
+        for failure in failures:
+            print(f"ERROR: {failure}")
+        return 1
+    print("Arranque dentro del presupuesto" if args.budget_ms else "Sin módulos pesados al arrancar")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,325 @@
+#!/usr/bin/env python
+"""
+Generador de eventos sintéticos del mod DEM.
+
+Produce flujos de eventos con el mismo esquema que recoge el mod (frame_state
+con jugador, entidades, sala e inputs; player_damage; room_entered; game_start y
+game_exit) para medir la extracción, el almacenamiento y las estadísticas a
+escala realista. Las entidades incluyen is_enemy, que es el campo que leen
+get_event_stats y enrich_event_data.
+
+Uso (desde la carpeta server):
+    python benchmarks/generate_events.py --events 100000 --runs 5 --format array --output eventos.json
+"""
+
+import sys
+import json
+import math
+import random
+import argparse
+import itertools
+from datetime import datetime
+
+FRAME_INTERVAL = 5          # Igual que data_capture.frame_rate en config.json
+ROOM_BOUNDS = (60.0, 140.0, 580.0, 420.0)  # Límites aproximados de una sala 1x1 (x_min, y_min, x_max, y_max)
+ROOM_SHAPES = [1, 1, 1, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12]
+ROOM_TYPES = [1, 1, 1, 1, 1, 2, 4, 5, 7]
+ENEMY_TYPES = [10, 13, 14, 15, 18, 21, 23, 24, 25, 29, 30, 85, 208, 226, 244]
+INPUT_CHANNELS = ["LEFT", "RIGHT", "UP", "DOWN", "SHOOT_LEFT", "SHOOT_RIGHT", "SHOOT_UP", "SHOOT_DOWN"]
+
+
+def _quick_hash(text):
+    """Hash djb2 de 32 bits, igual que quickHash en data_manager.lua"""
+    value = 5381
+    for char in text.encode('utf-8'):
+        value = ((value << 5) + value + char) & 0xFFFFFFFF
+    return value
+
+
+def _clamp_position(x, y):
+    x_min, y_min, x_max, y_max = ROOM_BOUNDS
+    return min(max(x, x_min), x_max), min(max(y, y_min), y_max)
+
+
+def _poisson(rng, mean):
+    """Muestra de una distribución de Poisson (algoritmo de Knuth)"""
+    if mean <= 0:
+        return 0
+    limit, k, p = math.exp(-mean), 0, 1.0
+    while True:
+        p *= rng.random()
+        if p <= limit:
+            return k
+        k += 1
+
+
+class _RunState:
+    """Estado de una partida sintética"""
+
+    def __init__(self, rng, entity_density):
+        self.rng = rng
+        self.entity_density = entity_density
+        self.seed = rng.randrange(1, 2 ** 32)
+        self.level = 1
+        self.stage_type = 0
+        self.rooms_in_level = 0
+        self.hearts = 6
+        self.x, self.y = 320.0, 280.0
+        self.vx, self.vy = 0.0, 0.0
+        self.inputs = {channel: False for channel in INPUT_CHANNELS}
+        self.enemies = []
+        self.enter_room()
+
+    def enter_room(self):
+        rng = self.rng
+        self.room_id = rng.randrange(0, 169)
+        self.room_type = rng.choice(ROOM_TYPES)
+        self.room_shape = rng.choice(ROOM_SHAPES)
+        self.room_frames = 0
+        self.rooms_in_level += 1
+        if self.rooms_in_level > 10:
+            self.level += 1
+            self.stage_type = rng.choice([0, 0, 1, 2])
+            self.rooms_in_level = 0
+        self.enemies = []
+        for index in range(_poisson(rng, self.entity_density)):
+            enemy_type = rng.choice(ENEMY_TYPES)
+            hp = float(rng.choice([5, 8, 10, 15, 20, 40]))
+            x, y = _clamp_position(rng.uniform(60, 580), rng.uniform(140, 420))
+            self.enemies.append({
+                "index": index + 1,
+                "type": enemy_type,
+                "variant": rng.randrange(0, 3),
+                "x": x, "y": y, "vx": 0.0, "vy": 0.0,
+                "hp": hp, "max_hp": hp,
+                "ai_state": rng.randrange(0, 16)
+            })
+
+    def game_data(self, frame):
+        return {
+            "room_type": self.room_type,
+            "level": self.level,
+            "frame_count": frame,
+            "seed": self.seed,
+            "stage_type": self.stage_type,
+            "room_id": self.room_id
+        }
+
+    def step(self, frames):
+        """Avanza la simulación: inputs, movimiento del jugador y de los enemigos"""
+        rng = self.rng
+        self.room_frames += frames
+        if rng.random() < 0.2:
+            for channel in INPUT_CHANNELS:
+                self.inputs[channel] = rng.random() < 0.25
+        ax = (self.inputs["RIGHT"] - self.inputs["LEFT"]) * 0.9
+        ay = (self.inputs["DOWN"] - self.inputs["UP"]) * 0.9
+        self.vx = max(-5.0, min(5.0, self.vx * 0.8 + ax * frames))
+        self.vy = max(-5.0, min(5.0, self.vy * 0.8 + ay * frames))
+        self.x, self.y = _clamp_position(self.x + self.vx * frames, self.y + self.vy * frames)
+
+        for enemy in self.enemies:
+            dx, dy = self.x - enemy["x"], self.y - enemy["y"]
+            distance = math.hypot(dx, dy) or 1.0
+            enemy["vx"] = dx / distance * 2.0 + rng.uniform(-0.5, 0.5)
+            enemy["vy"] = dy / distance * 2.0 + rng.uniform(-0.5, 0.5)
+            enemy["x"], enemy["y"] = _clamp_position(enemy["x"] + enemy["vx"] * frames,
+                                                     enemy["y"] + enemy["vy"] * frames)
+            if any(self.inputs[channel] for channel in INPUT_CHANNELS[4:]) and rng.random() < 0.05:
+                enemy["hp"] = max(0.0, enemy["hp"] - 3.5)
+        self.enemies = [enemy for enemy in self.enemies if enemy["hp"] > 0]
+
+    def frame_state(self, frame, tick):
+        player = {
+            "position": {"x": self.x, "y": self.y},
+            "velocity": {"x": self.vx, "y": self.vy},
+            "health": {
+                "hearts": self.hearts,
+                "max_hearts": 6,
+                "soul_hearts": 0,
+                "black_hearts": 0,
+                "bone_hearts": 0,
+                "eternal_hearts": 0,
+                "golden_hearts": 0
+            },
+            "stats": {
+                "speed": 1.0,
+                "tears": 10.0,
+                "damage": 3.5,
+                "range": -23.75,
+                "shot_speed": 1.0,
+                "luck": 0.0
+            },
+            "effects": {"is_flying": False, "has_spectral": False, "has_homing": False},
+            "tear_flags": 0,
+            "player_type": 0,
+            "items": []
+        }
+        entities = []
+        for enemy in self.enemies:
+            entities.append({
+                "type": enemy["type"],
+                "variant": enemy["variant"],
+                "subtype": 0,
+                "position": {"x": enemy["x"], "y": enemy["y"]},
+                "velocity": {"x": enemy["vx"], "y": enemy["vy"]},
+                "hp": enemy["hp"],
+                "max_hp": enemy["max_hp"],
+                "entity_flags": 0,
+                "frame": self.room_frames,
+                "is_enemy": True,
+                "ai_state": enemy["ai_state"],
+                "is_champion": False,
+                "is_boss": False,
+                "target": {"x": self.x, "y": self.y},
+                "velocity_change": {"x": 0.0, "y": 0.0},
+                "position_delta": {"x": enemy["vx"], "y": enemy["vy"]},
+                "time_in_room": self.room_frames
+            })
+        return {
+            "frame_count": frame,
+            "tick": tick,
+            "time": frame,
+            "player": player,
+            "entities": entities,
+            "room": {"id": self.room_id, "type": self.room_type, "clear": not self.enemies},
+            "inputs": dict(self.inputs)
+        }
+
+
+def _make_event(run, event_type, frame, data):
+    return {
+        "game_data": run.game_data(frame),
+        "timestamp": frame,
+        "data": data,
+        "event_type": event_type,
+        "event_id": f"dem_{event_type}_{frame}_{run.seed % 10000}",
+        "processed_timestamp": datetime.now().isoformat()
+    }
+
+
+def generate_events(runs=1, session_length=18000, entity_density=4.0, frame_interval=FRAME_INTERVAL, seed=None):
+    """
+    Genera eventos sintéticos partida a partida.
+
+    runs: número de partidas.
+    session_length: duración de cada partida en frames del juego (30 por segundo).
+    entity_density: media de enemigos por sala.
+    frame_interval: se captura un frame_state cada N frames.
+    """
+    rng = random.Random(seed)
+    for _ in range(runs):
+        run = _RunState(rng, entity_density)
+        yield _make_event(run, "game_start", 0, {"continued": False, "player_type": 0, "hard_mode": False})
+        yield _make_event(run, "room_entered", 0, {"room_type": run.room_type, "room_shape": run.room_shape})
+
+        tick = 0
+        for frame in range(frame_interval, session_length + 1, frame_interval):
+            run.step(frame_interval)
+            tick += 1
+
+            if run.room_frames > 300 and (not run.enemies or rng.random() < 0.01):
+                run.enter_room()
+                yield _make_event(run, "room_entered", frame, {"room_type": run.room_type, "room_shape": run.room_shape})
+
+            if run.enemies and rng.random() < 0.002 * len(run.enemies):
+                run.hearts = max(1, run.hearts - 1)
+                yield _make_event(run, "player_damage", frame, {
+                    "hp_after": run.hearts,
+                    "player_index": 0,
+                    "source_type": rng.choice(ENEMY_TYPES),
+                    "damage_amount": 1.0,
+                    "soul_hearts_after": 0,
+                    "damage_flags": 0
+                })
+
+            yield _make_event(run, "frame_state", frame, run.frame_state(frame, tick))
+
+        yield _make_event(run, "game_exit", session_length, {"timestamp": session_length})
+
+
+def generate_dataset(total_events, runs=1, entity_density=4.0, frame_interval=FRAME_INTERVAL, seed=None):
+    """Genera exactamente total_events eventos repartidos entre las partidas indicadas"""
+    session_length = max(frame_interval, math.ceil(total_events / max(1, runs)) * frame_interval)
+    events = generate_events(runs, session_length, entity_density, frame_interval, seed)
+    return list(itertools.islice(events, total_events))
+
+
+def to_package(events, file_id=1):
+    """Convierte eventos al formato de paquete que guarda data_manager.lua (saveEventBuffer)"""
+    package_events = []
+    for event in events:
+        data = event.get("data", {})
+        hash_parts = []
+        if isinstance(data.get("position"), dict):
+            hash_parts.append(f"{math.floor(data['position'].get('x', 0))},{math.floor(data['position'].get('y', 0))}")
+        if "frame_count" in data:
+            hash_parts.append(str(data["frame_count"]))
+        package_events.append({
+            "id": event["event_id"],
+            "type": event["event_type"],
+            "timestamp": event["timestamp"],
+            "data": data,
+            "data_hash": _quick_hash("_".join(hash_parts))
+        })
+    return {
+        "metadata": {
+            "version": "2.0",
+            "timestamp": package_events[-1]["timestamp"] if package_events else 0,
+            "event_count": len(package_events),
+            "file_id": file_id,
+            "is_ml_data": True
+        },
+        "stats": {
+            "total_events_recorded": len(package_events),
+            "total_events_saved": len(package_events),
+            "save_operations": 1,
+            "current_file_index": file_id
+        },
+        "events": package_events
+    }
+
+
+def to_database(events):
+    """Envuelve los eventos con el formato de dem_database.json"""
+    return {
+        "events": events,
+        "metadata": {
+            "last_update": datetime.now().isoformat(),
+            "total_events": len(events),
+            "version": "1.0"
+        }
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generador de eventos sintéticos del mod DEM')
+    parser.add_argument('--events', type=int, default=10000, help='Número total de eventos')
+    parser.add_argument('--runs', type=int, default=1, help='Número de partidas')
+    parser.add_argument('--entity-density', type=float, default=4.0, help='Media de enemigos por sala')
+    parser.add_argument('--frame-interval', type=int, default=FRAME_INTERVAL, help='Frames entre capturas de frame_state')
+    parser.add_argument('--seed', type=int, default=None, help='Semilla para reproducir el conjunto')
+    parser.add_argument('--format', choices=['array', 'package', 'database'], default='array',
+                        help='array: lista de eventos; package: formato de data_manager.lua; database: dem_database.json')
+    parser.add_argument('--output', default='-', help='Archivo de salida (- para stdout)')
+    args = parser.parse_args()
+
+    events = generate_dataset(args.events, args.runs, args.entity_density, args.frame_interval, args.seed)
+    if args.format == 'package':
+        payload = to_package(events)
+    elif args.format == 'database':
+        payload = to_database(events)
+    else:
+        payload = events
+
+    if args.output == '-':
+        json.dump(payload, sys.stdout)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(payload, f)
+        print(f"Generados {len(events)} eventos en {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
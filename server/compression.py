@@ -0,0 +1,154 @@
+#!/usr/bin/env python
+"""
+Compresión de respuestas HTTP negociada con Accept-Encoding.
+
+- Respuestas dinámicas (JSON de las APIs): se comprimen al vuelo con brotli o
+  gzip cuando superan un tamaño mínimo.
+- Archivos estáticos: se precomprimen a disco (.br / .gz) y se sirven tal cual,
+  sin coste de CPU por petición.
+
+brotli es opcional; si no está instalado solo se usa gzip.
+"""
+
+import os
+import gzip
+import logging
+
+# Intentar importar brotli si está disponible
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+MIN_SIZE = 1024            # Bytes mínimos para comprimir una respuesta dinámica
+GZIP_LEVEL = 6             # Nivel de gzip para respuestas dinámicas
+BROTLI_QUALITY = 4         # Calidad de brotli para respuestas dinámicas
+STATIC_GZIP_LEVEL = 9      # Los estáticos se comprimen una sola vez: máxima compresión
+STATIC_BROTLI_QUALITY = 11
+MIN_SAVING = 0.1           # Ahorro mínimo para guardar una variante precomprimida
+
+SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+# Archivos descartados por ahorrar poco: {(ruta, codificación): mtime}
+_skipped = {}
+
+# Tipos MIME que vale la pena comprimir (PNG y JPEG ya van comprimidos)
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/x-ndjson",
+    "application/javascript",
+    "text/javascript",
+    "image/svg+xml",
+}
+STATIC_EXTENSIONS = (".js", ".css", ".html", ".svg", ".json", ".png")
+
+
+def available_encodings():
+    """Codificaciones soportadas, por orden de preferencia"""
+    return ["br", "gzip"] if BROTLI_AVAILABLE else ["gzip"]
+
+
+def accepted_encodings(accept_encodings):
+    """
+    Codificaciones soportadas que acepta el cliente (request.accept_encodings de
+    werkzeug), de la preferida a la menos preferida
+    """
+    accepted = [(accept_encodings[encoding], index, encoding)
+                for index, encoding in enumerate(available_encodings()) if accept_encodings[encoding] > 0]
+    return [encoding for _, _, encoding in sorted(accepted, key=lambda item: (-item[0], item[1]))]
+
+
+def negotiate(accept_encodings):
+    """
+    Elige la codificación a partir de request.accept_encodings (werkzeug).
+    Devuelve "br", "gzip" o None.
+    """
+    accepted = accepted_encodings(accept_encodings)
+    return accepted[0] if accepted else None
+
+
+def is_compressible(mimetype):
+    return bool(mimetype) and (mimetype.startswith("text/") or mimetype in COMPRESSIBLE_TYPES)
+
+
+def compress(data, encoding, level=None):
+    """Comprime data (bytes) con la codificación indicada"""
+    if encoding == "br":
+        return brotli.compress(data, quality=BROTLI_QUALITY if level is None else level)
+    if encoding == "gzip":
+        return gzip.compress(data, compresslevel=GZIP_LEVEL if level is None else level, mtime=0)
+    raise ValueError(f"Codificación no soportada: {encoding}")
+
+
+def precompressed_path(path, encoding):
+    """Ruta de la variante precomprimida si existe y está al día, o None"""
+    if not encoding:
+        return None
+    variant = path + SUFFIXES[encoding]
+    try:
+        if os.path.getmtime(variant) >= os.path.getmtime(path):
+            return variant
+    except OSError:
+        pass
+    return None
+
+
+def find_precompressed(path, accept_encodings):
+    """
+    (codificación, ruta) de la variante precomprimida al día de la codificación
+    aceptada más preferida que exista (si falta la de br se prueba gzip), o (None, None)
+    """
+    for encoding in accepted_encodings(accept_encodings):
+        variant = precompressed_path(path, encoding)
+        if variant:
+            return encoding, variant
+    return None, None
+
+
+def precompress_file(path):
+    """
+    Genera las variantes .br / .gz de un archivo si faltan o están desactualizadas.
+    Solo se guardan las variantes que ahorran al menos MIN_SAVING (las imágenes
+    PNG suelen quedarse sin variante). Devuelve el número de variantes escritas.
+    """
+    written = 0
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+    except OSError as e:
+        logger.error(f"Error al leer {path} para precomprimir: {str(e)}")
+        return 0
+
+    for encoding in available_encodings():
+        variant = path + SUFFIXES[encoding]
+        if precompressed_path(path, encoding) or _skipped.get((path, encoding)) == os.path.getmtime(path):
+            continue
+        level = STATIC_BROTLI_QUALITY if encoding == "br" else STATIC_GZIP_LEVEL
+        compressed = compress(data, encoding, level)
+        if len(compressed) > len(data) * (1 - MIN_SAVING):
+            # Eliminar una variante antigua que ya no corresponde al archivo
+            if os.path.exists(variant):
+                os.remove(variant)
+            _skipped[(path, encoding)] = os.path.getmtime(path)
+            continue
+        tmp_file = f"{variant}.tmp"
+        with open(tmp_file, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_file, variant)
+        written += 1
+    return written
+
+
+def precompress_static(static_folder):
+    """Precomprime los archivos estáticos de la carpeta (recursivamente)"""
+    written = 0
+    for root, _, files in os.walk(static_folder):
+        for filename in files:
+            if filename.endswith(STATIC_EXTENSIONS):
+                written += precompress_file(os.path.join(root, filename))
+    if written:
+        logger.info(f"Variantes precomprimidas generadas en {static_folder}: {written}")
+    return written
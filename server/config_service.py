@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+"""
+Servicio de configuración del servidor (config.json).
+
+El archivo se valida y se convierte una sola vez en un objeto Settings
+inmutable; las peticiones y las tareas leen service.current en lugar de
+volver a abrir config.json. Un bucle en segundo plano comprueba cada
+poll_interval segundos si el archivo cambió (fecha de modificación y tamaño)
+y, si la nueva versión es válida, sustituye la configuración de una vez (un
+único cambio de referencia) y avisa a los suscriptores con (anterior, nueva).
+Si el archivo no es válido se mantiene la configuración anterior y el error
+queda en last_error; al arrancar, en cambio, un config.json no válido lanza
+ConfigError con todos los errores (sin archivo se usan los valores por defecto).
+
+Algunos valores solo se leen al arrancar (puerto, modo asíncrono, carpetas,
+trabajadores de renderizado...); si cambian se avisa de que hace falta
+reiniciar (RESTART_KEYS).
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from types import MappingProxyType
+
+import scheduler
+import partitions
+import compression
+import profiler
+import shared_state
+import vision_stream
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POLL_INTERVAL = 2.0
+
+# Valores que solo se aplican al reiniciar el servidor
+RESTART_KEYS = (("server", "port"), ("server", "async_mode"), ("server", "worker_pool_size"),
+                ("server", "render_workers"), ("server", "renderer"), ("server", "scheduler_max_concurrent"),
+                ("server", "shared_state"), ("server", "message_queue"), ("paths", None), ("exports", None))
+
+
+class ConfigError(ValueError):
+    """Configuración no válida; errors contiene un mensaje por problema"""
+
+    def __init__(self, errors):
+        super().__init__("; ".join(errors))
+        self.errors = errors
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def _thaw(value):
+    if isinstance(value, MappingProxyType):
+        return {key: _thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(item) for item in value]
+    return value
+
+
+class Settings:
+    """Configuración validada; no se modifica, se sustituye entera al recargar"""
+
+    def __init__(self, raw, version, values):
+        object.__setattr__(self, "raw", _freeze(raw))
+        object.__setattr__(self, "version", version)
+        object.__setattr__(self, "loaded_at", time.time())
+        for name, value in values.items():
+            object.__setattr__(self, name, _freeze(value))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("La configuración es inmutable: se recarga entera desde config.json")
+
+    def as_dict(self):
+        """Copia modificable del contenido de config.json"""
+        return _thaw(self.raw)
+
+    def changed_keys(self, other):
+        """Claves (sección.clave) con distinto valor en other"""
+        changed = []
+        for section in sorted(set(self.raw) | set(other.raw)):
+            mine, theirs = self.raw.get(section), other.raw.get(section)
+            if isinstance(mine, MappingProxyType) and isinstance(theirs, MappingProxyType):
+                changed.extend(f"{section}.{key}" for key in sorted(set(mine) | set(theirs))
+                               if mine.get(key) != theirs.get(key))
+            elif mine != theirs:
+                changed.append(section)
+        return changed
+
+
+def _section(raw, name, errors):
+    section = raw.get(name, {})
+    if section is None:
+        return {}
+    if not isinstance(section, dict):
+        errors.append(f"La sección '{name}' debe ser un objeto")
+        return {}
+    return section
+
+
+def _number(section, name, key, default, errors, minimum=0, integer=False):
+    value = section.get(key, default)
+    valid_type = int if integer else (int, float)
+    if isinstance(value, bool) or not isinstance(value, valid_type) or value < minimum:
+        kind = "un entero" if integer else "un número"
+        errors.append(f"{name}.{key} debe ser {kind} mayor o igual que {minimum}")
+        return default
+    return value
+
+
+def _flag(section, name, key, default, errors):
+    value = section.get(key, default)
+    if not isinstance(value, bool):
+        errors.append(f"{name}.{key} debe ser true o false")
+        return default
+    return value
+
+
+def _jobs(server, errors):
+    jobs = server.get("jobs", {}) or {}
+    if not isinstance(jobs, dict):
+        errors.append("server.jobs debe ser un objeto")
+        return {}
+    for name, spec in jobs.items():
+        if not isinstance(spec, dict):
+            errors.append(f"server.jobs.{name} debe ser un objeto")
+            continue
+        try:
+            if "interval" in spec or "cron" in spec:
+                scheduler.make_trigger(spec)
+        except (TypeError, ValueError) as e:
+            errors.append(f"server.jobs.{name}: {str(e)}")
+        _number(spec, f"server.jobs.{name}", "priority", 10, errors, minimum=-1000, integer=True)
+        _flag(spec, f"server.jobs.{name}", "enabled", True, errors)
+    return jobs
+
+
+def parse(raw, version=1):
+    """Valida el contenido de config.json y devuelve un Settings; lanza ConfigError si no es válido"""
+    if not isinstance(raw, dict):
+        raise ConfigError(["config.json debe contener un objeto JSON"])
+    errors = []
+    server = _section(raw, "server", errors)
+    database = _section(raw, "database", errors)
+    advanced = _section(raw, "advanced", errors)
+    server_compression = _section(server, "compression", errors)
+    profiling = _section(server, "profiling", errors)
+    stream = _section(_section(raw, "vision", errors), "stream", errors)
+
+    try:
+        instances = partitions.load_instances(raw, errors)
+    except (AttributeError, TypeError, ValueError) as e:
+        errors.append(f"instances: {str(e)}")
+        instances = {}
+
+    emit_throttle = _number(server, "server", "emit_throttle", 5, errors)
+    values = {
+        "database_file": database.get("file", "dem_database.json"),
+        "partitions_dir": database.get("partitions_dir", partitions.PARTITIONS_DIR),
+        "instances": instances,
+        "update_interval": _number(server, "server", "update_interval", 20, errors, minimum=0.1),
+        "emit_throttle": emit_throttle,
+        "refresh_min_interval": _number(server, "server", "refresh_min_interval", emit_throttle, errors),
+        "game_check_interval": _number(server, "server", "game_check_interval", 15, errors, minimum=0.1),
+        "shared_sync_interval": _number(server, "server", "shared_sync_interval", 2, errors, minimum=0.1),
+        "jobs": _jobs(server, errors),
+        "compression_enabled": _flag(server_compression, "server.compression", "enabled", True, errors),
+        "compression_min_size": _number(server_compression, "server.compression", "min_size",
+                                        compression.MIN_SIZE, errors, integer=True),
+        "profiling_enabled": _flag(profiling, "server.profiling", "enabled", False, errors),
+        "profiling_sample_rate": _number(profiling, "server.profiling", "sample_rate",
+                                         profiler.DEFAULT_SAMPLE_RATE, errors, minimum=1, integer=True),
+        "verbose_logging": _flag(advanced, "advanced", "verbose_logging", True, errors),
+        "stream_quality": _number(stream, "vision.stream", "jpeg_quality", vision_stream.DEFAULT_QUALITY,
+                                  errors, minimum=1, integer=True),
+        "stream_max_fps": _number(stream, "vision.stream", "max_fps", vision_stream.DEFAULT_MAX_FPS,
+                                  errors, minimum=0.1),
+    }
+    if values["stream_quality"] > 95:
+        errors.append("vision.stream.jpeg_quality debe estar entre 1 y 95")
+    shared = _section(server, "shared_state", errors)
+    if shared.get("backend", "memory") not in shared_state.BACKENDS:
+        errors.append(f"server.shared_state.backend debe ser uno de {', '.join(shared_state.BACKENDS)}")
+    _number(shared, "server.shared_state", "lease_ttl", shared_state.DEFAULT_LEASE_TTL, errors, minimum=1)
+    if server.get("message_queue") is not None and not isinstance(server.get("message_queue"), str):
+        errors.append("server.message_queue debe ser una URL")
+    for key, name in (("database_file", "file"), ("partitions_dir", "partitions_dir")):
+        if not isinstance(values[key], str) or not values[key]:
+            errors.append(f"database.{name} debe ser una ruta")
+    if errors:
+        raise ConfigError(errors)
+    return Settings(raw, version, values)
+
+
+class ConfigService:
+    """Carga, vigila y publica la configuración de config.json"""
+
+    def __init__(self, path, poll_interval=DEFAULT_POLL_INTERVAL):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.last_error = None
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._stop = threading.Event()
+        self._watching = False
+        self._stamp = self._file_stamp()
+        if self._stamp is None:
+            logger.warning(f"No se encontró {path}; se usan los valores por defecto")
+            self.current = parse({})
+            return
+        try:
+            self.current = parse(self._read())
+        except ConfigError as e:
+            for error in e.errors:
+                logger.error(f"Configuración no válida en {path}: {error}")
+            raise
+        except (OSError, ValueError) as e:
+            logger.error(f"Error al cargar la configuración desde {path}: {str(e)}")
+            raise ConfigError([f"{path}: {str(e)}"]) from e
+        logger.info(f"Configuración cargada desde {path}")
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+            return (stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return None
+
+    def _read(self):
+        with open(self.path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def subscribe(self, callback):
+        """callback(anterior, nueva) se llama tras cada cambio de configuración"""
+        self._subscribers.append(callback)
+
+    def reload(self, force=False):
+        """
+        Vuelve a leer config.json si cambió (o siempre, con force). Devuelve True si
+        se publicó una configuración nueva; si el archivo no es válido se mantiene
+        la anterior y el error queda en last_error.
+        """
+        with self._lock:
+            stamp = self._file_stamp()
+            if not force and stamp == self._stamp:
+                return False
+            self._stamp = stamp
+            old = self.current
+            try:
+                new = parse(self._read(), old.version + 1)
+            except (OSError, ValueError) as e:
+                self.last_error = str(e)
+                logger.error(f"Configuración no válida en {self.path}, se mantiene la anterior: {str(e)}")
+                return False
+            self.last_error = None
+            if not force and new.raw == old.raw:
+                return False
+            self.current = new
+            changed = new.changed_keys(old)
+            logger.info(f"Configuración {new.version} publicada (cambios: {', '.join(changed) or 'ninguno'})")
+            restart = [key for key in changed
+                       if any(key == f"{section}.{name}" or (name is None and key.startswith(section))
+                              for section, name in RESTART_KEYS)]
+            if restart:
+                logger.warning(f"Estos cambios se aplicarán al reiniciar el servidor: {', '.join(restart)}")
+            for callback in self._subscribers:
+                try:
+                    callback(old, new)
+                except Exception as e:
+                    logger.error(f"Error al aplicar la configuración en {getattr(callback, '__name__', callback)}: {str(e)}")
+            return True
+
+    def save(self, raw):
+        """Valida y guarda raw en config.json (de forma atómica) y lo publica; lanza ConfigError si no es válido"""
+        parse(raw)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(raw, f, indent=4)
+        os.replace(tmp_path, self.path)
+        self.reload(force=True)
+
+    def status(self):
+        return {
+            "path": self.path,
+            "version": self.current.version,
+            "loaded_at": self.current.loaded_at,
+            "watching": self._watching,
+            "poll_interval": self.poll_interval,
+            "last_error": self.last_error,
+        }
+
+    def start(self, start_task=None):
+        """Empieza a vigilar config.json con start_task (por defecto un hilo)"""
+        self._stop.clear()
+        self._watching = True
+        if start_task is None:
+            threading.Thread(target=self._watch, daemon=True).start()
+        else:
+            start_task(self._watch)
+
+    def stop(self):
+        self._stop.set()
+        self._watching = False
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.reload()
+            except Exception as e:
+                logger.error(f"Error al vigilar {self.path}: {str(e)}")
@@ -0,0 +1,255 @@
+#!/usr/bin/env python
+"""
+Exportación del historial completo de características para ML en fragmentos.
+
+Una exportación recorre todos los frame_state de la base de datos (en
+streaming, sin cargarla en memoria), extrae sus características por lotes con
+feature_extraction y las escribe en fragmentos (shards) de rows_per_shard filas:
+    csv      CSV con cabecera en cada fragmento
+    npz      un array .npy comprimido por columna (np.load)
+    parquet  Parquet por columnas (requiere pyarrow)
+
+Cada exportación vive en su propia carpeta con un manifest.json que lista los
+fragmentos con sus filas, tamaño y SHA-256. Se genera en segundo plano; el
+servidor sirve los fragmentos con soporte de Range para reanudar descargas.
+El manifiesto se escribe al lanzarla (status running) y tras cada fragmento,
+así los demás procesos del servidor ven también las exportaciones en curso.
+"""
+
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+import importlib.util
+from datetime import datetime
+
+import lazy
+import feature_extraction
+
+np = lazy.module("numpy")
+pd = lazy.module("pandas")
+
+# pandas escribe Parquet con pyarrow (opcional, no se importa hasta exportar)
+PARQUET_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("csv", "npz", "parquet")
+EXTENSIONS = {"csv": ".csv", "npz": ".npz", "parquet": ".parquet"}
+MANIFEST_FILE = "manifest.json"
+DEFAULT_ROWS_PER_SHARD = 50000
+MAX_ROWS_PER_SHARD = 1000000
+DEFAULT_MAX_EXPORTS = 5
+HASH_CHUNK = 1 << 20
+STALE_SECONDS = 3600    # Una exportación en curso sin avances en este tiempo se da por abandonada
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt != "parquet" or PARQUET_AVAILABLE]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_shard(table, fmt, path):
+    """Escribe un fragmento (escritura atómica) y devuelve los tipos de sus columnas"""
+    tmp_path = path + ".tmp"
+    if fmt == "csv":
+        pd.DataFrame(table, columns=feature_extraction.COLUMN_NAMES).to_csv(tmp_path, index=False)
+    elif fmt == "npz":
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **table)
+    elif fmt == "parquet":
+        pd.DataFrame(table, columns=feature_extraction.COLUMN_NAMES).to_parquet(tmp_path, index=False)
+    else:
+        raise ValueError(f"Formato de exportación desconocido: {fmt}")
+    os.replace(tmp_path, path)
+    return {column: str(values.dtype) for column, values in table.items()}
+
+
+def write_export(export_dir, events, fmt, rows_per_shard, progress=None):
+    """
+    Escribe los fragmentos de una exportación a partir de un iterable de eventos
+    y devuelve (filas, fragmentos, tipos). progress(filas) se llama tras cada
+    fragmento.
+    """
+    shards, dtypes, batch, total = [], {}, [], 0
+
+    def flush():
+        nonlocal dtypes
+        name = f"part-{len(shards):05d}{EXTENSIONS[fmt]}"
+        path = os.path.join(export_dir, name)
+        table = feature_extraction.extract(batch)
+        dtypes = write_shard(table, fmt, path)
+        shards.append({"file": name, "rows": feature_extraction.rows(table), "bytes": os.path.getsize(path),
+                       "sha256": file_sha256(path)})
+        if progress:
+            progress(total)
+
+    for event in events:
+        if event.get("event_type") != "frame_state":
+            continue
+        batch.append(event)
+        total += 1
+        if len(batch) >= rows_per_shard:
+            flush()
+            batch = []
+    if batch or not shards:
+        flush()
+    return total, shards, dtypes
+
+
+def _write_json(path, data):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+class ExportManager:
+    """
+    Exportaciones en root_dir: lanza las nuevas en segundo plano, guarda su
+    manifiesto y conserva solo las max_exports más recientes.
+
+    events_source(instance) devuelve el iterable de eventos a exportar.
+    start_task(func) lanza func en segundo plano y run_blocking(func) la ejecuta
+    fuera del bucle de eventos; por defecto un hilo y una llamada directa.
+    lock() devuelve el cerrojo (context manager) que hace atómicas la búsqueda
+    de una exportación igual y el registro de la nueva; con varios procesos debe
+    ser un cerrojo entre procesos (shared_state). Por defecto uno local.
+    """
+
+    def __init__(self, root_dir, events_source, start_task=None, run_blocking=None,
+                 max_exports=DEFAULT_MAX_EXPORTS, lock=None):
+        self.root_dir = root_dir
+        self.events_source = events_source
+        self.start_task = start_task or (lambda func: threading.Thread(target=func, daemon=True).start())
+        self.run_blocking = run_blocking or (lambda func: func())
+        self.max_exports = max_exports
+        self._start_lock = threading.Lock()
+        self.lock = lock or (lambda: self._start_lock)
+        self._lock = threading.Lock()
+        self._running = {}   # export_id -> manifiesto en curso
+
+    def _dir(self, export_id):
+        return os.path.join(self.root_dir, export_id)
+
+    def manifest(self, export_id):
+        """Manifiesto de una exportación (en curso o terminada) o None"""
+        with self._lock:
+            if export_id in self._running:
+                return dict(self._running[export_id])
+        if os.path.basename(export_id) != export_id:
+            return None
+        try:
+            with open(os.path.join(self._dir(export_id), MANIFEST_FILE), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def is_stale(manifest):
+        """Exportación en curso que no avanza desde hace STALE_SECONDS (su proceso murió)"""
+        return manifest.get("status") == "running" and \
+            time.time() - manifest.get("updated_at", 0) > STALE_SECONDS
+
+    def _save_manifest(self, export_id, manifest):
+        manifest["updated_at"] = time.time()
+        try:
+            _write_json(os.path.join(self._dir(export_id), MANIFEST_FILE), manifest)
+        except OSError as e:
+            logger.error(f"Error al guardar el manifiesto de {export_id}: {str(e)}")
+
+    def list(self):
+        """Exportaciones de la más reciente a la más antigua"""
+        if not os.path.isdir(self.root_dir):
+            return []
+        manifests = [self.manifest(name) for name in os.listdir(self.root_dir)]
+        manifests = [m for m in manifests if m]
+        manifests.sort(key=lambda m: m.get("created_at", ""), reverse=True)
+        return manifests
+
+    def shard_path(self, export_id, shard):
+        """Ruta de un fragmento de una exportación terminada, o None"""
+        manifest = self.manifest(export_id)
+        if not manifest or manifest.get("status") != "complete":
+            return None
+        if shard not in {s["file"] for s in manifest.get("shards", [])}:
+            return None
+        return os.path.join(self._dir(export_id), shard)
+
+    def start(self, fmt, rows_per_shard=DEFAULT_ROWS_PER_SHARD, instance=None, data_version=None):
+        """
+        Lanza una exportación y devuelve su manifiesto. Si ya hay una terminada o
+        en curso con los mismos datos y parámetros, devuelve esa.
+        Lanza ValueError con parámetros no válidos.
+        """
+        if fmt not in available_formats():
+            raise ValueError(f"format debe ser uno de {', '.join(available_formats())}")
+        if not 1 <= rows_per_shard <= MAX_ROWS_PER_SHARD:
+            raise ValueError(f"rows_per_shard debe estar entre 1 y {MAX_ROWS_PER_SHARD}")
+
+        params = {"format": fmt, "rows_per_shard": rows_per_shard, "instance": instance,
+                  "data_version": data_version}
+        with self.lock():
+            for manifest in self.list():
+                if manifest.get("status") in ("running", "complete") and not self.is_stale(manifest) and \
+                        all(manifest.get(key) == value for key, value in params.items()):
+                    return manifest
+
+            export_id = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+            manifest = dict(params, export_id=export_id, status="running", rows=0, shards=[],
+                            columns=list(feature_extraction.COLUMN_NAMES), created_at=datetime.now().isoformat())
+            os.makedirs(self._dir(export_id), exist_ok=True)
+            # Visible para los demás procesos antes de soltar el cerrojo
+            self._save_manifest(export_id, manifest)
+            with self._lock:
+                self._running[export_id] = manifest
+        self.start_task(lambda: self._run(export_id))
+        logger.info(f"Exportación {export_id} iniciada ({fmt}, {rows_per_shard} filas por fragmento)")
+        return dict(manifest)
+
+    def _progress(self, export_id, rows):
+        with self._lock:
+            manifest = self._running[export_id]
+            manifest["rows"] = rows
+            self._save_manifest(export_id, dict(manifest))
+
+    def _run(self, export_id):
+        manifest = self._running[export_id]
+        start = datetime.now()
+        try:
+            rows, shards, dtypes = self.run_blocking(lambda: write_export(
+                self._dir(export_id), self.events_source(manifest["instance"]), manifest["format"],
+                manifest["rows_per_shard"], lambda rows: self._progress(export_id, rows)))
+            manifest.update(status="complete", rows=rows, shards=shards, dtypes=dtypes,
+                            bytes=sum(shard["bytes"] for shard in shards))
+            logger.info(f"Exportación {export_id} completada: {rows} filas en {len(shards)} fragmentos")
+        except Exception as e:
+            manifest.update(status="failed", error=str(e))
+            logger.error(f"Error en la exportación {export_id}: {str(e)}")
+        manifest.update(completed_at=datetime.now().isoformat(),
+                        duration_ms=round((datetime.now() - start).total_seconds() * 1000, 1))
+        self._save_manifest(export_id, manifest)
+        with self._lock:
+            self._running.pop(export_id, None)
+        self.prune()
+
+    def prune(self):
+        """
+        Borra las exportaciones terminadas (o abandonadas) más antiguas por encima
+        de max_exports
+        """
+        finished = [m for m in self.list() if m.get("status") != "running" or self.is_stale(m)]
+        for manifest in finished[self.max_exports:]:
+            shutil.rmtree(self._dir(manifest["export_id"]), ignore_errors=True)
+            logger.info(f"Exportación {manifest['export_id']} eliminada")
@@ -9,10 +9,17 @@ import sys
 import json
 import glob
 import shutil
+import time
 import logging
 import argparse
 from datetime import datetime
-import subprocess
+from collections import defaultdict
+import salvage_parser
+import process_monitor
+import metrics
+import partitions
+import room_heatmaps
+import feature_extraction
 
 # Configuración - Rutas según el log
 # Ubicación donde Isaac guarda los datos de los mods - Documentos del usuario
@@ -40,10 +47,24 @@ PROCESSED_DIR = "processed"
 DATABASE_FILE = "dem_database.json"
 LOG_FILE = "extract_data.log"
 
+# Claves de los eventos en los paquetes de data_manager.lua y su nombre en la base de datos
+PACKAGE_EVENT_KEYS = (("id", "event_id"), ("type", "event_type"))
+
 # Variables globales para control de verificaciones
 check_game_running = True
 check_file_timestamp = True
 
+# Instancia del juego cuyos datos se extraen (None = partición por defecto)
+INSTANCE = None
+
+# Métricas por etapa de la extracción (el servidor las recibe con --emit-metrics)
+stage_timings = defaultdict(float)
+stage_counters = defaultdict(int)
+
+def record_stage(stage, started):
+    """Acumula el tiempo transcurrido desde started en la etapa indicada"""
+    stage_timings[stage] += time.perf_counter() - started
+
 def setup_logging(log_file=LOG_FILE, debug=False):
     """Configurar el registro de eventos"""
     log_level = logging.DEBUG if debug else logging.INFO
@@ -88,10 +109,13 @@ def save_database(database, db_file=DATABASE_FILE):
     database["metadata"]["last_update"] = datetime.now().isoformat()
     database["metadata"]["total_events"] = len(database["events"])
     
-    # Guardar
+    # Guardar en un archivo temporal y reemplazar, para que el servidor nunca
+    # lea una base de datos a medio escribir mientras otras instancias ingieren
     try:
-        with open(db_file, 'w') as f:
+        tmp_file = f"{db_file}.tmp"
+        with open(tmp_file, 'w') as f:
             json.dump(database, f, indent=2)
+        os.replace(tmp_file, db_file)
         logging.info(f"Base de datos guardada: {len(database['events'])} eventos en total")
         return True
     except Exception as e:
@@ -107,10 +131,8 @@ def find_all_possible_data_files():
     # Verificar si el juego está en ejecución (solo si check_game_running es True)
     if check_game_running:
         try:
-            # Verificar si Isaac está en ejecución (Windows)
-            result = subprocess.run(['tasklist', '/FI', 'IMAGENAME eq isaac-ng.exe'], 
-                                   capture_output=True, text=True)
-            game_running = 'isaac-ng.exe' in result.stdout
+            # Verificar si Isaac está en ejecución sin lanzar subprocesos
+            game_running, _ = process_monitor.find_game_process()
             
             if not game_running:
                 logging.warning("El juego no está en ejecución. No se procesarán datos.")
@@ -138,6 +160,9 @@ def find_all_possible_data_files():
         else:
             found_files.append((REAL_DATA_PATH, size))
             logging.info(f"Archivo encontrado en ubicación real: {REAL_DATA_PATH} ({size} bytes)")
+    elif INSTANCE:
+        # Las rutas legacy son compartidas: una instancia solo lee su propio archivo
+        logging.warning(f"No se encontró el archivo de la instancia {INSTANCE}: {REAL_DATA_PATH}")
     else:
         logging.warning(f"No se encontró el archivo en la ubicación real: {REAL_DATA_PATH}")
         
@@ -234,28 +259,30 @@ def backup_mod_data(file_path, keep_original=False):
         logging.error(f"Error al hacer backup: {e}")
         return False
 
+def normalize_package_event(event):
+    """Renombra id/type de un evento de paquete a event_id/event_type (el resto no cambia)"""
+    for package_key, key in PACKAGE_EVENT_KEYS:
+        if key not in event and package_key in event:
+            event[key] = event.pop(package_key)
+    return event
+
 def process_data_content(content):
     """Procesa el contenido del archivo de datos"""
+    parse_start = time.perf_counter()
     # Verificar si es un JSON válido
     try:
-        # Si comienza con '[', es un array de eventos
-        if content.strip().startswith('['):
-            events = json.loads(content)
-            logging.info(f"Contenido JSON válido: {len(events)} eventos")
+        parsed = json.loads(content)
+        if isinstance(parsed, list):
+            # Array de eventos
+            events = parsed
+        elif isinstance(parsed, dict) and isinstance(parsed.get("events"), list):
+            # Paquete de data_manager.lua: se guardan sus eventos, igual que al recuperar
+            # un paquete truncado con salvage_parser
+            events = parsed["events"]
         else:
             # Si no, asumimos que es un solo evento
-            event = json.loads(content)
-            events = [event]
-            logging.info("Contenido JSON válido: 1 evento")
-        
-        # Agregar metadatos de procesamiento a cada evento
-        processed_events = []
-        for event in events:
-            # Agregar timestamp de procesamiento
-            event["processed_timestamp"] = datetime.now().isoformat()
-            processed_events.append(event)
-        
-        return processed_events, len(processed_events)
+            events = [parsed]
+        logging.info(f"Contenido JSON válido: {len(events)} eventos")
     
     except json.JSONDecodeError as e:
         logging.error(f"Error al decodificar JSON: {e}")
@@ -263,7 +290,30 @@ def process_data_content(content):
             logging.error(f"Primeros 100 caracteres: {content[:100]}")
         else:
             logging.error(f"Contenido completo: {content}")
-        return None, 0
+        
+        # Recuperar los eventos completos anteriores a la corrupción (guardado interrumpido)
+        events, report = salvage_parser.salvage_content(content)
+        if not events:
+            return None, 0
+        logging.warning(f"Recuperados {len(events)} eventos; contenido corrupto a partir del byte "
+                        f"{report['error_offset']} ({report['error']})")
+        stage_counters["events_salvaged"] += len(events)
+    finally:
+        record_stage("parse", parse_start)
+    
+    # Agregar metadatos de procesamiento a cada evento
+    enrich_start = time.perf_counter()
+    processed_events = []
+    for event in events:
+        # Los eventos de un paquete (leído entero o recuperado) usan id/type: la
+        # deduplicación y las estadísticas buscan event_id/event_type
+        normalize_package_event(event)
+        # Agregar timestamp de procesamiento
+        event["processed_timestamp"] = datetime.now().isoformat()
+        processed_events.append(event)
+    record_stage("enrich", enrich_start)
+    
+    return processed_events, len(processed_events)
 
 def process_data_file(file_path):
     """Procesa un archivo de datos del mod"""
@@ -271,8 +321,11 @@ def process_data_file(file_path):
     
     try:
         # Leer archivo
+        read_start = time.perf_counter()
         with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
             content = f.read().strip()
+        record_stage("read", read_start)
+        stage_counters["read_bytes"] += os.path.getsize(file_path)
         
         # Verificar tamaño
         if not content:
@@ -295,6 +348,7 @@ def process_all_files(found_files, db_file=DATABASE_FILE, backup=True, keep_orig
     # Cargar base de datos existente
     database = load_database(db_file)
     total_processed = 0
+    added_events = []
     
     for file_path, size in found_files:
         logging.info(f"Procesando {file_path} ({size} bytes)")
@@ -303,7 +357,11 @@ def process_all_files(found_files, db_file=DATABASE_FILE, backup=True, keep_orig
         events, count = process_data_file(file_path)
         
         if events and count > 0:
-            # Añadir eventos a la base de datos
+            if INSTANCE:
+                partitions.tag_events(events, INSTANCE)
+            
+            # Añadir eventos a la base de datos (la deduplicación se limita a la partición)
+            dedup_start = time.perf_counter()
             existing_event_ids = {event.get("event_id") for event in database["events"]}
             new_events = []
             
@@ -315,10 +373,14 @@ def process_all_files(found_files, db_file=DATABASE_FILE, backup=True, keep_orig
                     new_events.append(event)
                     if "event_id" in event:
                         existing_event_ids.add(event["event_id"])
+            record_stage("dedup", dedup_start)
+            stage_counters["events_new"] += len(new_events)
+            stage_counters["events_duplicate"] += len(events) - len(new_events)
             
             # Añadir nuevos eventos
             if new_events:
                 database["events"].extend(new_events)
+                added_events.extend(new_events)
                 logging.info(f"Añadidos {len(new_events)} eventos nuevos de {file_path}")
                 total_processed += len(new_events)
             else:
@@ -332,16 +394,44 @@ def process_all_files(found_files, db_file=DATABASE_FILE, backup=True, keep_orig
     
     # Guardar base de datos actualizada
     if total_processed > 0:
+        commit_start = time.perf_counter()
         save_database(database, db_file)
+        record_stage("commit", commit_start)
         logging.info(f"Total eventos procesados: {total_processed}")
+        
+        # Histogramas por sala: solo se suman los eventos nuevos (o se reconstruyen si faltan)
+        heatmaps_start = time.perf_counter()
+        heatmaps_path = room_heatmaps.store_path(db_file)
+        try:
+            room_heatmaps.update_store(heatmaps_path, added_events, database["events"])
+        except Exception as e:
+            logging.error(f"Error al actualizar los mapas de calor por sala: {str(e)}")
+            # Los eventos ya están en la base de datos: sin borrarlo, el archivo se quedaría sin ellos
+            try:
+                room_heatmaps.remove_store(heatmaps_path)
+            except OSError as e:
+                logging.error(f"No se pudo borrar {heatmaps_path}: {str(e)}")
+        record_stage("room_heatmaps", heatmaps_start)
+        
+        # Características para ML: solo se extraen las de los frames nuevos
+        features_start = time.perf_counter()
+        features_path = feature_extraction.store_path(db_file)
+        try:
+            feature_extraction.update_store(features_path, added_events, database["events"], source_file=db_file)
+        except Exception as e:
+            logging.error(f"Error al actualizar las características para ML: {str(e)}")
+            # Igual que los mapas de calor: se reconstruirá con todos los eventos
+            feature_extraction.remove_store(features_path)
+        record_stage("ml_features", features_start)
     else:
         logging.info("No se procesaron nuevos eventos")
     
     return total_processed
 
-def extract_data(backup=True, keep_originals=False, db_file=DATABASE_FILE, debug=False, force_processing=False, ignore_timestamp=False):
+def extract_data(backup=True, keep_originals=False, db_file=DATABASE_FILE, debug=False, force_processing=False, ignore_timestamp=False,
+                 instance=None, data_path=None, partitions_dir=partitions.PARTITIONS_DIR):
     """Función principal para extraer datos"""
-    global check_game_running, check_file_timestamp
+    global check_game_running, check_file_timestamp, INSTANCE, REAL_DATA_PATH, DATABASE_FILE
     
     # Configurar variables de control de verificación
     check_game_running = not force_processing
@@ -349,10 +439,31 @@ def extract_data(backup=True, keep_originals=False, db_file=DATABASE_FILE, debug
     
     # Configurar logging
     logger = setup_logging(debug=debug)
-    logger.info("=== Iniciando extracción de datos ===")
+    
+    # Cada instancia escribe en su propia partición y solo lee su archivo de datos
+    if instance:
+        INSTANCE = partitions.sanitize_instance_name(instance)
+        if data_path is None:
+            data_path = partitions.load_instances().get(INSTANCE, {}).get("data_path")
+        if not data_path:
+            # Nunca la ruta compartida: la leería también la partición por defecto
+            logger.error(f"La instancia {INSTANCE} no tiene data_path; no se extraerá")
+            return 0
+        REAL_DATA_PATH = data_path
+        os.makedirs(partitions.partition_dir(INSTANCE, partitions_dir), exist_ok=True)
+        db_file = partitions.partition_database_file(INSTANCE, partitions_dir)
+        DATABASE_FILE = db_file
+        logger.info(f"=== Iniciando extracción de datos (instancia {INSTANCE}) ===")
+    else:
+        if data_path:
+            REAL_DATA_PATH = data_path
+        logger.info("=== Iniciando extracción de datos ===")
     
     # Encontrar archivos
+    discovery_start = time.perf_counter()
     found_files = find_all_possible_data_files()
+    record_stage("discovery", discovery_start)
+    stage_counters["files"] += len(found_files)
     
     if not found_files:
         logger.warning("No se encontraron archivos de datos para procesar")
@@ -378,6 +489,10 @@ if __name__ == "__main__":
     parser.add_argument('--debug', action='store_true', help='Activar mensajes de depuración')
     parser.add_argument('--force', action='store_true', help='Forzar procesamiento aunque el juego no esté en ejecución')
     parser.add_argument('--ignore-timestamp', action='store_true', help='Ignorar verificación de timestamp y procesar aunque no haya cambios')
+    parser.add_argument('--instance', help='Nombre de la instancia del juego (usa su propia partición)')
+    parser.add_argument('--data-path', help='Archivo de datos del mod a leer (por defecto el de la instancia o la ruta real)')
+    parser.add_argument('--partitions-dir', default=partitions.PARTITIONS_DIR, help=f'Directorio de particiones (default: {partitions.PARTITIONS_DIR})')
+    parser.add_argument('--emit-metrics', action='store_true', help='Imprimir al final las métricas por etapa para el servidor')
     
     args = parser.parse_args()
     
@@ -394,5 +509,11 @@ if __name__ == "__main__":
         db_file=args.db,
         debug=args.debug,
         force_processing=args.force,
-        ignore_timestamp=args.ignore_timestamp
-    ) 
\ No newline at end of file
+        ignore_timestamp=args.ignore_timestamp,
+        instance=args.instance,
+        data_path=args.data_path,
+        partitions_dir=args.partitions_dir
+    )
+    
+    if args.emit_metrics:
+        print(metrics.EXTRACTION_METRICS_PREFIX + json.dumps({"timings": stage_timings, "counters": stage_counters}))
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+"""
+Extracción por columnas de características para ML de todos los frame_state.
+
+Cada frame_state se convierte en una fila de ancho fijo (COLUMNS): cinemática
+del jugador, vida, los 8 canales de entrada y el número de enemigos y la
+distancia al más cercano. Los eventos son diccionarios, así que leerlos sigue
+siendo un bucle de Python (una pasada que copia los valores a listas planas);
+solo las conversiones (None -> NaN, booleanos), la velocidad y las distancias
+a los enemigos se calculan después por lotes con NumPy. Frente a la
+extracción fila a fila la mejora es pequeña (benchmarks/bench_features.py);
+lo que más ahorra es que cada ingesta solo extrae los frames nuevos.
+
+extract_data.py añade en cada ingesta solo los frames nuevos al almacén de la
+partición (carpeta ml_features junto a la base de datos): un fragmento .npz
+por ingesta y un meta.json con la lista de fragmentos. Cuando hay demasiados
+fragmentos se compactan en uno.
+"""
+
+import os
+import json
+import shutil
+import logging
+
+import lazy
+
+np = lazy.module("numpy")
+
+logger = logging.getLogger(__name__)
+
+STORE_DIR = "ml_features"
+STORE_VERSION = 1
+META_FILE = "meta.json"
+MAX_CHUNKS = 32
+
+INPUT_CHANNELS = (("input_left", "LEFT"), ("input_right", "RIGHT"), ("input_up", "UP"), ("input_down", "DOWN"),
+                  ("shoot_left", "SHOOT_LEFT"), ("shoot_right", "SHOOT_RIGHT"),
+                  ("shoot_up", "SHOOT_UP"), ("shoot_down", "SHOOT_DOWN"))
+
+# Columnas en orden, con su tipo. Los valores ausentes son NaN en las columnas
+# float y 0 en las enteras; nearest_enemy_distance es NaN si no hay enemigos.
+COLUMNS = (
+    ("frame_count", "int64"),
+    ("timestamp", "float64"),
+    ("player_x", "float64"),
+    ("player_y", "float64"),
+    ("player_vx", "float64"),
+    ("player_vy", "float64"),
+    ("player_speed", "float64"),
+    ("player_health", "float64"),
+    ("player_max_health", "float64"),
+    ("player_soul_hearts", "float64"),
+    *((column, "uint8") for column, _ in INPUT_CHANNELS),
+    ("enemy_count", "int32"),
+    ("nearest_enemy_distance", "float64"),
+)
+COLUMN_NAMES = tuple(name for name, _ in COLUMNS)
+
+
+def _numeric(values, dtype="float64"):
+    """Lista de valores (con None o texto) como array; lo no numérico queda en NaN"""
+    try:
+        array = np.array(values, dtype=np.float64)
+    except (TypeError, ValueError):
+        array = np.array([v if isinstance(v, (int, float)) else None for v in values], dtype=np.float64)
+    if np.issubdtype(dtype, np.integer):
+        return np.nan_to_num(array).astype(dtype)
+    return array
+
+
+def empty():
+    """Tabla sin filas"""
+    return {name: np.zeros(0, dtype=dtype) for name, dtype in COLUMNS}
+
+
+def rows(table):
+    return len(table[COLUMN_NAMES[0]])
+
+
+def concat(tables):
+    tables = [table for table in tables if rows(table)]
+    if not tables:
+        return empty()
+    return {name: np.concatenate([table[name] for table in tables]) for name in COLUMN_NAMES}
+
+
+def extract(events):
+    """Tabla de características (columna -> array) de los frame_state de events, en orden"""
+    no_values = {}
+    frame_count, timestamp = [], []
+    px, py, vx, vy = [], [], [], []
+    hearts, max_hearts, soul_hearts = [], [], []
+    pressed = []
+    enemy_frame, enemy_x, enemy_y = [], [], []
+
+    frame = 0
+    for event in events:
+        if event.get("event_type") != "frame_state":
+            continue
+        data = event.get("data") or no_values
+        player = data.get("player") or no_values
+        position = player.get("position") or no_values
+        velocity = player.get("velocity") or no_values
+        health = player.get("health") or no_values
+
+        frame_count.append(data.get("frame_count"))
+        timestamp.append(event.get("timestamp"))
+        px.append(position.get("x"))
+        py.append(position.get("y"))
+        vx.append(velocity.get("x"))
+        vy.append(velocity.get("y"))
+        hearts.append(health.get("hearts"))
+        max_hearts.append(health.get("max_hearts"))
+        soul_hearts.append(health.get("soul_hearts"))
+        pressed.append(data.get("inputs") or no_values)
+        for entity in data.get("entities") or ():
+            if isinstance(entity, dict) and entity.get("is_enemy"):
+                enemy_position = entity.get("position") or no_values
+                enemy_frame.append(frame)
+                enemy_x.append(enemy_position.get("x"))
+                enemy_y.append(enemy_position.get("y"))
+        frame += 1
+    inputs = [[channels.get(key) for channels in pressed] for _, key in INPUT_CHANNELS]
+
+    table = {
+        "frame_count": _numeric(frame_count, "int64"),
+        "timestamp": _numeric(timestamp),
+        "player_x": _numeric(px),
+        "player_y": _numeric(py),
+        "player_vx": _numeric(vx),
+        "player_vy": _numeric(vy),
+        "player_health": _numeric(hearts),
+        "player_max_health": _numeric(max_hearts),
+        "player_soul_hearts": _numeric(soul_hearts),
+    }
+    table["player_speed"] = np.hypot(table["player_vx"], table["player_vy"])
+    for (column, _), values in zip(INPUT_CHANNELS, inputs):
+        table[column] = _numeric(values, "uint8")
+
+    # Enemigos: distancia de cada uno al jugador de su frame y mínimo por frame
+    enemy_frame = np.array(enemy_frame, dtype=np.intp)
+    enemy_x, enemy_y = _numeric(enemy_x), _numeric(enemy_y)
+    valid = ~(np.isnan(enemy_x) | np.isnan(enemy_y))
+    table["enemy_count"] = np.bincount(enemy_frame, minlength=frame).astype(np.int32)
+    nearest = np.full(frame, np.nan)
+    if valid.any():
+        owner = enemy_frame[valid]
+        distance = np.hypot(enemy_x[valid] - table["player_x"][owner], enemy_y[valid] - table["player_y"][owner])
+        # Los enemigos están agrupados por frame en orden: mínimo por grupo con reduceat
+        starts = np.flatnonzero(np.r_[True, owner[1:] != owner[:-1]])
+        nearest[owner[starts]] = np.fmin.reduceat(distance, starts)
+    table["nearest_enemy_distance"] = nearest
+    return {name: table[name] for name in COLUMN_NAMES}
+
+
+def store_path(db_file):
+    """Carpeta del almacén de características de la partición cuya base de datos es db_file"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), STORE_DIR)
+
+
+def _read_meta(path):
+    try:
+        with open(os.path.join(path, META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != STORE_VERSION or meta.get("columns") != list(COLUMN_NAMES):
+        logger.warning(f"Almacén de características {path} con otro formato, se reconstruirá")
+        return None
+    return meta
+
+
+def _write_meta(path, meta):
+    tmp_path = os.path.join(path, META_FILE + ".tmp")
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, os.path.join(path, META_FILE))
+
+
+def _write_chunk(path, name, table):
+    tmp_path = os.path.join(path, name + ".tmp")
+    with open(tmp_path, 'wb') as f:
+        np.savez(f, **table)
+    os.replace(tmp_path, os.path.join(path, name))
+
+
+def _read_chunk(path, name):
+    with np.load(os.path.join(path, name)) as data:
+        return {column: data[column] for column in COLUMN_NAMES}
+
+
+def load_store(path, source_file=None):
+    """
+    Tabla completa del almacén, o None si no existe, no es válido o (con
+    source_file) la base de datos cambió desde la última actualización.
+    """
+    meta = _read_meta(path)
+    if meta is None:
+        return None
+    if source_file is not None and meta.get("source_size") != _size(source_file):
+        logger.warning(f"La base de datos de {path} cambió fuera de la ingesta, se ignorará")
+        return None
+    try:
+        return concat([_read_chunk(path, name) for name in meta["chunks"]])
+    except Exception as e:
+        logger.error(f"Error al cargar las características de {path}: {str(e)}")
+        return None
+
+
+def _size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return None
+
+
+def update_store(path, new_events, all_events=None, source_file=None):
+    """
+    Añade al almacén las características de los eventos nuevos. Si el almacén no
+    existe (o no es válido) y se pasa all_events, se reconstruye con todos los
+    eventos de la partición. Devuelve el número de filas añadidas.
+    """
+    meta = _read_meta(path)
+    if meta is None:
+        shutil.rmtree(path, ignore_errors=True)
+        meta = {"version": STORE_VERSION, "columns": list(COLUMN_NAMES), "rows": 0, "chunks": [], "next": 0}
+        if all_events is not None:
+            new_events = all_events
+    os.makedirs(path, exist_ok=True)
+
+    table = extract(new_events)
+    added = rows(table)
+    if added:
+        name = f"chunk-{meta['next']:06d}.npz"
+        _write_chunk(path, name, table)
+        meta["chunks"].append(name)
+        meta["next"] += 1
+        meta["rows"] += added
+    if len(meta["chunks"]) > MAX_CHUNKS:
+        meta = _compact(path, meta)
+    meta["source_size"] = _size(source_file) if source_file else None
+    _write_meta(path, meta)
+    return added
+
+
+def remove_store(path):
+    """Borra el almacén para que la siguiente ingesta lo reconstruya"""
+    shutil.rmtree(path, ignore_errors=True)
+
+
+def _compact(path, meta):
+    """Une todos los fragmentos en uno (el meta.json nuevo se escribe después)"""
+    old_chunks = meta["chunks"]
+    name = f"chunk-{meta['next']:06d}.npz"
+    _write_chunk(path, name, concat([_read_chunk(path, chunk) for chunk in old_chunks]))
+    meta = dict(meta, chunks=[name], next=meta["next"] + 1)
+    _write_meta(path, meta)
+    for chunk in old_chunks:
+        try:
+            os.remove(os.path.join(path, chunk))
+        except OSError:
+            pass
+    return meta
@@ -0,0 +1,149 @@
+#!/usr/bin/env python
+"""
+Caché y serialización de la tabla de características para ML.
+
+La tabla (los almacenes ml_features de las particiones, ver feature_extraction)
+se carga una sola vez por versión de los datos y se guarda en memoria por
+columnas (un array de NumPy por columna). Las peticiones eligen columnas y un
+rango de filas, que se sirven como:
+    npz    bundle de arrays .npy (np.load lo lee directamente), sin comprimir
+    arrow  flujo Arrow IPC (requiere pyarrow)
+    json   lista de registros, como hasta ahora (como mucho JSON_DEFAULT_ROWS
+           filas si no se indica el final del rango)
+La descarga CSV completa se genera por bloques al servirla.
+"""
+
+import io
+import os
+import logging
+import threading
+
+import importlib.util
+
+import lazy
+
+np = lazy.module("numpy")
+pd = lazy.module("pandas")
+pa = lazy.module("pyarrow")
+
+# pyarrow es opcional y solo se importa al servir el formato Arrow
+ARROW_AVAILABLE = importlib.util.find_spec("pyarrow") is not None
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("json", "npz", "arrow")
+JSON_DEFAULT_ROWS = 1000    # Filas en JSON sin stop (los registros ocupan mucho más que los arrays)
+CSV_BLOCK_ROWS = 10000      # Filas por bloque de la descarga CSV
+MIMETYPES = {
+    "json": "application/json",
+    "npz": "application/x-npz",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+def file_version(path):
+    """Versión del archivo (mtime en ns y tamaño) o None si no existe"""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+
+class FeatureTable:
+    """Tabla por columnas: nombres, arrays y número de filas"""
+
+    def __init__(self, columns, arrays, version=None):
+        self.columns = list(columns)
+        self.arrays = arrays
+        self.version = version
+        self.rows = len(arrays[self.columns[0]]) if self.columns else 0
+
+    def to_csv_blocks(self, block_rows=CSV_BLOCK_ROWS):
+        """CSV de la tabla (cabecera incluida) por bloques de texto de block_rows filas"""
+        yield ",".join(self.columns) + "\n"
+        for start in range(0, self.rows, block_rows):
+            block = {column: self.arrays[column][start:start + block_rows] for column in self.columns}
+            yield pd.DataFrame(block, columns=self.columns).to_csv(index=False, header=False)
+
+    def select(self, columns=None, start=None, stop=None):
+        """
+        Subtabla con las columnas y el rango de filas [start, stop) indicados
+        (vistas, sin copiar). Lanza ValueError si alguna columna no existe.
+        """
+        columns = self.columns if not columns else list(columns)
+        unknown = [column for column in columns if column not in self.arrays]
+        if unknown:
+            raise ValueError(f"Columnas desconocidas: {', '.join(unknown)}")
+        rows = slice(start, stop)
+        return FeatureTable(columns, {column: self.arrays[column][rows] for column in columns}, self.version)
+
+    def to_records(self):
+        """Lista de registros (el formato JSON de siempre)"""
+        values = [_json_values(self.arrays[column]) for column in self.columns]
+        return [dict(zip(self.columns, row)) for row in zip(*values)]
+
+    def to_npz(self):
+        buffer = io.BytesIO()
+        np.savez(buffer, **{column: self.arrays[column] for column in self.columns})
+        return buffer.getvalue()
+
+    def to_arrow(self):
+        if not ARROW_AVAILABLE:
+            raise RuntimeError("pyarrow no está instalado")
+        table = pa.table({column: self.arrays[column] for column in self.columns})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+
+def _json_values(array):
+    """Valores de una columna para JSON: NaN (valor ausente) como None"""
+    values = array.tolist()
+    if array.dtype.kind == 'f' and np.isnan(array).any():
+        values = [None if value != value else value for value in values]
+    return values
+
+
+class FeatureCache:
+    """Tabla en memoria, recargada solo cuando cambia la versión de los datos"""
+
+    def __init__(self, version, loader):
+        # version() identifica los datos (None si no hay); loader(version) devuelve su FeatureTable
+        self.version = version
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._table = None
+
+    def get(self):
+        """Tabla de la versión actual de los datos, o None si no hay datos"""
+        version = self.version()
+        if version is None:
+            return None
+        with self._lock:
+            if self._table is None or self._table.version != version:
+                self._table = self.loader(version)
+                logger.info(f"Características ML cargadas en memoria: {self._table.rows} filas, "
+                            f"{len(self._table.columns)} columnas")
+            return self._table
+
+
+def available_formats():
+    return [fmt for fmt in FORMATS if fmt != "arrow" or ARROW_AVAILABLE]
+
+
+def negotiate(requested, accept_mimetypes):
+    """
+    Formato de la respuesta: el parámetro format si se indicó, si no un formato
+    binario pedido explícitamente en Accept (los comodines no cuentan) y, en
+    último caso, JSON.
+    """
+    if requested:
+        if requested not in available_formats():
+            raise ValueError(f"format debe ser uno de {', '.join(available_formats())}")
+        return requested
+    binary = {MIMETYPES[fmt]: fmt for fmt in available_formats() if fmt != "json"}
+    accepted = sorted(((quality, value) for value, quality in (accept_mimetypes or [])
+                       if value in binary and quality > 0), reverse=True)
+    return binary[accepted[0][1]] if accepted else "json"
@@ -10,6 +10,7 @@ import json
 import glob
 import logging
 from datetime import datetime
+import salvage_parser
 
 def setup_logging():
     """Configurar logging básico"""
@@ -162,29 +163,30 @@ def read_and_parse_data(file_path):
         logging.info(f"Primeros 50 caracteres: {content[:50]}")
         
         # Determinar el tipo de contenido
-        if content.startswith('['):
-            logging.info(f"El archivo contiene un array JSON")
-            data = json.loads(content)
-            return data
-        elif content.startswith('{'):
-            logging.info(f"El archivo contiene un objeto JSON")
-            data = json.loads(content)
-            return [data]
-        else:
-            logging.warning(f"Contenido no reconocido: {content[:100]}...")
-            
-            # Intentar reparar JSON por si acaso
-            if '[' in content and ']' in content:
-                try:
-                    json_str = content[content.find('['):content.rfind(']')+1]
-                    logging.info("Intentando reparar JSON...")
-                    data = json.loads(json_str)
-                    logging.info("¡JSON reparado exitosamente!")
-                    return data
-                except:
-                    logging.error("No se pudo reparar el JSON")
-            
+        try:
+            if content.startswith('['):
+                logging.info(f"El archivo contiene un array JSON")
+                data = json.loads(content)
+                return data
+            elif content.startswith('{'):
+                logging.info(f"El archivo contiene un objeto JSON")
+                data = json.loads(content)
+                return [data]
+            else:
+                logging.warning(f"Contenido no reconocido: {content[:100]}...")
+        except json.JSONDecodeError as e:
+            logging.warning(f"JSON inválido o truncado: {e}")
+        
+        # Intentar recuperar los eventos completos hasta el punto de corrupción
+        logging.info("Intentando recuperar eventos del archivo...")
+        data, report = salvage_parser.salvage_file(file_path)
+        if report["error"]:
+            logging.warning(f"Corrupción en el byte {report['error_offset']}: {report['error']}")
+        if not data:
+            logging.error("No se pudo recuperar ningún evento")
             return None
+        logging.info(f"¡Recuperados {len(data)} eventos!")
+        return data
             
     except Exception as e:
         logging.error(f"Error al leer archivo {file_path}: {e}")
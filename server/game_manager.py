@@ -3,23 +3,14 @@ import subprocess
 import platform
 import json
 import logging
-import time
 from datetime import datetime, timedelta
+import process_monitor
 
 logger = logging.getLogger(__name__)
 
-# Variables globales para caché
-_game_status_cache = {"running": False, "process": None, "timestamp": None}
-_CACHE_DURATION = 3  # Segundos que la caché es válida
-
-def _is_cache_valid():
-    """Comprueba si la caché del estado del juego es válida"""
-    if _game_status_cache["timestamp"] is None:
-        return False
-    
-    # Verificar si han pasado menos de CACHE_DURATION segundos desde la última verificación
-    elapsed = time.time() - _game_status_cache["timestamp"]
-    return elapsed < _CACHE_DURATION
+# Monitor del proceso del juego (mantiene la caché de estado de 3 segundos)
+monitor = process_monitor.ProcessMonitor(cache_duration=process_monitor.CACHE_DURATION)
+_monitor_configured = False
 
 # Definir función para leer la ruta del juego desde config.json
 def get_game_path():
@@ -197,7 +188,8 @@ def start_game():
         if platform.system() == 'Windows':
             subprocess.Popen([game_exe], shell=True)
         else:
-            subprocess.Popen([game_exe], shell=False)
+            process = subprocess.Popen([game_exe], shell=False)
+            monitor.watch_pid(process.pid, os.path.basename(game_exe))
             
         return {
             'success': True,
@@ -251,114 +243,30 @@ def open_game_folder():
             'error': f'Error al abrir la carpeta del juego: {str(e)}'
         }
 
+def _configure_monitor():
+    """Añade el ejecutable configurado a los nombres que vigila el monitor (una sola vez)"""
+    global _monitor_configured
+    if _monitor_configured:
+        return
+    _monitor_configured = True
+    
+    names = list(process_monitor.DEFAULT_PROCESS_NAMES)
+    game_exe, game_dir = get_game_path()
+    if game_exe:
+        names.insert(0, os.path.basename(game_exe))
+    else:
+        logger.warning("No se pudo obtener la ruta del ejecutable; se usarán los nombres conocidos del juego")
+    monitor.set_names(names)
+
 def is_game_running():
     """
     Verifica si el juego está en ejecución de manera más eficiente.
     Retorna una tupla (bool, str) donde bool indica si está en ejecución
     y str es el nombre del proceso.
     
-    Implementa un sistema de caché para reducir el número de consultas al sistema,
-    lo que mejora el rendimiento y reduce el impacto en recursos.
+    Delega en process_monitor: el resultado se guarda en caché unos segundos y,
+    una vez encontrado el juego, solo se vigila su PID sin lanzar subprocesos.
     """
-    global _game_status_cache
-    
-    # Usar la caché si es válida
-    if _is_cache_valid():
-        logger.debug("Usando caché para estado del juego")
-        return _game_status_cache["running"], _game_status_cache["process"]
-        
-    # Esta implementación es más robusta y eficiente
-    game_exe, game_dir = get_game_path()
-    
-    if not game_exe:
-        logger.warning("No se pudo obtener la ruta del ejecutable para verificar si el juego está en ejecución")
-        _update_cache(False, None)
-        return False, None
-        
-    # Obtener solo el nombre del archivo sin la ruta
-    exe_name = os.path.basename(game_exe)
-    logger.debug(f"Verificando si el juego está en ejecución: {exe_name}")
-    
-    # Lista de nombres alternativos posibles para el proceso
-    possible_names = [
-        exe_name,                           # Nombre exacto del ejecutable
-        exe_name.lower(),                   # Nombre en minúsculas
-        os.path.splitext(exe_name)[0],      # Sin extensión
-        "isaac-ng.exe",                     # Versiones específicas del juego
-        "isaac.exe",
-        "Rebirth.exe",
-        "Afterbirth.exe",
-        "AfterbirthPlus.exe", 
-        "RepentanceDX11.exe", 
-        "RepentanceDX9.exe"
-    ]
-    
-    try:
-        if platform.system() == 'Windows':
-            # En Windows, usar un enfoque más liviano con tasklist
-            output = ""
-            # Verificar solo una vez en lugar de para cada posible nombre
-            try:
-                # Usar tasklist que es más rápido y eficiente
-                output = subprocess.check_output("tasklist /FO CSV /NH", shell=True, 
-                                               stderr=subprocess.DEVNULL).decode('utf-8', errors='ignore')
-                logger.debug("Consulta de procesos completada satisfactoriamente")
-            except Exception as e:
-                logger.warning(f"Error al consultar procesos: {str(e)}")
-                _update_cache(False, None)
-                return False, None
-                
-            # Buscar cualquiera de los nombres posibles en la salida
-            output_lower = output.lower()
-            for name in possible_names:
-                name_lower = name.lower()
-                if name_lower in output_lower:
-                    logger.info(f"¡Juego detectado! Proceso: {name}")
-                    _update_cache(True, name)
-                    return True, name
-                    
-            # También verificar si hay algún proceso que contenga "isaac" en su nombre (más flexible)
-            if "isaac" in output_lower:
-                logger.info("¡Juego detectado a través de coincidencia parcial!")
-                _update_cache(True, "Isaac (nombre parcial)")
-                return True, "Isaac (nombre parcial)"
-                
-            logger.debug("Juego no detectado en la lista de procesos")
-            _update_cache(False, None)
-            return False, None
-        else:
-            # Para Linux/Mac usar ps
-            output = subprocess.check_output(['ps', '-A'], stderr=subprocess.DEVNULL).decode('utf-8', errors='ignore')
-            output_lower = output.lower()
-            
-            # Buscar cualquiera de los nombres posibles en la salida
-            for name in possible_names:
-                name_lower = name.lower()
-                if name_lower in output_lower:
-                    logger.info(f"¡Juego detectado! Proceso: {name}")
-                    _update_cache(True, name)
-                    return True, name
-                    
-            # También verificar para "isaac"
-            if "isaac" in output_lower or "binding" in output_lower:
-                logger.info("¡Juego detectado a través de coincidencia parcial!")
-                _update_cache(True, "Isaac (nombre parcial)")
-                return True, "Isaac (nombre parcial)"
-                
-            logger.debug("Juego no detectado en la lista de procesos")
-            _update_cache(False, None)
-            return False, None
-            
-    except Exception as e:
-        logger.error(f"Error al verificar si el juego está en ejecución: {str(e)}")
-        _update_cache(False, None)
-        return False, None
-
-def _update_cache(running, process):
-    """Actualiza la caché del estado del juego"""
-    global _game_status_cache
-    _game_status_cache = {
-        "running": running,
-        "process": process,
-        "timestamp": time.time()
-    } 
\ No newline at end of file
+    _configure_monitor()
+    status = monitor.get_status()
+    return status["running"], status["process"]
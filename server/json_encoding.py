@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+"""
+Codificación JSON de los datos que el servidor envía a los clientes.
+
+normalize() prepara un objeto con las reglas de siempre de las estadísticas y
+de los mensajes Socket.IO: se omiten las claves y los valores None de los
+diccionarios y los None de las listas, un None suelto pasa a "", las claves
+se convierten a texto y los tipos que JSON no admite se convierten con
+default(). Se recorre una sola vez y solo se copian los contenedores que
+cambian: un diccionario cuyos valores son todos texto o números (como el
+recuento por tipo de evento) se comprueba sin bucle en Python y se devuelve
+tal cual, de modo que el codificador C de json lo serializa sin copias.
+
+default() es el gancho para json.dumps: arrays y escalares de NumPy como
+números o listas, objetos de pandas (to_dict) como diccionarios y cualquier
+otro tipo como texto. Packet es el serializador de Socket.IO del servidor:
+codifica con ese gancho, así que los mensajes emitidos admiten esos tipos sin
+convertirlos antes, y detecta los datos binarios sin recorrer en Python los
+contenedores de solo texto y números.
+"""
+
+import json
+import types
+from itertools import islice
+
+from socketio import packet
+
+_SCALAR_TYPES = frozenset((str, int, float, bool))
+_STR_TYPE = frozenset((str,))
+
+loads = json.loads
+
+# Conversión de cada tipo no admitido por JSON, decidida la primera vez que aparece
+_converters = {}
+
+
+def _converter(kind):
+    if hasattr(kind, "to_dict"):
+        # Series y DataFrame de pandas, y objetos propios con to_dict
+        return kind.to_dict
+    if hasattr(kind, "tolist"):
+        # Arrays y escalares de NumPy (np.int64(3).tolist() == 3)
+        return kind.tolist
+    return str
+
+
+def default(obj):
+    """Gancho de json.dumps para los tipos que JSON no admite"""
+    kind = type(obj)
+    convert = _converters.get(kind)
+    if convert is None:
+        convert = _converters[kind] = _converter(kind)
+    return convert(obj)
+
+
+def dumps(obj, **kwargs):
+    """json.dumps con el gancho default (los None se codifican como null)"""
+    kwargs.setdefault("default", default)
+    return json.dumps(obj, **kwargs)
+
+
+def _normalize_dict(obj):
+    if _SCALAR_TYPES.issuperset(map(type, obj.values())) and _STR_TYPE.issuperset(map(type, obj)):
+        return obj
+    result = None
+    for index, (key, value) in enumerate(obj.items()):
+        new_value = None if value is None else normalize(value)
+        if result is None:
+            if new_value is value and value is not None and type(key) is str:
+                continue
+            # Primer cambio: se copia lo recorrido hasta aquí, que no cambió
+            result = dict(islice(obj.items(), index))
+        if key is None or value is None:
+            continue
+        result[key if type(key) is str else str(key)] = new_value
+    return obj if result is None else result
+
+
+def _normalize_list(obj):
+    if type(obj) is list and _SCALAR_TYPES.issuperset(map(type, obj)):
+        return obj
+    result = None if type(obj) is list else []
+    for index, item in enumerate(obj):
+        new_item = None if item is None else normalize(item)
+        if result is None:
+            if new_item is item and item is not None:
+                continue
+            result = obj[:index]
+        if item is not None:
+            result.append(new_item)
+    return obj if result is None else result
+
+
+def normalize(obj):
+    """
+    obj con las reglas de los mensajes a los clientes (ver el docstring del
+    módulo), compartiendo con el original todo lo que no cambia
+    """
+    kind = type(obj)
+    if kind in _SCALAR_TYPES:
+        return obj
+    if isinstance(obj, dict):
+        return _normalize_dict(obj)
+    if isinstance(obj, (list, tuple)):
+        return _normalize_list(obj)
+    if obj is None:
+        return ""
+    if isinstance(obj, (int, float, str)):
+        return obj
+    return normalize(default(obj))
+
+
+class Packet(packet.Packet):
+    """Paquete Socket.IO codificado con dumps"""
+    json = types.SimpleNamespace(dumps=dumps, loads=loads)
+
+    @classmethod
+    def data_is_binary(cls, data):
+        """Como el original, pero descarta sin bucle los contenedores de solo texto y números"""
+        if isinstance(data, (bytes, bytearray)):
+            return True
+        if isinstance(data, dict):
+            values = data.values()
+        elif isinstance(data, list):
+            values = data
+        else:
+            return False
+        if _SCALAR_TYPES.issuperset(map(type, values)):
+            return False
+        return any(cls.data_is_binary(value) for value in values)
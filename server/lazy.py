@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+"""
+Importación diferida de módulos pesados (pandas, NumPy, pyarrow...).
+
+    np = lazy.module("numpy")
+
+devuelve un objeto que importa el módulo la primera vez que se accede a uno
+de sus atributos (np.zeros, np.ndarray...) y después delega en él. Así,
+importar app.py no paga el coste de pandas o NumPy hasta que una petición o
+una tarea los necesita. Si dos hilos lo usan a la vez por primera vez, el
+sistema de importación de Python garantiza que el módulo se ejecute una vez.
+
+No sirve para "from X import Y" ni para código que se ejecute al importar el
+módulo que lo usa (esos accesos cargarían el módulo en ese momento).
+"""
+
+import sys
+import importlib
+
+
+class LazyModule:
+    """Módulo que se importa al usar por primera vez uno de sus atributos"""
+
+    def __init__(self, name):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+
+    def _load(self):
+        module = self._module
+        if module is None:
+            module = importlib.import_module(self._name)
+            object.__setattr__(self, "_module", module)
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        state = "cargado" if self._module is not None else "sin cargar"
+        return f"<módulo diferido {self._name} ({state})>"
+
+
+def module(name):
+    """Módulo diferido; si ya está importado se devuelve el propio módulo"""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def is_loaded(name):
+    return name in sys.modules
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+"""
+Registro de métricas del servidor en formato de texto de Prometheus.
+
+Implementación mínima de contadores, gauges e histogramas con etiquetas,
+segura entre hilos y sin dependencias externas. Se expone en /api/metrics.
+"""
+
+import time
+import threading
+import functools
+
+# Límites de los buckets por defecto (segundos), iguales a los de prometheus_client
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    """Base común: nombre, ayuda, etiquetas y valores por combinación de etiquetas"""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Etiquetas incorrectas para {self.name}: {sorted(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        if not items and not self.labelnames and self.kind != "histogram":
+            lines.append(f"{self.name} 0")
+        for key, value in items:
+            lines.extend(self._render_sample(key, value))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """Contador monótono"""
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+
+class Gauge(_Metric):
+    """Valor que puede subir y bajar"""
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    """Histograma acumulativo con buckets fijos"""
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["counts"][index] += 1
+                    break
+            state["sum"] += value
+            state["count"] += 1
+
+    def time(self, **labels):
+        """Context manager que observa la duración del bloque"""
+        return _Timer(self, labels)
+
+    def snapshot(self, **labels):
+        """Devuelve (suma, número de observaciones) para una combinación de etiquetas"""
+        with self._lock:
+            state = self._values.get(self._key(labels))
+            return (state["sum"], state["count"]) if state else (0.0, 0)
+
+    def summary(self):
+        """
+        Por combinación de etiquetas: número de observaciones, media y percentiles
+        50, 95 y 99 aproximados por el límite superior de su bucket
+        """
+        with self._lock:
+            items = [(key, list(state["counts"]), state["sum"], state["count"])
+                     for key, state in self._values.items()]
+        result = []
+        for key, counts, total, count in items:
+            entry = dict(zip(self.labelnames, key))
+            entry.update(count=count, avg=total / count if count else None)
+            for name, quantile in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99)):
+                target, cumulative = quantile * count, 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    if cumulative >= target:
+                        entry[name] = bound if bound != float('inf') else None
+                        break
+            result.append(entry)
+        return result
+
+    def _render_sample(self, key, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state["counts"]):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, ("le", _format_value(bound)))
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{labels} {state['count']}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class Registry:
+    """Conjunto de métricas que se exportan juntas"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {}
+
+    def _register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                return self._metrics[metric.name]
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Genera el texto de exposición de Prometheus (versión 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Prefijo de la línea con la que extract_data.py envía sus métricas al servidor
+EXTRACTION_METRICS_PREFIX = "DEM_METRICS "
+
+REGISTRY = Registry()
+
+# Métricas de ingesta
+INGEST_STAGE_SECONDS = REGISTRY.histogram(
+    "dem_ingest_stage_seconds",
+    "Duración de cada etapa del ciclo de ingesta",
+    ["stage"])
+INGEST_READ_BYTES = REGISTRY.counter(
+    "dem_ingest_read_bytes_total",
+    "Bytes leídos de los archivos de datos del mod")
+INGEST_FILES = REGISTRY.counter(
+    "dem_ingest_files_total",
+    "Archivos de datos encontrados en la etapa de descubrimiento")
+INGEST_EVENTS = REGISTRY.counter(
+    "dem_ingest_events_total",
+    "Eventos procesados por resultado (new, duplicate, salvaged)",
+    ["result"])
+INGEST_RUNS = REGISTRY.counter(
+    "dem_ingest_runs_total",
+    "Ejecuciones de extract_data.py por resultado",
+    ["result"])
+INGEST_EXTRACTION_SECONDS = REGISTRY.histogram(
+    "dem_ingest_extraction_seconds",
+    "Duración total de cada ejecución de extract_data.py")
+REFRESH_REQUESTS = REGISTRY.counter(
+    "dem_refresh_requests_total",
+    "Solicitudes de actualización de datos por origen y resultado "
+    "(leader = ejecutó la ingesta, joined = esperó a la que estaba en curso, recent = reutilizó la última)",
+    ["source", "result"])
+
+# Métricas de las APIs HTTP
+DATA_VERSION = REGISTRY.gauge(
+    "dem_data_version",
+    "Versión de los datos usada en los ETag (se incrementa con cada ingesta con eventos nuevos)")
+HTTP_CONDITIONAL_REQUESTS = REGISTRY.counter(
+    "dem_http_conditional_requests_total",
+    "Peticiones a APIs con ETag por resultado (hit = 304, miss, unconditional)",
+    ["endpoint", "result"])
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "dem_http_request_seconds",
+    "Latencia de las peticiones HTTP por ruta (endpoint de Flask), método y código de estado",
+    ["endpoint", "method", "status"])
+HTTP_COMPRESSION_SECONDS = REGISTRY.histogram(
+    "dem_http_compression_seconds",
+    "Tiempo de CPU dedicado a comprimir respuestas dinámicas",
+    ["encoding"])
+HTTP_COMPRESSION_BYTES = REGISTRY.counter(
+    "dem_http_compression_bytes_total",
+    "Bytes de respuestas dinámicas antes y después de comprimir",
+    ["stage"])
+
+# Métricas del planificador de tareas
+JOB_SECONDS = REGISTRY.histogram(
+    "dem_job_seconds",
+    "Duración de cada ejecución de las tareas programadas",
+    ["job"])
+JOB_RUNS = REGISTRY.counter(
+    "dem_job_runs_total",
+    "Ejecuciones de las tareas programadas por resultado (success, error)",
+    ["job", "result"])
+
+# Métricas del servicio de renderizado de visualizaciones
+RENDER_SECONDS = REGISTRY.histogram(
+    "dem_render_seconds",
+    "Duración del renderizado de cada gráfico en el pool de procesos",
+    ["chart"])
+RENDER_REQUESTS = REGISTRY.counter(
+    "dem_render_requests_total",
+    "Peticiones de renderizado por resultado (rendered, cached, unchanged, pending, error)",
+    ["chart", "result"])
+
+# Métricas de la transmisión MJPEG del sistema de visión
+VISION_FRAMES = REGISTRY.counter(
+    "dem_vision_frames_total",
+    "Frames de visión por resultado (published, sent, dropped: no enviados a un cliente lento o limitado)",
+    ["result"])
+VISION_STREAM_CLIENTS = REGISTRY.gauge(
+    "dem_vision_stream_clients",
+    "Clientes conectados a la transmisión MJPEG de visión")
+
+
+
+def timed(histogram, **labels):
+    """Decorador que observa en el histograma la duración de la función"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with histogram.time(**labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_extraction_metrics(data):
+    """Incorpora las métricas por etapa enviadas por extract_data.py (--emit-metrics)"""
+    for stage, seconds in data.get("timings", {}).items():
+        INGEST_STAGE_SECONDS.observe(seconds, stage=stage)
+    counters = data.get("counters", {})
+    INGEST_READ_BYTES.inc(counters.get("read_bytes", 0))
+    INGEST_FILES.inc(counters.get("files", 0))
+    for result in ("new", "duplicate", "salvaged"):
+        INGEST_EVENTS.inc(counters.get(f"events_{result}", 0), result=result)
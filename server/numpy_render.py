@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+"""
+Renderizado de gráficos con NumPy, sin matplotlib.
+
+El mapa de calor se calcula con np.histogram2d y se colorea con una tabla de
+colores (LUT) de 256 entradas; las barras y las líneas se rasterizan sobre un
+array RGB. La imagen se codifica a PNG directamente con zlib y struct.
+
+Las imágenes no llevan texto (títulos, ejes ni etiquetas): el título se muestra
+en la página y los valores se pueden consultar en las APIs. Para gráficos de
+publicación se puede seguir usando matplotlib (renderer=matplotlib).
+"""
+
+import zlib
+import struct
+
+import numpy as np
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_LEVEL = 6
+BACKGROUND = (255, 255, 255)
+AXIS_COLOR = (80, 80, 80)
+GRID_COLOR = (225, 225, 225)
+SERIES_COLORS = ((31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40))
+MARGIN = 40            # Margen en píxeles alrededor del área del gráfico
+COLORBAR_WIDTH = 20
+
+# Colores de referencia de cada mapa de colores (interpolados linealmente a 256)
+_CMAP_ANCHORS = {
+    "viridis": ((68, 1, 84), (72, 40, 120), (62, 74, 137), (49, 104, 142), (38, 130, 142),
+                (31, 158, 137), (53, 183, 121), (109, 205, 89), (180, 222, 44), (253, 231, 37)),
+    "magma": ((0, 0, 4), (28, 16, 68), (79, 18, 123), (129, 37, 129), (181, 54, 122),
+              (229, 80, 100), (251, 135, 97), (254, 194, 135), (252, 253, 191)),
+    "inferno": ((0, 0, 4), (31, 12, 72), (85, 15, 109), (136, 34, 106), (186, 54, 85),
+                (227, 89, 51), (249, 140, 10), (249, 201, 50), (252, 255, 164)),
+    "plasma": ((13, 8, 135), (84, 2, 163), (139, 10, 165), (185, 50, 137), (219, 92, 104),
+               (244, 136, 73), (254, 188, 43), (240, 249, 33)),
+    "gray": ((0, 0, 0), (255, 255, 255)),
+    "coolwarm": ((59, 76, 192), (124, 159, 249), (192, 212, 245), (242, 203, 183),
+                 (238, 133, 105), (180, 4, 38)),
+}
+
+_luts = {}
+
+
+def colormap_lut(name="hot"):
+    """Tabla de 256 colores RGB (uint8) del mapa de colores indicado"""
+    if name in _luts:
+        return _luts[name]
+    x = np.linspace(0.0, 1.0, 256)
+    if name == "hot":
+        # Igual que 'hot' de matplotlib: rojo, después verde y por último azul
+        lut = np.stack([np.clip(x / 0.365079, 0, 1),
+                        np.clip((x - 0.365079) / 0.380953, 0, 1),
+                        np.clip((x - 0.746032) / 0.253968, 0, 1)], axis=1) * 255
+    elif name in _CMAP_ANCHORS:
+        anchors = np.array(_CMAP_ANCHORS[name], dtype=float)
+        positions = np.linspace(0.0, 1.0, len(anchors))
+        lut = np.stack([np.interp(x, positions, anchors[:, c]) for c in range(3)], axis=1)
+    else:
+        raise ValueError(f"Mapa de colores desconocido: {name}")
+    _luts[name] = np.round(lut).astype(np.uint8)
+    return _luts[name]
+
+
+def encode_png(image, level=PNG_LEVEL):
+    """
+    Codifica un array uint8 (alto x ancho x 3 RGB, x 4 RGBA o alto x ancho en
+    escala de grises) como PNG. Todas las filas usan el filtro Up.
+    """
+    image = np.ascontiguousarray(image, dtype=np.uint8)
+    if image.ndim == 2:
+        color_type, channels = 0, 1
+    elif image.shape[2] == 3:
+        color_type, channels = 2, 3
+    elif image.shape[2] == 4:
+        color_type, channels = 6, 4
+    else:
+        raise ValueError(f"Forma de imagen no soportada: {image.shape}")
+    height, width = image.shape[:2]
+
+    rows = image.reshape(height, width * channels)
+    filtered = np.empty((height, width * channels + 1), dtype=np.uint8)
+    filtered[:, 0] = 2  # Up: diferencia con la fila anterior
+    filtered[0, 1:] = rows[0]
+    np.subtract(rows[1:], rows[:-1], out=filtered[1:, 1:])
+
+    def chunk(tag, data):
+        return (struct.pack(">I", len(data)) + tag + data +
+                struct.pack(">I", zlib.crc32(tag + data) & 0xffffffff))
+
+    header = struct.pack(">IIBBBBB", width, height, 8, color_type, 0, 0, 0)
+    return (PNG_SIGNATURE + chunk(b"IHDR", header) +
+            chunk(b"IDAT", zlib.compress(filtered.tobytes(), level)) + chunk(b"IEND", b""))
+
+
+def _canvas(width, height):
+    return np.full((height, width, 3), BACKGROUND, dtype=np.uint8)
+
+
+def _frame(canvas, left, top, width, height):
+    """Ejes del área del gráfico"""
+    canvas[top + height, left:left + width + 1] = AXIS_COLOR
+    canvas[top:top + height + 1, left] = AXIS_COLOR
+
+
+def counts_image(counts, cmap="hot", cell=1, norm="linear"):
+    """
+    Colorea una matriz de conteos (filas x columnas) con la LUT del mapa de
+    colores; cada celda ocupa cell x cell píxeles. Con norm="log" se usa
+    log(1 + conteo), útil cuando unas pocas celdas concentran casi todo.
+    """
+    counts = np.asarray(counts, dtype=float)
+    if norm == "log":
+        counts = np.log1p(counts)
+    peak = counts.max() if counts.size else 0
+    levels = np.zeros(counts.shape, dtype=np.intp) if peak == 0 else (counts * (255 / peak)).astype(np.intp)
+    image = colormap_lut(cmap)[levels]
+    if cell > 1:
+        image = np.repeat(np.repeat(image, cell, axis=0), cell, axis=1)
+    return image
+
+
+def heatmap_image(positions, bins=50, cmap="hot", dpi=100):
+    """
+    Mapa de calor de posiciones (array N x 2) como en plt.hist2d: el eje Y
+    crece hacia arriba y cada bin es un bloque de píxeles del mismo color.
+    Incluye a la derecha una barra con la escala de colores.
+    """
+    positions = np.asarray(positions, dtype=float)
+    counts, _, _ = np.histogram2d(positions[:, 0], positions[:, 1], bins=bins)
+    # histogram2d devuelve [x, y]: se transpone a filas (y) y se invierte el eje Y
+    counts = counts.T[::-1]
+    lut = colormap_lut(cmap)
+    plot = counts_image(counts, cmap, max(1, (8 * dpi) // bins))
+    plot_h, plot_w = plot.shape[:2]
+
+    canvas = _canvas(plot_w + 3 * MARGIN + COLORBAR_WIDTH, plot_h + 2 * MARGIN)
+    canvas[MARGIN:MARGIN + plot_h, MARGIN:MARGIN + plot_w] = plot
+    _frame(canvas, MARGIN - 1, MARGIN, plot_w + 1, plot_h)
+
+    # Barra de colores: el máximo arriba
+    bar = lut[np.linspace(255, 0, plot_h).astype(np.intp)]
+    left = plot_w + 2 * MARGIN
+    canvas[MARGIN:MARGIN + plot_h, left:left + COLORBAR_WIDTH] = bar[:, None, :]
+    return canvas
+
+
+def bar_image(counts, dpi=100):
+    """Gráfico de barras verticales con una barra por valor"""
+    counts = np.asarray(counts, dtype=float)
+    plot_w, plot_h = 12 * dpi - 2 * MARGIN, 6 * dpi - 2 * MARGIN
+    canvas = _canvas(plot_w + 2 * MARGIN, plot_h + 2 * MARGIN)
+    _draw_grid(canvas, plot_w, plot_h)
+
+    if len(counts):
+        slot = plot_w / len(counts)
+        peak = counts.max() or 1
+        heights = np.round(counts / peak * plot_h).astype(int)
+        lefts = MARGIN + np.round(np.arange(len(counts)) * slot + slot * 0.1).astype(int)
+        width = max(1, int(slot * 0.8))
+        for x, h in zip(lefts, heights):
+            canvas[MARGIN + plot_h - h:MARGIN + plot_h, x:x + width] = SERIES_COLORS[0]
+    _frame(canvas, MARGIN, MARGIN, plot_w, plot_h)
+    return canvas
+
+
+def line_image(x, series, dpi=100, thickness=2):
+    """
+    Gráfico de líneas: x común y una lista de series Y con la misma longitud.
+    Si x no es numérico se usa la posición de cada punto.
+    """
+    try:
+        x = np.nan_to_num(np.asarray(x, dtype=float))
+    except (TypeError, ValueError):
+        x = np.arange(len(x), dtype=float)
+    plot_w, plot_h = 12 * dpi - 2 * MARGIN, 6 * dpi - 2 * MARGIN
+    canvas = _canvas(plot_w + 2 * MARGIN, plot_h + 2 * MARGIN)
+    _draw_grid(canvas, plot_w, plot_h)
+
+    # Los valores ausentes (None) cuentan como 0, igual que en ml_features.csv
+    ys = [np.nan_to_num(np.asarray(y, dtype=float)) for y in series]
+    if len(x) > 1 and ys:
+        y_min = min(y.min() for y in ys)
+        y_max = max(y.max() for y in ys)
+        px = MARGIN + _scale(x, x.min(), x.max(), plot_w - 1)
+        for color, y in zip(SERIES_COLORS, ys):
+            py = MARGIN + plot_h - 1 - _scale(y, y_min, y_max, plot_h - 1)
+            _polyline(canvas, px, py, color, thickness)
+    _frame(canvas, MARGIN, MARGIN, plot_w, plot_h)
+    return canvas
+
+
+def _polyline(canvas, px, py, color, thickness):
+    """Rasteriza la línea que une los puntos: cada segmento con un píxel por paso"""
+    dx, dy = np.diff(px), np.diff(py)
+    steps = np.maximum(np.abs(dx), np.abs(dy)).astype(np.intp) + 1
+    segment = np.repeat(np.arange(len(dx)), steps)
+    t = (np.arange(steps.sum()) - np.repeat(np.cumsum(steps) - steps, steps)) / np.repeat(steps, steps)
+    xs = np.round(px[segment] + dx[segment] * t).astype(np.intp)
+    ys = np.round(py[segment] + dy[segment] * t).astype(np.intp)
+    height = canvas.shape[0]
+    for offset in range(thickness):
+        canvas[np.clip(ys + offset, 0, height - 1), xs] = color
+
+
+def _scale(values, low, high, size):
+    if high == low:
+        return np.full(len(values), size / 2)
+    return (values - low) / (high - low) * size
+
+
+def _draw_grid(canvas, plot_w, plot_h, lines=5):
+    for i in range(1, lines):
+        canvas[MARGIN + plot_h * i // lines, MARGIN:MARGIN + plot_w] = GRID_COLOR
+
+
+def render(chart, inputs, params):
+    """PNG (bytes) de un gráfico de render_service a partir de sus datos de entrada"""
+    dpi = params.get("dpi", 100)
+    if chart == "player_heatmap":
+        image = heatmap_image(inputs["positions"], params.get("bins", 50), params.get("cmap", "hot"), dpi)
+    elif chart == "event_distribution":
+        image = bar_image(inputs["counts"], dpi)
+    elif chart == "player_trajectory":
+        image = line_image(inputs["timestamp"], [inputs["x"], inputs["y"]], dpi)
+    else:
+        raise ValueError(f"Gráfico desconocido: {chart}")
+    return encode_png(image)
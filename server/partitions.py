@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Particiones de ingesta para varias instancias del juego ejecutándose a la vez.
+
+Cada instancia tiene su propio directorio de segmento con su propia base de
+datos, y la deduplicación se hace solo dentro de ese espacio de nombres. Así
+varios extractores pueden escribir en paralelo sin competir por el mismo
+archivo. El servidor fusiona las particiones al leer.
+
+Las instancias se declaran en config.json:
+    "instances": {
+        "lab-1": {"data_path": "D:\\\\Isaac1\\\\data\\\\dem\\\\save1.dat"},
+        "lab-2": {"data_path": "D:\\\\Isaac2\\\\data\\\\dem\\\\save1.dat"}
+    }
+"""
+
+import os
+import re
+import json
+import logging
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+CONFIG_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config.json')
+PARTITIONS_DIR = "partitions"
+PARTITION_DATABASE = "dem_database.json"
+SOURCE_FIELD = "source_instance"
+DEFAULT_INSTANCE = "default"
+
+_VALID_NAME_RE = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+def sanitize_instance_name(name):
+    """Normaliza el nombre de la instancia para usarlo como nombre de directorio"""
+    name = _VALID_NAME_RE.sub("_", str(name).strip())
+    if not name or name in (".", ".."):
+        raise ValueError(f"Nombre de instancia inválido: {name!r}")
+    return name
+
+
+def load_instances(config=None, errors=None):
+    """
+    Devuelve la sección 'instances' de la configuración ({nombre: opciones}).
+    Cada instancia necesita su propio data_path: sin él leería el mismo archivo
+    que la partición por defecto y sus eventos se guardarían dos veces. Las que
+    no lo tienen se omiten y el motivo se añade a errors (o se registra).
+    """
+    if config is None:
+        try:
+            with open(CONFIG_FILE, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+        except Exception as e:
+            logger.error(f"Error al cargar instancias desde {CONFIG_FILE}: {str(e)}")
+            return {}
+    instances = {}
+    for name, options in (config.get("instances", {}) or {}).items():
+        options = options or {}
+        if not options.get("data_path"):
+            message = f"instances.{name}: falta data_path (cada instancia lee su propio archivo de datos)"
+            if errors is None:
+                logger.error(message)
+            else:
+                errors.append(message)
+            continue
+        instances[sanitize_instance_name(name)] = options
+    return instances
+
+
+def partition_dir(instance, base_dir=PARTITIONS_DIR):
+    """Directorio de segmento de la instancia"""
+    return os.path.join(base_dir, sanitize_instance_name(instance))
+
+
+def partition_database_file(instance, base_dir=PARTITIONS_DIR):
+    """Archivo de base de datos de la instancia (lo crea el extractor de esa instancia)"""
+    return os.path.join(partition_dir(instance, base_dir), PARTITION_DATABASE)
+
+
+def list_partitions(base_dir=PARTITIONS_DIR):
+    """Lista las particiones existentes como [(instancia, archivo_de_base_de_datos)]"""
+    if not os.path.isdir(base_dir):
+        return []
+    found = []
+    for name in sorted(os.listdir(base_dir)):
+        db_file = os.path.join(base_dir, name, PARTITION_DATABASE)
+        if os.path.isfile(db_file):
+            found.append((name, db_file))
+    return found
+
+
+def tag_events(events, instance):
+    """Marca cada evento con la instancia de origen"""
+    for event in events:
+        event[SOURCE_FIELD] = instance
+    return events
+
+
+def merge_databases(databases):
+    """
+    Fusiona varias bases de datos [(instancia, base_de_datos)] en una sola.
+    Los eventos conservan su instancia de origen en SOURCE_FIELD.
+    """
+    events = []
+    partitions = {}
+    last_updates = []
+    for instance, database in databases:
+        partition_events = database.get("events", [])
+        for event in partition_events:
+            event.setdefault(SOURCE_FIELD, instance)
+        events.extend(partition_events)
+        metadata = database.get("metadata", {})
+        partitions[instance] = {
+            "total_events": len(partition_events),
+            "last_update": metadata.get("last_update")
+        }
+        if metadata.get("last_update"):
+            last_updates.append(metadata["last_update"])
+
+    return {
+        "events": events,
+        "metadata": {
+            "last_update": max(last_updates) if last_updates else datetime.now().isoformat(),
+            "total_events": len(events),
+            "version": "1.0",
+            "partitions": partitions
+        }
+    }
+
+
+def filter_by_instance(events, instance):
+    """Filtra eventos por instancia de origen (sin filtro si instance es None)"""
+    if not instance:
+        return events
+    return [e for e in events if e.get(SOURCE_FIELD, DEFAULT_INSTANCE) == instance]
@@ -0,0 +1,285 @@
+#!/usr/bin/env python
+"""
+Monitor del proceso del juego sin lanzar subprocesos en estado estable.
+
+En Linux recorre /proc/*/comm directamente y en Windows enumera los procesos con
+la API de Win32 (ctypes). Una vez localizado el proceso solo se vigila su PID.
+Los cambios de estado se publican a los suscriptores registrados.
+"""
+
+import os
+import time
+import logging
+import platform
+import threading
+import subprocess
+
+logger = logging.getLogger(__name__)
+
+CACHE_DURATION = 3  # Segundos que el último resultado se considera válido
+
+# Nombres conocidos del ejecutable del juego
+DEFAULT_PROCESS_NAMES = [
+    "isaac-ng.exe",
+    "isaac.exe",
+    "Rebirth.exe",
+    "Afterbirth.exe",
+    "AfterbirthPlus.exe",
+    "RepentanceDX11.exe",
+    "RepentanceDX9.exe"
+]
+
+# Subcadenas aceptadas como coincidencia parcial
+PARTIAL_MATCHES = ["isaac", "binding"]
+PARTIAL_MATCH_LABEL = "Isaac (nombre parcial)"
+
+_COMM_MAX_LEN = 15  # Linux trunca /proc/<pid>/comm a 15 caracteres
+_PROC_DIR = "/proc"
+
+
+def _expand_names(names):
+    """Genera las variantes en minúsculas de cada nombre (sin extensión y truncada)"""
+    expanded = {}
+    for name in names:
+        if not name:
+            continue
+        for variant in (name, os.path.splitext(name)[0]):
+            variant = variant.lower()
+            expanded.setdefault(variant, name)
+            expanded.setdefault(variant[:_COMM_MAX_LEN], name)
+    return expanded
+
+
+def _match_name(process_name, expanded_names):
+    """Devuelve la etiqueta del proceso si coincide con el juego, o None"""
+    process_name = process_name.strip().lower()
+    if not process_name:
+        return None
+    if process_name in expanded_names:
+        return expanded_names[process_name]
+    if any(partial in process_name for partial in PARTIAL_MATCHES):
+        return PARTIAL_MATCH_LABEL
+    return None
+
+
+def _read_comm(pid):
+    """Lee el nombre de un proceso desde /proc; None si ya no existe"""
+    try:
+        with open(os.path.join(_PROC_DIR, str(pid), "comm"), 'r', errors='ignore') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _scan_proc(expanded_names):
+    """Busca el juego recorriendo /proc/*/comm. Devuelve (pid, nombre) o (None, None)"""
+    for entry in os.listdir(_PROC_DIR):
+        if not entry.isdigit():
+            continue
+        comm = _read_comm(entry)
+        if comm is None:
+            continue
+        label = _match_name(comm, expanded_names)
+        if label:
+            return int(entry), label
+    return None, None
+
+
+def _scan_windows(expanded_names):
+    """Busca el juego enumerando procesos con la API de Win32"""
+    import ctypes
+    from ctypes import wintypes
+
+    psapi = ctypes.WinDLL('psapi')
+    kernel32 = ctypes.WinDLL('kernel32')
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+
+    pids = (wintypes.DWORD * 4096)()
+    needed = wintypes.DWORD()
+    if not psapi.EnumProcesses(ctypes.byref(pids), ctypes.sizeof(pids), ctypes.byref(needed)):
+        raise OSError("EnumProcesses falló")
+
+    count = needed.value // ctypes.sizeof(wintypes.DWORD)
+    buffer = ctypes.create_unicode_buffer(1024)
+    for pid in pids[:count]:
+        if not pid:
+            continue
+        handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+        if not handle:
+            continue
+        try:
+            size = wintypes.DWORD(len(buffer))
+            if kernel32.QueryFullProcessImageNameW(handle, 0, buffer, ctypes.byref(size)):
+                label = _match_name(os.path.basename(buffer.value), expanded_names)
+                if label:
+                    return pid, label
+        finally:
+            kernel32.CloseHandle(handle)
+    return None, None
+
+
+def _scan_ps(expanded_names):
+    """Último recurso para sistemas sin /proc: consultar ps"""
+    output = subprocess.check_output(['ps', '-A', '-o', 'pid=,comm='],
+                                     stderr=subprocess.DEVNULL).decode('utf-8', errors='ignore')
+    for line in output.splitlines():
+        parts = line.strip().split(None, 1)
+        if len(parts) != 2:
+            continue
+        label = _match_name(os.path.basename(parts[1]), expanded_names)
+        if label:
+            return int(parts[0]), label
+    return None, None
+
+
+def _windows_pid_alive(pid):
+    """Comprueba con la API de Win32 si un PID sigue activo"""
+    import ctypes
+    from ctypes import wintypes
+
+    kernel32 = ctypes.WinDLL('kernel32')
+    PROCESS_QUERY_LIMITED_INFORMATION = 0x1000
+    STILL_ACTIVE = 259
+
+    handle = kernel32.OpenProcess(PROCESS_QUERY_LIMITED_INFORMATION, False, pid)
+    if not handle:
+        return False
+    try:
+        exit_code = wintypes.DWORD()
+        if not kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code)):
+            return False
+        return exit_code.value == STILL_ACTIVE
+    finally:
+        kernel32.CloseHandle(handle)
+
+
+class ProcessMonitor:
+    """
+    Vigila el proceso del juego y notifica los cambios de estado.
+
+    El último resultado se guarda en caché durante cache_duration segundos, y
+    mientras el juego está en ejecución solo se comprueba su PID.
+    """
+
+    def __init__(self, names=None, cache_duration=CACHE_DURATION):
+        self.cache_duration = cache_duration
+        self._names = _expand_names(names or DEFAULT_PROCESS_NAMES)
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._watched_comm = None
+        self._status = {"running": False, "process": None, "pid": None, "timestamp": None}
+        self.stats = {"checks": 0, "cache_hits": 0, "pid_checks": 0, "scans": 0, "changes": 0}
+
+        system = platform.system()
+        if os.path.isdir(_PROC_DIR) and system != 'Windows':
+            self._scan = _scan_proc
+            self.backend = "proc"
+        elif system == 'Windows':
+            self._scan = _scan_windows
+            self.backend = "win32"
+        else:
+            self._scan = _scan_ps
+            self.backend = "ps"
+
+    def set_names(self, names):
+        """Actualiza la lista de nombres de proceso aceptados"""
+        with self._lock:
+            self._names = _expand_names(names)
+
+    def subscribe(self, callback):
+        """Registra una función que recibe el estado cada vez que cambia"""
+        with self._lock:
+            if callback not in self._subscribers:
+                self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        """Elimina un suscriptor registrado"""
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def watch_pid(self, pid, process=None):
+        """Vigila un PID conocido (por ejemplo, el devuelto al lanzar el juego)"""
+        with self._lock:
+            self._status["pid"] = pid
+            self._status["timestamp"] = None
+            self._watched_comm = _read_comm(pid) if self.backend == "proc" else None
+            if process:
+                self._status["process"] = process
+
+    def get_status(self, max_age=None):
+        """Devuelve el estado en caché si es reciente; si no, lo comprueba de nuevo"""
+        max_age = self.cache_duration if max_age is None else max_age
+        with self._lock:
+            timestamp = self._status["timestamp"]
+            if timestamp is not None and time.time() - timestamp < max_age:
+                self.stats["cache_hits"] += 1
+                return dict(self._status)
+        return self.check()
+
+    def _pid_alive(self, pid):
+        if self.backend == "proc":
+            comm = _read_comm(pid)
+            # Comparar el nombre evita confundir el juego con un PID reutilizado
+            return comm is not None and (self._watched_comm is None or comm == self._watched_comm)
+        if self.backend == "win32":
+            return _windows_pid_alive(pid)
+        try:
+            os.kill(pid, 0)
+            return True
+        except OSError:
+            return False
+
+    def check(self):
+        """Comprueba el estado del juego y publica el cambio si lo hay"""
+        with self._lock:
+            self.stats["checks"] += 1
+            previous = dict(self._status)
+            pid, process = previous["pid"], previous["process"]
+
+            alive = False
+            if pid is not None:
+                self.stats["pid_checks"] += 1
+                try:
+                    alive = self._pid_alive(pid)
+                except Exception as e:
+                    logger.debug(f"Error al vigilar el PID {pid}: {str(e)}")
+
+            if not alive:
+                self.stats["scans"] += 1
+                try:
+                    pid, process = self._scan(self._names)
+                except Exception as e:
+                    logger.error(f"Error al buscar el proceso del juego: {str(e)}")
+                    pid, process = None, None
+                self._watched_comm = _read_comm(pid) if pid is not None and self.backend == "proc" else None
+
+            self._status = {
+                "running": pid is not None,
+                "process": process if pid is not None else None,
+                "pid": pid,
+                "timestamp": time.time()
+            }
+            status = dict(self._status)
+            changed = status["running"] != previous["running"] or status["pid"] != previous["pid"]
+            subscribers = list(self._subscribers) if changed else []
+            if changed:
+                self.stats["changes"] += 1
+
+        if changed:
+            if status["running"]:
+                logger.info(f"¡Juego detectado! Proceso: {status['process']} (PID {status['pid']})")
+            else:
+                logger.info("Juego no detectado en la lista de procesos")
+            for callback in subscribers:
+                try:
+                    callback(status)
+                except Exception as e:
+                    logger.error(f"Error al notificar cambio de estado del juego: {str(e)}")
+        return status
+
+
+def find_game_process(names=None):
+    """Comprobación puntual para scripts: devuelve (en_ejecución, nombre_del_proceso)"""
+    status = ProcessMonitor(names).check()
+    return status["running"], status["process"]
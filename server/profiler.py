@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+"""
+Perfilado por muestreo de las peticiones HTTP.
+
+Con el perfilado activado, 1 de cada sample_rate peticiones se ejecuta bajo
+cProfile y sus estadísticas se acumulan en un único pstats.Stats. hot()
+devuelve las funciones con más tiempo acumulado (o propio) de todas las
+muestras, y por ruta cuántas peticiones se muestrearon.
+
+cProfile perfila el hilo que lo activa, así que solo se usa en modo threading
+(supported=False en los demás). En los modos eventlet y gevent todas las
+corrutinas comparten hilo: una muestra registraría también lo que ejecutan las
+demás peticiones y tareas mientras la petición muestreada espera, y atribuiría
+ese tiempo a sus funciones. Para acotar el coste se perfila como mucho una
+petición a la vez: si ya hay una muestra en curso, la petición que tocaba se
+omite (y se cuenta en skipped).
+"""
+
+import io
+import time
+import pstats
+import cProfile
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SAMPLE_RATE = 100
+DEFAULT_TOP = 30
+SORT_KEYS = ("cumulative", "tottime", "ncalls")
+
+
+class SamplingProfiler:
+    """Perfila 1 de cada sample_rate peticiones y acumula las estadísticas"""
+
+    def __init__(self, enabled=False, sample_rate=DEFAULT_SAMPLE_RATE, supported=True):
+        self.enabled = enabled
+        self.sample_rate = max(1, int(sample_rate))
+        self.supported = supported
+        if enabled and not supported:
+            logger.warning("El perfilado por muestreo solo está disponible en modo threading: no se perfilará")
+        self._lock = threading.Lock()
+        self._active = False
+        self._seen = 0
+        self._stats = None
+        self.samples = 0
+        self.skipped = 0
+        self.profiled_seconds = 0.0
+        self.by_endpoint = {}
+        self.since = time.time()
+
+    def configure(self, enabled=None, sample_rate=None):
+        with self._lock:
+            if enabled is not None:
+                self.enabled = bool(enabled)
+            if sample_rate is not None:
+                self.sample_rate = max(1, int(sample_rate))
+
+    def start(self):
+        """Devuelve un perfilador activo si a esta petición le toca muestra, o None"""
+        if not self.enabled or not self.supported:
+            return None
+        with self._lock:
+            self._seen += 1
+            if self._seen % self.sample_rate:
+                return None
+            if self._active:
+                self.skipped += 1
+                return None
+            self._active = True
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def stop(self, profile, endpoint, seconds):
+        """Detiene el perfilador de start() y acumula sus estadísticas"""
+        profile.disable()
+        try:
+            stats = pstats.Stats(profile, stream=io.StringIO())
+        except TypeError:
+            # Perfil sin llamadas registradas
+            stats = None
+        with self._lock:
+            self._active = False
+            if stats is not None:
+                if self._stats is None:
+                    self._stats = stats
+                else:
+                    self._stats.add(stats)
+            self.samples += 1
+            self.profiled_seconds += seconds
+            self.by_endpoint[endpoint] = self.by_endpoint.get(endpoint, 0) + 1
+
+    def reset(self):
+        with self._lock:
+            self._stats = None
+            self.samples = 0
+            self.skipped = 0
+            self.profiled_seconds = 0.0
+            self.by_endpoint = {}
+            self.since = time.time()
+
+    def hot(self, sort="cumulative", limit=DEFAULT_TOP):
+        """Funciones más costosas de todas las muestras, ordenadas por sort"""
+        if sort not in SORT_KEYS:
+            raise ValueError(f"sort debe ser uno de {', '.join(SORT_KEYS)}")
+        with self._lock:
+            entries = list(self._stats.stats.items()) if self._stats is not None else []
+            status = {
+                "enabled": self.enabled,
+                "supported": self.supported,
+                "sample_rate": self.sample_rate,
+                "samples": self.samples,
+                "skipped": self.skipped,
+                "profiled_seconds": round(self.profiled_seconds, 3),
+                "since": self.since,
+                "endpoints": dict(sorted(self.by_endpoint.items(), key=lambda item: -item[1])),
+            }
+        index = {"cumulative": 3, "tottime": 2, "ncalls": 1}[sort]
+        entries.sort(key=lambda entry: -entry[1][index])
+        status["sort"] = sort
+        status["functions"] = [{
+            "function": name,
+            "file": filename,
+            "line": line,
+            "ncalls": ncalls,
+            "primitive_calls": primitive,
+            "tottime": round(tottime, 6),
+            "cumtime": round(cumtime, 6),
+            "cumtime_per_sample": round(cumtime / status["samples"], 6) if status["samples"] else None,
+        } for (filename, line, name), (primitive, ncalls, tottime, cumtime, _) in entries[:limit]]
+        return status
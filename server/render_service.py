@@ -0,0 +1,458 @@
+#!/usr/bin/env python
+"""
+Servicio de renderizado de visualizaciones fuera del hilo de actualización.
+
+Los gráficos (mapa de calor, distribución de eventos y trayectoria) se dibujan
+fuera del hilo de actualización, así este y las peticiones a /api/refresh solo
+extraen los datos de entrada de cada gráfico y siguen adelante. Hay dos
+renderizadores:
+    numpy       numpy_render: sin texto, en milisegundos y sin cargar
+                matplotlib; se ejecuta en un pool de hilos nativos
+    matplotlib  gráficos con títulos y ejes para publicación; se ejecuta en un
+                pool de procesos (matplotlib es opcional)
+
+Por defecto cada gráfico usa el suyo (CHARTS[...]["renderer"]): NumPy para el
+mapa de calor, que no pierde información sin texto, y matplotlib para la
+distribución de eventos y la trayectoria, que sin etiquetas no se pueden leer
+(con NumPy si matplotlib no está instalado). server.renderer fuerza uno para todos.
+
+Cada imagen se identifica por una clave: el hash de sus datos de entrada y de
+sus parámetros (bins, cmap, dpi...). Si la clave no cambió desde el último
+renderizado el gráfico no se vuelve a dibujar, y las imágenes recientes se
+guardan en visualizations/cache para reutilizarlas (también las variantes con
+parámetros distintos pedidas desde la API). Cuando una imagen nueva está lista
+se copia a su nombre habitual (player_heatmap.png...) y se avisa mediante
+on_ready(chart, info).
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import logging
+import threading
+import importlib.util
+import multiprocessing
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor, wait as wait_futures
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime
+
+import lazy
+import metrics
+import async_mode
+
+# NumPy y el renderizador NumPy se cargan al preparar o dibujar el primer gráfico
+np = lazy.module("numpy")
+numpy_render = lazy.module("numpy_render")
+
+logger = logging.getLogger(__name__)
+
+# matplotlib solo se importa al dibujar con él (ocupa memoria y tarda en cargarse)
+MATPLOTLIB_AVAILABLE = importlib.util.find_spec("matplotlib") is not None
+
+RENDERERS = ("numpy", "matplotlib")
+DEFAULT_RENDERER = "numpy"
+DEFAULT_WORKERS = 1
+MAX_CACHE_ENTRIES = 32     # Imágenes guardadas en visualizations/cache
+MAX_TRAJECTORY_FRAMES = 1000
+CACHE_DIRNAME = "cache"
+
+# Gráficos disponibles: archivo publicado, título, renderizador y parámetros por defecto
+CHARTS = {
+    "player_heatmap": {
+        "file": "player_heatmap.png",
+        "title": "Mapa de Calor - Posiciones del Jugador",
+        "renderer": "numpy",
+        "params": {"bins": 50, "cmap": "hot", "dpi": 100},
+    },
+    "event_distribution": {
+        "file": "event_distribution.png",
+        "title": "Distribución de Tipos de Eventos",
+        "renderer": "matplotlib",
+        "params": {"dpi": 100},
+    },
+    "player_trajectory": {
+        "file": "player_trajectory.png",
+        "title": "Trayectoria del Jugador",
+        "renderer": "matplotlib",
+        "params": {"dpi": 100},
+    },
+}
+
+# Valores admitidos para los parámetros recibidos desde la API
+PARAM_LIMITS = {"bins": (5, 200), "dpi": (50, 200)}
+CMAPS = ("hot", "viridis", "magma", "inferno", "plasma", "gray", "coolwarm")
+
+
+def collect_inputs(events, max_frames=MAX_TRAJECTORY_FRAMES):
+    """
+    Extrae de los eventos los datos de entrada de cada gráfico.
+    Los gráficos sin datos suficientes no aparecen en el resultado.
+    """
+    positions = []
+    trajectory = []
+    frame_count = 0
+    event_types = Counter()
+    for event in events:
+        event_type = event.get("event_type")
+        if event_type is not None:
+            event_types[str(event_type)] += 1
+        if event_type != "frame_state":
+            continue
+        data = event.get("data") or {}
+        player = data.get("player") or {}
+        pos = player.get("position")
+        if pos is not None and pos.get("x") is not None and pos.get("y") is not None:
+            positions.append((pos["x"], pos["y"]))
+        frame_count += 1
+        if len(trajectory) < max_frames:
+            pos = pos or {}
+            trajectory.append((event.get("timestamp", 0), pos.get("x", 0), pos.get("y", 0)))
+
+    inputs = {}
+    if positions:
+        inputs["player_heatmap"] = {"positions": np.array(positions, dtype=float)}
+    if event_types:
+        inputs["event_distribution"] = {"types": list(event_types.keys()), "counts": list(event_types.values())}
+    if frame_count > 10:
+        inputs["player_trajectory"] = {"timestamp": [t[0] for t in trajectory],
+                                       "x": [t[1] for t in trajectory],
+                                       "y": [t[2] for t in trajectory]}
+    return inputs
+
+
+def check_renderer(renderer):
+    """Lanza ValueError si el renderizador no existe o no está instalado"""
+    if renderer not in RENDERERS:
+        raise ValueError(f"renderer debe ser uno de {', '.join(RENDERERS)}")
+    if renderer == "matplotlib" and not MATPLOTLIB_AVAILABLE:
+        raise ValueError("matplotlib no está instalado")
+
+
+def chart_renderer(chart, renderer=None):
+    """
+    Renderizador de un gráfico: renderer si se indica y, si no, el del gráfico
+    (NumPy en lugar de matplotlib si este no está instalado)
+    """
+    if renderer:
+        return renderer
+    renderer = CHARTS[chart]["renderer"]
+    return renderer if renderer != "matplotlib" or MATPLOTLIB_AVAILABLE else DEFAULT_RENDERER
+
+
+def parse_params(chart, args, renderer=None):
+    """
+    Parámetros del gráfico a partir de la petición (dict de texto) sobre los
+    valores por defecto. Lanza ValueError si algún valor no es válido.
+    """
+    params = dict(CHARTS[chart]["params"], renderer=chart_renderer(chart, args.get("renderer", renderer)))
+    check_renderer(params["renderer"])
+    for name, default in CHARTS[chart]["params"].items():
+        if name not in args:
+            continue
+        value = args[name]
+        if isinstance(default, int):
+            value = int(value)
+            low, high = PARAM_LIMITS[name]
+            if not low <= value <= high:
+                raise ValueError(f"{name} debe estar entre {low} y {high}")
+        elif name == "cmap" and value not in CMAPS:
+            raise ValueError(f"cmap debe ser uno de {', '.join(CMAPS)}")
+        params[name] = value
+    return params
+
+
+def chart_key(chart, inputs, params):
+    """Hash de los datos de entrada y los parámetros de un gráfico"""
+    digest = hashlib.md5(chart.encode())
+    digest.update(json.dumps(params, sort_keys=True).encode())
+    for name in sorted(inputs):
+        value = inputs[name]
+        digest.update(name.encode())
+        if isinstance(value, np.ndarray):
+            digest.update(str(value.shape).encode())
+            digest.update(value.tobytes())
+        else:
+            digest.update(json.dumps(value, default=str).encode())
+    return digest.hexdigest()
+
+
+def pyplot():
+    """matplotlib.pyplot con el backend sin GUI (importación diferida)"""
+    import matplotlib
+    matplotlib.use('Agg')  # Usar backend sin GUI
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def _draw_heatmap(plt, inputs, params):
+    positions = inputs["positions"]
+    plt.figure(figsize=(10, 8))
+    plt.hist2d(positions[:, 0], positions[:, 1], bins=params["bins"], cmap=params["cmap"])
+    plt.colorbar(label='Frecuencia')
+    plt.title('Mapa de Calor - Posiciones del Jugador')
+    plt.xlabel('Posición X')
+    plt.ylabel('Posición Y')
+
+
+def _draw_distribution(plt, inputs, params):
+    plt.figure(figsize=(12, 6))
+    plt.bar(inputs["types"], inputs["counts"])
+    plt.title('Distribución de Tipos de Eventos')
+    plt.xlabel('Tipo de Evento')
+    plt.ylabel('Cantidad')
+    plt.xticks(rotation=45, ha='right')
+
+
+def _draw_trajectory(plt, inputs, params):
+    plt.figure(figsize=(12, 6))
+    plt.plot(inputs["timestamp"], inputs["x"], label="Posición X")
+    plt.plot(inputs["timestamp"], inputs["y"], label="Posición Y")
+    plt.title('Trayectoria del Jugador')
+    plt.xlabel('Timestamp')
+    plt.ylabel('Coordenadas')
+    plt.legend()
+
+
+_DRAWERS = {
+    "player_heatmap": _draw_heatmap,
+    "event_distribution": _draw_distribution,
+    "player_trajectory": _draw_trajectory,
+}
+
+
+def render_chart(chart, inputs, params, path):
+    """
+    Dibuja un gráfico y lo guarda en path (se ejecuta en un hilo o proceso del
+    pool según el renderizador). Devuelve los segundos empleados.
+    """
+    start = time.perf_counter()
+    tmp_path = path + ".tmp"
+    if params.get("renderer", DEFAULT_RENDERER) == "numpy":
+        with open(tmp_path, 'wb') as f:
+            f.write(numpy_render.render(chart, inputs, params))
+    else:
+        plt = pyplot()
+        try:
+            _DRAWERS[chart](plt, inputs, params)
+            plt.tight_layout()
+            plt.savefig(tmp_path, format="png", dpi=params.get("dpi", 100))
+        finally:
+            plt.close('all')
+    os.replace(tmp_path, path)
+    return time.perf_counter() - start
+
+
+class RenderService:
+    """Pools de renderizado con caché de imágenes por clave"""
+
+    def __init__(self, output_dir, max_workers=DEFAULT_WORKERS, on_ready=None, renderer=None):
+        self.output_dir = output_dir
+        self.cache_dir = os.path.join(output_dir, CACHE_DIRNAME)
+        self.max_workers = max(1, int(max_workers))
+        self.on_ready = on_ready
+        if renderer:
+            try:
+                check_renderer(renderer)
+            except ValueError as e:
+                logger.warning(f"No se puede usar el renderizador {renderer} ({str(e)}), "
+                               f"cada gráfico usará el suyo")
+                renderer = None
+        self.renderer = renderer      # None: el de cada gráfico
+        self._lock = threading.Lock()
+        self._executors = {}          # renderizador -> pool
+        self._cache_ready = False
+        self._pending = {}            # clave -> future
+        self._cache = OrderedDict()   # clave -> ruta de la imagen en caché
+        self._wanted = {}             # gráfico -> clave que debe publicarse
+        self._inputs = {}             # gráfico -> últimos datos de entrada
+        self._status = {}             # gráfico -> información de la imagen publicada
+
+    def _get_executor(self, renderer):
+        if not self._cache_ready:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            # Las imágenes de ejecuciones anteriores no están en el índice de la caché
+            for filename in os.listdir(self.cache_dir):
+                try:
+                    os.remove(os.path.join(self.cache_dir, filename))
+                except OSError:
+                    pass
+            self._cache_ready = True
+        executor = self._executors.get(renderer)
+        if executor is None:
+            if renderer == "numpy":
+                # Hilos nativos también con eventlet/gevent (ver async_mode.NativeExecutor)
+                executor = async_mode.thread_executor(self.max_workers, thread_name_prefix="render")
+            else:
+                # spawn: los procesos no heredan los hilos ni el monkey patching del servidor
+                executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                               mp_context=multiprocessing.get_context("spawn"))
+            self._executors[renderer] = executor
+            logger.info(f"Pool de renderizado {renderer} iniciado con {self.max_workers} trabajadores")
+        return executor
+
+    def submit(self, data_version, inputs):
+        """
+        Encarga los gráficos cuyos datos de entrada cambiaron. No espera a que
+        terminen. Devuelve {gráfico: resultado} con resultado no_data,
+        unchanged, cached, pending o submitted.
+        """
+        results = {}
+        for chart, spec in CHARTS.items():
+            chart_inputs = inputs.get(chart)
+            if chart_inputs is None:
+                results[chart] = "no_data"
+                continue
+            params = dict(spec["params"], renderer=chart_renderer(chart, self.renderer))
+            key = chart_key(chart, chart_inputs, params)
+            with self._lock:
+                self._inputs[chart] = chart_inputs
+                self._wanted[chart] = key
+                if self._status.get(chart, {}).get("key") == key:
+                    results[chart] = "unchanged"
+                    metrics.RENDER_REQUESTS.inc(chart=chart, result="unchanged")
+                    continue
+            results[chart] = self._schedule(chart, key, chart_inputs, params, data_version)
+        return results
+
+    def render_variant(self, chart, params):
+        """
+        Imagen del gráfico con parámetros distintos de los por defecto, sobre los
+        últimos datos de entrada. Devuelve (estado, ruta): ready con la ruta de
+        la imagen, pending si se está dibujando o no_data.
+        """
+        with self._lock:
+            chart_inputs = self._inputs.get(chart)
+        if chart_inputs is None:
+            return "no_data", None
+        key = chart_key(chart, chart_inputs, params)
+        result = self._schedule(chart, key, chart_inputs, params, None)
+        if result == "cached":
+            with self._lock:
+                return "ready", self._cache.get(key)
+        return "pending", None
+
+    def _schedule(self, chart, key, chart_inputs, params, data_version):
+        with self._lock:
+            path = self._cache.get(key)
+            if path and os.path.exists(path):
+                self._cache.move_to_end(key)
+                cached = True
+            elif key in self._pending:
+                metrics.RENDER_REQUESTS.inc(chart=chart, result="pending")
+                return "pending"
+            else:
+                cached = False
+                path = os.path.join(self.cache_dir, f"{chart}-{key[:16]}.png")
+                renderer = params["renderer"]
+                try:
+                    future = self._get_executor(renderer).submit(render_chart, chart, chart_inputs, params, path)
+                except BrokenProcessPool:
+                    logger.warning("El pool de renderizado se detuvo, se crea uno nuevo")
+                    self._executors.pop(renderer, None)
+                    future = self._get_executor(renderer).submit(render_chart, chart, chart_inputs, params, path)
+                self._pending[key] = future
+        if cached:
+            metrics.RENDER_REQUESTS.inc(chart=chart, result="cached")
+            self._publish(chart, key, path, data_version, None)
+            return "cached"
+        future.add_done_callback(lambda f: self._finished(chart, key, path, data_version, params["renderer"], f))
+        return "submitted"
+
+    def _finished(self, chart, key, path, data_version, renderer, future):
+        try:
+            seconds = future.result()
+        except Exception as e:
+            logger.error(f"Error al renderizar {chart}: {str(e)}")
+            metrics.RENDER_REQUESTS.inc(chart=chart, result="error")
+            with self._lock:
+                self._pending.pop(key, None)
+                if isinstance(e, BrokenProcessPool):
+                    self._executors.pop(renderer, None)
+            return
+        metrics.RENDER_SECONDS.observe(seconds, chart=chart)
+        metrics.RENDER_REQUESTS.inc(chart=chart, result="rendered")
+        with self._lock:
+            self._cache[key] = path
+            self._evict()
+        self._publish(chart, key, path, data_version, round(seconds * 1000, 1))
+        with self._lock:
+            self._pending.pop(key, None)
+
+    def _evict(self):
+        keep = set(self._wanted.values())
+        for key in list(self._cache):
+            if len(self._cache) <= MAX_CACHE_ENTRIES:
+                break
+            if key in keep:
+                continue
+            path = self._cache.pop(key)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _publish(self, chart, key, path, data_version, render_ms):
+        """Copia la imagen a su nombre habitual si sigue siendo la más reciente del gráfico"""
+        with self._lock:
+            if self._wanted.get(chart) != key or self._status.get(chart, {}).get("key") == key:
+                return
+        filename = CHARTS[chart]["file"]
+        target = os.path.join(self.output_dir, filename)
+        try:
+            shutil.copyfile(path, target + ".tmp")
+            os.replace(target + ".tmp", target)
+        except OSError as e:
+            logger.error(f"Error al publicar {filename}: {str(e)}")
+            return
+        info = {
+            "title": CHARTS[chart]["title"],
+            "url": f"/static/visualizations/{filename}?v={key[:12]}",
+            "key": key,
+            "data_version": data_version,
+            "render_ms": render_ms,
+            "rendered_at": datetime.now().isoformat(),
+        }
+        with self._lock:
+            if self._wanted.get(chart) != key:
+                return
+            self._status[chart] = info
+        logger.info(f"Visualización lista: {filename}")
+        if self.on_ready is not None:
+            try:
+                self.on_ready(chart, info)
+            except Exception as e:
+                logger.error(f"Error al notificar la visualización {chart}: {str(e)}")
+
+    def status(self):
+        """Información de las imágenes publicadas, por gráfico"""
+        with self._lock:
+            return {chart: dict(info) for chart, info in self._status.items()}
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+
+    def wait(self, timeout=None):
+        """
+        Espera a que terminen (y se publiquen) los renderizados en curso.
+        Devuelve False si se agotó el tiempo.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                futures = list(self._pending.values())
+            if not futures:
+                return True
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0:
+                return False
+            wait_futures(futures, timeout=0.1 if remaining is None else min(remaining, 0.1))
+
+    def shutdown(self):
+        with self._lock:
+            executors, self._executors = list(self._executors.values()), {}
+        for executor in executors:
+            executor.shutdown(wait=True)
@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+"""
+Mapas de calor por sala: histogramas 2D de las posiciones del jugador y de los
+enemigos para cada combinación (forma de sala, id de sala, nivel).
+
+extract_data.py los actualiza en cada ingesta solo con los eventos nuevos y los
+guarda junto a la base de datos de la partición (room_heatmaps.npz), de modo
+que el servidor puede dibujar cualquier sala sin recorrer la base de datos.
+
+La forma de la sala solo llega en los eventos room_entered: los frame_state
+usan la última forma vista en la misma partida (semilla), que también se guarda
+para la siguiente ingesta. Las coordenadas se agrupan en celdas de BIN_SIZE
+unidades dentro de la extensión de cada forma; la fila 0 es la parte superior
+de la sala (el eje Y del juego crece hacia abajo).
+"""
+
+import os
+import json
+import logging
+from collections import defaultdict
+
+import lazy
+
+np = lazy.module("numpy")
+
+logger = logging.getLogger(__name__)
+
+STORE_FILE = "room_heatmaps.npz"
+STORE_VERSION = 1
+BIN_SIZE = 20
+KINDS = ("player", "enemy")
+UNKNOWN_SHAPE = 0
+
+# Extensión (x_min, x_max, y_min, y_max) de cada forma de sala (RoomShape del juego)
+_EXTENT_1X1 = (0, 640, 80, 480)
+_EXTENT_TALL = (0, 640, 80, 760)
+_EXTENT_WIDE = (0, 1160, 80, 480)
+_EXTENT_2X2 = (0, 1160, 80, 760)
+ROOM_EXTENTS = {
+    1: _EXTENT_1X1, 2: _EXTENT_1X1, 3: _EXTENT_1X1,     # 1x1, IH, IV
+    4: _EXTENT_TALL, 5: _EXTENT_TALL,                   # 1x2, IIV
+    6: _EXTENT_WIDE, 7: _EXTENT_WIDE,                   # 2x1, IIH
+    8: _EXTENT_2X2, 9: _EXTENT_2X2, 10: _EXTENT_2X2,    # 2x2 y salas en L
+    11: _EXTENT_2X2, 12: _EXTENT_2X2,
+}
+
+
+def extent(room_shape):
+    """Extensión de la forma de sala (las formas desconocidas usan la de 2x2)"""
+    return ROOM_EXTENTS.get(room_shape, _EXTENT_2X2)
+
+
+def grid_shape(room_shape):
+    """(filas, columnas) del histograma de la forma de sala"""
+    x_min, x_max, y_min, y_max = extent(room_shape)
+    return (y_max - y_min) // BIN_SIZE, (x_max - x_min) // BIN_SIZE
+
+
+def store_path(db_file):
+    """Archivo de histogramas de la partición cuya base de datos es db_file"""
+    return os.path.join(os.path.dirname(os.path.abspath(db_file)), STORE_FILE)
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _position(entity):
+    pos = (entity or {}).get("position")
+    if not isinstance(pos, dict):
+        return None
+    x, y = pos.get("x"), pos.get("y")
+    if isinstance(x, (int, float)) and isinstance(y, (int, float)):
+        return x, y
+    return None
+
+
+class RoomHeatmaps:
+    """Histogramas por (forma, sala, nivel, tipo) con actualización incremental"""
+
+    def __init__(self):
+        self.histograms = {}     # (room_shape, room_id, level, kind) -> array uint32 (filas, columnas)
+        self.room_shapes = {}    # semilla -> forma de la última sala visitada
+        self.frames = 0          # frame_state contabilizados
+
+    def add_events(self, events):
+        """Suma a los histogramas las posiciones de los eventos (en orden de llegada)"""
+        points = defaultdict(lambda: ([], []))
+        frames = 0
+        for event in events:
+            event_type = event.get("event_type")
+            data = event.get("data") or {}
+            game_data = event.get("game_data") or {}
+            seed = str(game_data.get("seed"))
+            if event_type == "room_entered":
+                room_shape = _as_int(data.get("room_shape"))
+                if room_shape is not None:
+                    self.room_shapes[seed] = room_shape
+                continue
+            if event_type != "frame_state":
+                continue
+
+            room_id = game_data.get("room_id")
+            if room_id is None:
+                room_id = (data.get("room") or {}).get("id")
+            room_id, level = _as_int(room_id), _as_int(game_data.get("level"))
+            if room_id is None or level is None:
+                continue
+            room = (self.room_shapes.get(seed, UNKNOWN_SHAPE), room_id, level)
+            frames += 1
+
+            position = _position(data.get("player"))
+            if position is not None:
+                xs, ys = points[room + ("player",)]
+                xs.append(position[0])
+                ys.append(position[1])
+            for entity in data.get("entities") or []:
+                if isinstance(entity, dict) and entity.get("is_enemy"):
+                    position = _position(entity)
+                    if position is not None:
+                        xs, ys = points[room + ("enemy",)]
+                        xs.append(position[0])
+                        ys.append(position[1])
+
+        for key, (xs, ys) in points.items():
+            self._accumulate(key, np.asarray(xs, dtype=float), np.asarray(ys, dtype=float))
+        self.frames += frames
+        return frames
+
+    def _accumulate(self, key, xs, ys):
+        room_shape = key[0]
+        x_min, _, y_min, _ = extent(room_shape)
+        rows, cols = grid_shape(room_shape)
+        col = np.clip(((xs - x_min) // BIN_SIZE).astype(np.intp), 0, cols - 1)
+        row = np.clip(((ys - y_min) // BIN_SIZE).astype(np.intp), 0, rows - 1)
+        counts = np.bincount(row * cols + col, minlength=rows * cols).reshape(rows, cols)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            self.histograms[key] = counts.astype(np.uint32)
+        else:
+            histogram += counts.astype(np.uint32)
+
+    def merge(self, other):
+        """Suma los histogramas de otra partición"""
+        for key, counts in other.histograms.items():
+            if key in self.histograms:
+                self.histograms[key] = self.histograms[key] + counts
+            else:
+                self.histograms[key] = counts.copy()
+        self.frames += other.frames
+        return self
+
+    def get(self, room_shape, room_id, level, kind):
+        return self.histograms.get((room_shape, room_id, level, kind))
+
+    def summary(self, room_shape=None, level=None, kind=None):
+        """Salas disponibles con el total de posiciones, de más a menos visitadas"""
+        rooms = []
+        for (shape, room_id, room_level, room_kind), counts in self.histograms.items():
+            if ((room_shape is not None and shape != room_shape) or
+                    (level is not None and room_level != level) or
+                    (kind is not None and room_kind != kind)):
+                continue
+            rooms.append({"room_shape": shape, "room_id": room_id, "level": room_level,
+                          "kind": room_kind, "total": int(counts.sum())})
+        rooms.sort(key=lambda room: room["total"], reverse=True)
+        return rooms
+
+    def save(self, path):
+        """Guarda los histogramas concatenados en un .npz comprimido (escritura atómica)"""
+        keys = sorted(self.histograms)
+        sizes = [self.histograms[key].size for key in keys]
+        meta = {"version": STORE_VERSION, "bin_size": BIN_SIZE, "frames": self.frames,
+                "room_shapes": self.room_shapes}
+        arrays = {
+            "keys": np.array([key[:3] for key in keys], dtype=np.int32).reshape(-1, 3),
+            "kinds": np.array([KINDS.index(key[3]) for key in keys], dtype=np.int8),
+            "offsets": np.concatenate([[0], np.cumsum(sizes)]).astype(np.int64),
+            "counts": (np.concatenate([self.histograms[key].ravel() for key in keys])
+                       if keys else np.zeros(0, dtype=np.uint32)),
+            "meta": np.frombuffer(json.dumps(meta).encode('utf-8'), dtype=np.uint8),
+        }
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Carga un archivo de histogramas; devuelve None si no existe o no es válido"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with np.load(path) as data:
+                meta = json.loads(data["meta"].tobytes().decode('utf-8'))
+                if meta.get("version") != STORE_VERSION or meta.get("bin_size") != BIN_SIZE:
+                    logger.warning(f"Histogramas de {path} con otro formato, se reconstruirán")
+                    return None
+                store = cls()
+                store.frames = meta.get("frames", 0)
+                store.room_shapes = meta.get("room_shapes", {})
+                offsets, counts = data["offsets"], data["counts"]
+                for i, (key, kind) in enumerate(zip(data["keys"].tolist(), data["kinds"].tolist())):
+                    room_shape = key[0]
+                    store.histograms[(room_shape, key[1], key[2], KINDS[kind])] = \
+                        counts[offsets[i]:offsets[i + 1]].reshape(grid_shape(room_shape)).copy()
+                return store
+        except Exception as e:
+            logger.error(f"Error al cargar los histogramas de {path}: {str(e)}")
+            return None
+
+
+def update_store(path, new_events, all_events=None):
+    """
+    Añade los eventos nuevos al archivo de histogramas. Si el archivo no existe
+    (o no es válido) y se pasa all_events, se reconstruye a partir de todos los
+    eventos de la partición. Devuelve los histogramas actualizados.
+    """
+    store = RoomHeatmaps.load(path)
+    if store is None:
+        store = RoomHeatmaps()
+        if all_events is not None:
+            new_events = all_events
+    store.add_events(new_events)
+    store.save(path)
+    return store
+
+
+def remove_store(path):
+    """Borra el archivo de histogramas para que la siguiente ingesta lo reconstruya"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
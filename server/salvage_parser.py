@@ -0,0 +1,366 @@
+#!/usr/bin/env python
+"""
+Parser incremental tolerante a fallos para los archivos de guardado del mod DEM.
+
+Recupera todos los eventos completos de un archivo truncado o corrupto en una
+sola pasada. Solo se mantiene en memoria el evento que se está leyendo, por lo
+que el consumo no depende del tamaño del archivo.
+
+Formatos soportados:
+- Array de eventos: [{...}, {...}]
+- Paquete de data_manager.lua: {"metadata": {...}, "stats": {...}, "events": [...]}
+- Un único evento: {...}
+
+iter_json_events ofrece además una lectura en streaming estricta y rápida para
+archivos bien formados, como la base de datos del servidor.
+"""
+
+import io
+import re
+import json
+import codecs
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024                 # Bytes leídos por iteración
+MAX_EVENT_SIZE = 16 * 1024 * 1024      # Tamaño máximo de un evento antes de darlo por corrupto
+
+# Caracteres estructurales fuera de strings y caracteres relevantes dentro de ellos
+_STRUCTURAL_RE = re.compile(rb'["{}\[\]]')
+_STRING_RE = re.compile(rb'["\\]')
+_SEPARATOR_RE = re.compile(rb'[^\s,]')
+_START_RE = re.compile(rb'[\[{]')
+
+_CLOSERS = {ord('}'): ord('{'), ord(']'): ord('[')}
+
+# Estados del parser
+_START = "start"
+_TOP_OBJECT = "top_object"
+_ARRAY = "array"
+_ELEMENT = "element"
+_DONE = "done"
+_ERROR = "error"
+
+
+class SalvageParser:
+    """
+    Parser que recibe el contenido por bloques y devuelve los eventos completos.
+    Al encontrar corrupción se detiene y registra el byte donde ocurrió.
+    """
+
+    def __init__(self, max_event_size=MAX_EVENT_SIZE):
+        self.max_event_size = max_event_size
+        self.state = _START
+        self.offset = 0            # Offset absoluto del inicio del bloque actual
+        self.stack = []
+        self.in_string = False
+        self.escape = False
+        self.buffer = bytearray()
+        self.element_start = None  # Offset absoluto del evento en curso
+        self.key_start = None
+        self.last_key = None
+        self.report = {
+            "format": None,
+            "events_recovered": 0,
+            "bytes_read": 0,
+            "skipped_prefix": 0,
+            "complete": False,
+            "error": None,
+            "error_offset": None
+        }
+
+    @property
+    def finished(self):
+        return self.state in (_DONE, _ERROR)
+
+    def _fail(self, message, offset):
+        self.state = _ERROR
+        self.buffer = bytearray()
+        self.report["error"] = message
+        self.report["error_offset"] = offset
+
+    def _decode(self, raw):
+        """Decodifica un evento completo; None si está corrupto"""
+        try:
+            return json.loads(raw.decode('utf-8', errors='ignore'))
+        except ValueError:
+            return None
+
+    def feed(self, data):
+        """Procesa un bloque de bytes y devuelve la lista de eventos completados"""
+        events = []
+        if self.offset == 0 and data.startswith(codecs.BOM_UTF8):
+            data = data[len(codecs.BOM_UTF8):]
+            self.offset = len(codecs.BOM_UTF8)
+
+        n = len(data)
+        pos = 0
+        segment_start = 0
+
+        while pos < n and not self.finished:
+            if self.state == _START:
+                match = _START_RE.search(data, pos)
+                if match is None:
+                    self.report["skipped_prefix"] += n - pos
+                    pos = n
+                    break
+                self.report["skipped_prefix"] += match.start() - pos
+                pos = match.end()
+                if data[match.start()] == ord('['):
+                    self.state = _ARRAY
+                    self.report["format"] = "array"
+                else:
+                    self.state = _TOP_OBJECT
+                    self.report["format"] = "object"
+                    self.stack = [ord('{')]
+                    self.element_start = self.offset + match.start()
+                    self.buffer = bytearray(b'{')
+                    segment_start = pos
+                continue
+
+            if self.state == _ARRAY:
+                match = _SEPARATOR_RE.search(data, pos)
+                if match is None:
+                    pos = n
+                    break
+                char = data[match.start()]
+                if char == ord('{'):
+                    self.state = _ELEMENT
+                    self.stack = [char]
+                    self.element_start = self.offset + match.start()
+                    self.buffer = bytearray()
+                    segment_start = match.start()
+                    pos = match.end()
+                elif char == ord(']'):
+                    self.state = _DONE
+                    self.report["complete"] = True
+                    pos = match.end()
+                else:
+                    self._fail("separador inesperado entre eventos", self.offset + match.start())
+                continue
+
+            # Estados _ELEMENT y _TOP_OBJECT: recorrer hasta cerrar el objeto
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                    pos += 1
+                    continue
+                match = _STRING_RE.search(data, pos)
+                if match is None:
+                    pos = n
+                    break
+                pos = match.end()
+                if data[match.start()] == ord('\\'):
+                    self.escape = True
+                    continue
+                self.in_string = False
+                if self.state == _TOP_OBJECT and len(self.stack) == 1 and self.key_start is not None:
+                    # Guardar la posible clave de primer nivel del paquete
+                    self.buffer += data[segment_start:pos]
+                    segment_start = pos
+                    self.last_key = bytes(self.buffer[self.key_start + 1:-1])
+                    self.key_start = None
+                continue
+
+            match = _STRUCTURAL_RE.search(data, pos)
+            if match is None:
+                pos = n
+                break
+            char = data[match.start()]
+            pos = match.end()
+
+            if char == ord('"'):
+                self.in_string = True
+                if self.state == _TOP_OBJECT and len(self.stack) == 1:
+                    self.buffer += data[segment_start:match.start()]
+                    segment_start = match.start()
+                    self.key_start = len(self.buffer)
+            elif char in (ord('{'), ord('[')):
+                if (self.state == _TOP_OBJECT and char == ord('[') and
+                        len(self.stack) == 1 and self.last_key == b'events'):
+                    # Es un paquete de data_manager.lua: procesar el array de eventos
+                    self.state = _ARRAY
+                    self.report["format"] = "package"
+                    self.buffer = bytearray()
+                    self.stack = []
+                    continue
+                self.stack.append(char)
+            else:
+                if not self.stack or self.stack[-1] != _CLOSERS[char]:
+                    self._fail("cierre de estructura inesperado", self.offset + match.start())
+                    continue
+                self.stack.pop()
+                if self.stack:
+                    continue
+
+                # Objeto completo
+                self.buffer += data[segment_start:pos]
+                segment_start = pos
+                event = self._decode(self.buffer)
+                if not isinstance(event, dict):
+                    self._fail("evento con JSON inválido", self.element_start)
+                    continue
+                events.append(event)
+                self.report["events_recovered"] += 1
+                self.buffer = bytearray()
+                self.state = _ARRAY if self.state == _ELEMENT else _DONE
+                if self.state == _DONE:
+                    self.report["complete"] = True
+
+        if self.state in (_ELEMENT, _TOP_OBJECT) and segment_start < n:
+            self.buffer += data[segment_start:n]
+            if len(self.buffer) > self.max_event_size:
+                self._fail(f"evento supera el tamaño máximo ({self.max_event_size} bytes)", self.element_start)
+
+        self.offset += n
+        self.report["bytes_read"] = self.offset
+        return events
+
+    def close(self):
+        """Finaliza el análisis y devuelve el reporte de recuperación"""
+        if self.state == _START:
+            self._fail("no se encontró contenido JSON", self.offset)
+        elif self.state == _ELEMENT:
+            self._fail("archivo truncado dentro de un evento", self.element_start)
+        elif self.state == _TOP_OBJECT:
+            self._fail("archivo truncado dentro del objeto principal", self.element_start)
+        elif self.state == _ARRAY:
+            self._fail("archivo truncado entre eventos", self.offset)
+
+        if self.report["error"]:
+            logger.warning(f"Recuperados {self.report['events_recovered']} eventos; "
+                           f"corrupción en el byte {self.report['error_offset']}: {self.report['error']}")
+        return self.report
+
+
+def iter_events(stream, report=None, chunk_size=CHUNK_SIZE):
+    """
+    Genera los eventos recuperables de un stream binario.
+    Si se pasa un diccionario en report, se rellena con el resultado al terminar.
+    """
+    parser = SalvageParser()
+    while not parser.finished:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        for event in parser.feed(chunk):
+            yield event
+    result = parser.close()
+    if report is not None:
+        report.update(result)
+
+
+def salvage_file(file_path, chunk_size=CHUNK_SIZE):
+    """Recupera los eventos de un archivo. Devuelve (eventos, reporte)"""
+    report = {}
+    with open(file_path, 'rb') as f:
+        events = list(iter_events(f, report, chunk_size))
+    return events, report
+
+
+def salvage_content(content, chunk_size=CHUNK_SIZE):
+    """Recupera los eventos de un contenido ya leído (str o bytes). Devuelve (eventos, reporte)"""
+    if isinstance(content, str):
+        content = content.encode('utf-8')
+    report = {}
+    events = list(iter_events(io.BytesIO(content), report, chunk_size))
+    return events, report
+
+
+# Lectura en streaming de archivos bien formados (sin recuperación de errores)
+_decoder = json.JSONDecoder()
+_WHITESPACE_RE = re.compile(r'\s*')
+_ELEMENT_SEPARATOR_RE = re.compile(r'[\s,]*')
+
+
+class _TextBuffer:
+    """Buffer de texto sobre un stream binario que se rellena bajo demanda"""
+
+    def __init__(self, stream, chunk_size):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.text = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self):
+        """Lee un bloque más. Devuelve False si el stream ya terminó"""
+        if self.eof:
+            return False
+        # Descartar lo ya consumido para que el buffer no crezca con el archivo
+        if self.pos > len(self.text) // 2:
+            self.text = self.text[self.pos:]
+            self.pos = 0
+        chunk = self.stream.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            self.text += self.decoder.decode(b"", final=True)
+            return False
+        self.text += self.decoder.decode(chunk)
+        return True
+
+    def skip(self, regex):
+        while True:
+            self.pos = regex.match(self.text, self.pos).end()
+            if self.pos < len(self.text) or not self.fill():
+                return
+
+    def peek(self):
+        """Siguiente carácter que no sea espacio ("" al final del stream)"""
+        self.skip(_WHITESPACE_RE)
+        return self.text[self.pos] if self.pos < len(self.text) else ""
+
+    def value(self):
+        """Decodifica el siguiente valor JSON, leyendo más bloques si está incompleto"""
+        self.skip(_WHITESPACE_RE)
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self.text, self.pos)
+                if end < len(self.text) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self.fill()
+
+
+def iter_json_events(stream, key="events", chunk_size=CHUNK_SIZE):
+    """
+    Genera los elementos de un array JSON bien formado, o del array bajo la clave
+    key del objeto raíz (base de datos o paquete), leyendo el stream por bloques.
+
+    Es la contraparte estricta de iter_events: cada evento se decodifica con el
+    decodificador nativo de json, por lo que es varias veces más rápida, pero no
+    recupera datos corruptos y lanza ValueError ante el primer error.
+    """
+    buffer = _TextBuffer(stream, chunk_size)
+    first = buffer.peek()
+    if first == "{":
+        buffer.pos += 1
+        while True:
+            if buffer.peek() == "}":
+                return
+            name = buffer.value()
+            if buffer.peek() != ":":
+                raise ValueError(f"Se esperaba ':' tras la clave {name!r}")
+            buffer.pos += 1
+            if name == key and buffer.peek() == "[":
+                break
+            buffer.value()
+            buffer.skip(_ELEMENT_SEPARATOR_RE)
+        first = "["
+    if first != "[":
+        raise ValueError("El contenido no es un array JSON ni un objeto con eventos")
+
+    buffer.pos += 1
+    while True:
+        buffer.skip(_ELEMENT_SEPARATOR_RE)
+        current = buffer.peek()
+        if current == "]":
+            return
+        if not current:
+            raise ValueError("Array JSON truncado")
+        yield buffer.value()
@@ -0,0 +1,307 @@
+#!/usr/bin/env python
+"""
+Planificador de tareas en segundo plano del servidor.
+
+Un único bucle comprueba cada TICK segundos qué tareas tocan y las lanza en
+orden de prioridad (número menor = más prioritaria), con como mucho
+max_concurrent tareas a la vez. Una tarea no se solapa consigo misma: si
+vuelve a tocar mientras sigue en ejecución, esa ejecución se omite y se
+cuenta. Cada tarea se programa con un disparador:
+    IntervalTrigger(segundos)      cada N segundos desde el inicio de la anterior
+    CronTrigger("*/5 * * * *")     expresión cron de 5 campos (minuto hora día mes día_semana)
+
+Las tareas se ejecutan con start_task (socketio.start_background_task en el
+servidor, de modo que en eventlet/gevent son corrutinas) y status() devuelve
+por tarea el número de ejecuciones, su duración y la última y la próxima.
+"""
+
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+TICK = 0.5
+DEFAULT_MAX_CONCURRENT = 2
+
+
+class IntervalTrigger:
+    """Cada seconds segundos, contados desde el inicio de la ejecución anterior"""
+
+    def __init__(self, seconds):
+        if seconds <= 0:
+            raise ValueError("El intervalo debe ser mayor que 0")
+        self.seconds = seconds
+
+    def next_after(self, timestamp):
+        return timestamp + self.seconds
+
+    def describe(self):
+        return f"cada {self.seconds} s"
+
+
+# (nombre, mínimo, máximo) de cada campo de la expresión cron
+_CRON_FIELDS = (("minuto", 0, 59), ("hora", 0, 23), ("día", 1, 31), ("mes", 1, 12), ("día de la semana", 0, 7))
+
+
+def _parse_cron_field(text, name, low, high):
+    """Valores permitidos de un campo cron: *, */n, a, a-b, a-b/n y listas separadas por comas"""
+    values = set()
+    for part in text.split(","):
+        step = 1
+        if "/" in part:
+            part, step_text = part.split("/", 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"Paso no válido en el campo {name}")
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(value) for value in part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+        if not low <= start <= end <= high:
+            raise ValueError(f"Valor fuera de rango en el campo {name}: {part}")
+        values.update(range(start, end + 1, step))
+    if name == "día de la semana":
+        # 7 también es domingo
+        values = {value % 7 for value in values}
+    return values
+
+
+class CronTrigger:
+    """Expresión cron de 5 campos, evaluada en la hora local"""
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError("La expresión cron debe tener 5 campos: minuto hora día mes día_semana")
+        try:
+            self.minutes, self.hours, self.days, self.months, self.weekdays = (
+                _parse_cron_field(text, *spec) for text, spec in zip(fields, _CRON_FIELDS))
+        except ValueError as e:
+            raise ValueError(f"Expresión cron no válida '{expression}': {str(e)}")
+        # Como en cron: si se restringen el día del mes y el de la semana, basta con uno
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+        self.expression = expression
+
+    def _day_matches(self, moment):
+        weekday = (moment.weekday() + 1) % 7  # cron: 0 = domingo
+        day_ok, weekday_ok = moment.day in self.days, weekday in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, timestamp):
+        moment = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = moment + timedelta(days=366 * 5)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment.timestamp()
+        raise ValueError(f"La expresión cron '{self.expression}' no tiene próximas ejecuciones")
+
+    def describe(self):
+        return f"cron {self.expression}"
+
+
+def make_trigger(spec):
+    """Disparador a partir de la configuración: {"interval": segundos} o {"cron": "expresión"}"""
+    if "cron" in spec:
+        return CronTrigger(spec["cron"])
+    if "interval" in spec:
+        return IntervalTrigger(spec["interval"])
+    raise ValueError("La tarea necesita 'interval' o 'cron'")
+
+
+def _iso(timestamp):
+    return datetime.fromtimestamp(timestamp).isoformat() if timestamp else None
+
+
+class Job:
+    """Una tarea programada y sus estadísticas"""
+
+    def __init__(self, name, func, trigger, priority=10, run_at_start=False, enabled=True):
+        self.name = name
+        self.func = func
+        self.trigger = trigger
+        self.priority = priority
+        self.enabled = enabled
+        self.running = False
+        self.next_run = time.time() if run_at_start else trigger.next_after(time.time())
+        self.runs = 0
+        self.failures = 0
+        self.skipped = 0
+        self.last_start = None
+        self.last_end = None
+        self.last_duration = None
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_error = None
+
+    def status(self):
+        return {
+            "name": self.name,
+            "trigger": self.trigger.describe(),
+            "priority": self.priority,
+            "enabled": self.enabled,
+            "running": self.running,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped_overlaps": self.skipped,
+            "last_run": _iso(self.last_start),
+            "last_end": _iso(self.last_end),
+            "last_duration_ms": round(self.last_duration * 1000, 1) if self.last_duration is not None else None,
+            "avg_duration_ms": round(self.total_duration / self.runs * 1000, 1) if self.runs else None,
+            "max_duration_ms": round(self.max_duration * 1000, 1),
+            "last_error": self.last_error,
+            "next_run": _iso(self.next_run) if self.enabled else None,
+        }
+
+
+class Scheduler:
+    """
+    Bucle de planificación. start_task(func) lanza func en segundo plano (por
+    defecto un hilo) y on_finish(job, seconds, error) se llama tras cada ejecución.
+    """
+
+    def __init__(self, start_task=None, max_concurrent=DEFAULT_MAX_CONCURRENT, on_finish=None):
+        self.start_task = start_task or (lambda func: threading.Thread(target=func, daemon=True).start())
+        self.max_concurrent = max_concurrent
+        self.on_finish = on_finish
+        self.jobs = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._started = False
+        self._running = 0
+
+    def add(self, name, func, trigger, priority=10, run_at_start=False, enabled=True):
+        with self._lock:
+            if name in self.jobs:
+                raise ValueError(f"Ya existe la tarea {name}")
+            self.jobs[name] = Job(name, func, trigger, priority, run_at_start, enabled)
+        logger.info(f"Tarea {name} programada ({trigger.describe()}, prioridad {priority})")
+        return self.jobs[name]
+
+    def _job(self, name):
+        job = self.jobs.get(name)
+        if job is None:
+            raise KeyError(name)
+        return job
+
+    def reschedule(self, name, trigger=None, priority=None):
+        with self._lock:
+            job = self._job(name)
+            if trigger is not None:
+                job.trigger = trigger
+                job.next_run = trigger.next_after(job.last_start or time.time())
+            if priority is not None:
+                job.priority = priority
+
+    def set_enabled(self, name, enabled):
+        with self._lock:
+            job = self._job(name)
+            job.enabled = enabled
+            if enabled:
+                job.next_run = job.trigger.next_after(time.time())
+
+    def run_now(self, name):
+        """Adelanta la próxima ejecución al siguiente ciclo; False si la tarea está en ejecución"""
+        with self._lock:
+            job = self._job(name)
+            if job.running:
+                return False
+            job.next_run = time.time()
+            return True
+
+    def status(self):
+        with self._lock:
+            return {
+                "running": self._started and not self._stop.is_set(),
+                "max_concurrent": self.max_concurrent,
+                "active": self._running,
+                "jobs": [job.status() for job in sorted(self.jobs.values(), key=lambda j: (j.priority, j.name))]
+            }
+
+    def start(self):
+        self._stop.clear()
+        self._started = True
+        self.start_task(self._loop)
+        logger.info(f"Planificador iniciado con {len(self.jobs)} tareas")
+
+    def stop(self):
+        self._stop.set()
+
+    def tick(self, now=None):
+        """Lanza las tareas que tocan; devuelve sus nombres (lo llama el bucle en cada ciclo)"""
+        now = time.time() if now is None else now
+        launched = []
+        with self._lock:
+            due = sorted((job for job in self.jobs.values() if job.enabled and job.next_run <= now),
+                         key=lambda job: (job.priority, job.next_run))
+            for job in due:
+                if job.running:
+                    # Sin solapamiento: se omite esta ejecución
+                    job.skipped += 1
+                    job.next_run = job.trigger.next_after(now)
+                    logger.warning(f"La tarea {job.name} sigue en ejecución, se omite esta ejecución")
+                    continue
+                if self._running >= self.max_concurrent:
+                    # Las tareas menos prioritarias esperan a que quede un hueco
+                    break
+                job.running = True
+                job.last_start = now
+                job.next_run = job.trigger.next_after(now)
+                self._running += 1
+                launched.append(job)
+        for job in launched:
+            self.start_task(lambda job=job: self._execute(job))
+        return [job.name for job in launched]
+
+    def _execute(self, job):
+        start = time.perf_counter()
+        error = None
+        try:
+            job.func()
+        except Exception as e:
+            error = str(e)
+            logger.error(f"Error en la tarea {job.name}: {error}")
+        except BaseException:
+            # Interrumpida (GreenletExit, Timeout, KeyboardInterrupt): se registra y se relanza
+            error = "interrumpida"
+            raise
+        finally:
+            # Siempre se libera la tarea: si no, no volvería a ejecutarse y ocuparía un hueco
+            seconds = time.perf_counter() - start
+            with self._lock:
+                job.running = False
+                job.last_end = time.time()
+                job.last_duration = seconds
+                job.total_duration += seconds
+                job.max_duration = max(job.max_duration, seconds)
+                job.runs += 1
+                job.last_error = error
+                if error:
+                    job.failures += 1
+                self._running -= 1
+        if self.on_finish:
+            self.on_finish(job, seconds, error)
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.tick()
+            except Exception as e:
+                logger.error(f"Error en el planificador: {str(e)}")
+            self._stop.wait(TICK)
+        logger.info("Planificador detenido")
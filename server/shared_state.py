@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+"""
+Estado compartido entre los procesos del servidor.
+
+Con un solo proceso basta con MemoryState (el valor por defecto). Para
+ejecutar app.py en varios procesos (por ejemplo varios trabajadores detrás
+de un balanceador) se usa SQLiteState: un archivo SQLite en modo WAL que
+todos los procesos de la máquina abren a la vez. Los dos ofrecen lo mismo:
+
+    get/set            valores JSON por clave (estado del juego, hash de los datos)
+    incr/counter       contadores atómicos (versión de los datos)
+    try_acquire/release/holder
+                       concesiones con caducidad (lease): las tiene un solo
+                       propietario hasta que las libera o deja de renovarlas
+    lock(nombre)       exclusión mutua entre procesos construida sobre una concesión
+
+LeaderElection usa una concesión para que exactamente un proceso sea el líder
+(el que ejecuta las tareas en segundo plano). El líder la renueva cada ttl/3
+segundos; si el proceso muere, otro la obtiene cuando caduca.
+"""
+
+import os
+import copy
+import json
+import time
+import socket
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("memory", "sqlite")
+DEFAULT_PATH = os.path.join("processed_data", "shared_state.db")
+DEFAULT_LEASE_TTL = 15.0
+LOCK_POLL_INTERVAL = 0.1
+
+
+def worker_id():
+    """
+    Identificador de este proceso en las concesiones. Se calcula en cada llamada:
+    los trabajadores creados con fork después de importar el módulo tienen otro PID.
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class MemoryState:
+    """Estado de un único proceso (sin compartir)"""
+
+    shared = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._values = {}
+        self._counters = {}
+        self._leases = {}
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._values:
+                return default
+            return copy.deepcopy(self._values[key])
+
+    def set(self, key, value):
+        with self._lock:
+            self._values[key] = copy.deepcopy(value)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+            return self._counters[name]
+
+    def counter(self, name):
+        return self._counters.get(name, 0)
+
+    def try_acquire(self, name, owner, ttl):
+        now = time.time()
+        with self._lock:
+            holder = self._leases.get(name)
+            if holder is None or holder[0] == owner or holder[1] <= now:
+                self._leases[name] = (owner, now + ttl)
+                return True
+            return False
+
+    def release(self, name, owner):
+        with self._lock:
+            if self._leases.get(name, (None,))[0] == owner:
+                del self._leases[name]
+
+    def holder(self, name):
+        """(propietario, caducidad) de la concesión vigente, o None"""
+        holder = self._leases.get(name)
+        return holder if holder is not None and holder[1] > time.time() else None
+
+    def lock(self, name, ttl=DEFAULT_LEASE_TTL, timeout=None):
+        return _lease_lock(self, name, ttl, timeout)
+
+    def describe(self):
+        return {"backend": "memory", "shared": False}
+
+
+class SQLiteState:
+    """
+    Estado compartido en un archivo SQLite. Una sola conexión por proceso,
+    serializada con un cerrojo (en eventlet/gevent es el cerrojo de corrutinas)
+    y abierta de nuevo en los procesos hijos de un fork; entre procesos se
+    coordina SQLite, esperando hasta timeout segundos si la base de datos está
+    bloqueada.
+    """
+
+    shared = True
+
+    def __init__(self, path=DEFAULT_PATH, timeout=5.0):
+        self.path = path
+        self.timeout = timeout
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._connection = None
+        with self._lock:
+            conn = self._conn
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value TEXT NOT NULL, updated REAL NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+            conn.execute("CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL)")
+
+    @property
+    def _conn(self):
+        """Conexión de este proceso (una conexión SQLite no se puede usar tras un fork)"""
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                               check_same_thread=False)
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._connection
+
+    @contextmanager
+    def _transaction(self):
+        """Transacción de escritura: BEGIN IMMEDIATE bloquea a los demás escritores hasta el COMMIT"""
+        with self._lock:
+            conn = self._conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def get(self, key, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM kv WHERE key = ?", (key,)).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def set(self, key, value):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO kv (key, value, updated) VALUES (?, ?, ?)",
+                               (key, json.dumps(value), time.time()))
+
+    def incr(self, name, amount=1):
+        with self._transaction() as conn:
+            conn.execute("INSERT INTO counters (name, value) VALUES (?, ?) "
+                         "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value", (name, amount))
+            return conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()[0]
+
+    def counter(self, name):
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM counters WHERE name = ?", (name,)).fetchone()
+        return 0 if row is None else row[0]
+
+    def try_acquire(self, name, owner, ttl):
+        now = time.time()
+        with self._transaction() as conn:
+            cursor = conn.execute(
+                "INSERT INTO leases (name, owner, expires) VALUES (?, ?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires = excluded.expires "
+                "WHERE leases.owner = excluded.owner OR leases.expires <= ?",
+                (name, owner, now + ttl, now))
+            return cursor.rowcount > 0
+
+    def release(self, name, owner):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE name = ? AND owner = ?", (name, owner))
+
+    def holder(self, name):
+        """(propietario, caducidad) de la concesión vigente, o None"""
+        with self._lock:
+            row = self._conn.execute("SELECT owner, expires FROM leases WHERE name = ? AND expires > ?",
+                                     (name, time.time())).fetchone()
+        return tuple(row) if row is not None else None
+
+    def lock(self, name, ttl=DEFAULT_LEASE_TTL, timeout=None):
+        return _lease_lock(self, name, ttl, timeout)
+
+    def describe(self):
+        return {"backend": "sqlite", "shared": True, "path": os.path.abspath(self.path)}
+
+
+@contextmanager
+def _lease_lock(state, name, ttl, timeout):
+    """
+    Cerrojo entre procesos: espera (sondeando) hasta obtener la concesión
+    lock:<name>. ttl limita cuánto puede retenerla un proceso que muere sin
+    liberarla. Lanza TimeoutError si no la obtiene en timeout segundos.
+    """
+    owner = f"{worker_id()}:{threading.get_ident()}"
+    lease = f"lock:{name}"
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while not state.try_acquire(lease, owner, ttl):
+        if deadline is not None and time.monotonic() >= deadline:
+            raise TimeoutError(f"No se obtuvo el cerrojo {name} en {timeout} s")
+        time.sleep(LOCK_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        state.release(lease, owner)
+
+
+def open_state(spec=None):
+    """Estado compartido según server.shared_state de config.json ({"backend", "path"})"""
+    spec = spec or {}
+    backend = spec.get("backend", "memory")
+    if backend == "memory":
+        return MemoryState()
+    if backend == "sqlite":
+        return SQLiteState(spec.get("path", DEFAULT_PATH))
+    raise ValueError(f"backend debe ser uno de {', '.join(BACKENDS)}")
+
+
+class LeaderElection:
+    """
+    Elige un líder entre los procesos que comparten state con la concesión name.
+    on_elected() y on_demoted() se llaman al ganar o perder el liderazgo.
+    """
+
+    def __init__(self, state, name="leader", worker=None, ttl=DEFAULT_LEASE_TTL,
+                 on_elected=None, on_demoted=None):
+        self.state = state
+        self.name = name
+        self._worker = worker
+        self.ttl = ttl
+        self.on_elected = on_elected
+        self.on_demoted = on_demoted
+        self.is_leader = False
+        self.elected_at = None
+        self._stop = threading.Event()
+
+    @property
+    def worker_id(self):
+        return self._worker or worker_id()
+
+    def elect(self):
+        """Intenta obtener o renovar la concesión; devuelve si este proceso es el líder"""
+        try:
+            leader = self.state.try_acquire(self.name, self.worker_id, self.ttl)
+        except sqlite3.Error as e:
+            logger.error(f"Error al renovar el liderazgo: {str(e)}")
+            leader = False
+        if leader and not self.is_leader:
+            self.is_leader = True
+            self.elected_at = time.time()
+            logger.info(f"Proceso {self.worker_id} elegido líder de las tareas en segundo plano")
+            self._notify(self.on_elected)
+        elif not leader and self.is_leader:
+            self.is_leader = False
+            self.elected_at = None
+            logger.warning(f"Proceso {self.worker_id} ha perdido el liderazgo")
+            self._notify(self.on_demoted)
+        return self.is_leader
+
+    def _notify(self, callback):
+        if callback is None:
+            return
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"Error al cambiar de liderazgo: {str(e)}")
+
+    def start(self, start_task=None):
+        """Renueva la concesión cada ttl/3 segundos con start_task (por defecto un hilo)"""
+        self._stop.clear()
+        if start_task is None:
+            threading.Thread(target=self._loop, daemon=True).start()
+        else:
+            start_task(self._loop)
+
+    def stop(self):
+        """Deja de renovar y libera la concesión para que otro proceso la obtenga sin esperar"""
+        self._stop.set()
+        if self.is_leader:
+            self.state.release(self.name, self.worker_id)
+            self.is_leader = False
+
+    def _loop(self):
+        while not self._stop.wait(self.ttl / 3):
+            self.elect()
+
+    def status(self):
+        holder = self.state.holder(self.name)
+        return {
+            "worker_id": self.worker_id,
+            "is_leader": self.is_leader,
+            "elected_at": self.elected_at,
+            "leader": holder[0] if holder else None,
+            "lease_expires": holder[1] if holder else None,
+            "ttl": self.ttl,
+        }
@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+"""
+Coordinador "single-flight" para operaciones caras que no deben solaparse.
+
+Mientras una llamada está en curso, las demás no lanzan otra: esperan a la
+que está en vuelo y reciben su mismo resultado (o su misma excepción). Además,
+si la última llamada terminó bien hace menos de min_interval segundos, se
+devuelve su resultado sin volver a ejecutar la operación, lo que evita
+estampidas cuando muchos clientes piden lo mismo a la vez. Una llamada fallida
+(excepción, o resultado que no cumple success) no se reutiliza.
+
+Se usa para la actualización de datos (extract_data.py): /api/refresh, el
+evento manual_update y el hilo de actualización automática comparten un
+mismo coordinador.
+"""
+
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Flight:
+    """Una ejecución de la operación: resultado o excepción y cuándo terminó"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.started_at = time.monotonic()
+        self.finished_at = None
+        self.waiters = 0
+
+
+class Outcome:
+    """
+    Resultado para un llamante. shared indica que no ejecutó la operación: se
+    unió a una en curso ("joined") o reutilizó la última ("recent").
+    """
+
+    def __init__(self, flight, how):
+        self.result = flight.result
+        self.how = how
+        self.shared = how != "leader"
+        self.age = time.monotonic() - flight.finished_at
+
+
+class SingleFlight:
+    """Ejecuciones de func sin solapamiento, compartiendo el resultado entre llamantes"""
+
+    def __init__(self, func, min_interval=0, name="operación", success=None):
+        self.func = func
+        self.min_interval = min_interval
+        self.name = name
+        self.success = success  # success(resultado) indica si se puede reutilizar
+        self._lock = threading.Lock()
+        self._current = None   # Flight en curso
+        self._last = None      # última Flight terminada con éxito
+
+    def in_flight(self):
+        with self._lock:
+            return self._current is not None
+
+    def run(self, *args, **kwargs):
+        """
+        Ejecuta la operación o se une a la que está en curso. Devuelve un Outcome;
+        si la operación lanzó una excepción, se relanza en todos los llamantes.
+        """
+        with self._lock:
+            flight = self._current
+            if flight is not None:
+                flight.waiters += 1
+                how = "joined"
+            elif (self._last is not None and self.min_interval > 0 and
+                  time.monotonic() - self._last.finished_at < self.min_interval):
+                return Outcome(self._last, "recent")
+            else:
+                flight = self._current = Flight()
+                how = "leader"
+
+        if how == "joined":
+            logger.info(f"{self.name} en curso: se espera a su resultado")
+            flight.done.wait()
+        else:
+            try:
+                flight.result = self.func(*args, **kwargs)
+            except Exception as e:
+                flight.error = e
+            except BaseException:
+                # Interrumpida (GreenletExit, Timeout, KeyboardInterrupt): la excepción
+                # sigue en el líder y los que esperan reciben un error
+                flight.error = RuntimeError(f"{self.name} interrumpida")
+                raise
+            finally:
+                # Siempre se cierra la Flight: si no, las llamadas siguientes esperarían para siempre
+                flight.finished_at = time.monotonic()
+                with self._lock:
+                    self._current = None
+                    if flight.error is None and (self.success is None or self.success(flight.result)):
+                        self._last = flight
+                flight.done.set()
+            if flight.waiters:
+                logger.info(f"{self.name}: {flight.waiters} solicitudes recibieron el mismo resultado")
+
+        if flight.error is not None:
+            raise flight.error
+        return Outcome(flight, how)
@@ -0,0 +1,129 @@
+/**
+ * Suscripción por temas a las actualizaciones del servidor (Socket.IO).
+ *
+ * El servidor envía una instantánea inicial de cada tema y después solo los
+ * cambios (JSON Merge Patch) con un número de versión y la época del servidor
+ * (cambia al reiniciarlo). Si se detecta un hueco entre versiones o un delta de
+ * otra época se pide la instantánea completa ('resync').
+ *
+ * Uso:
+ *     const socket = DEMTopics.connect();
+ *     DEMTopics.subscribe('stats', (stats, delta) => { ... });
+ *
+ * Temas: stats, game_status, runs, vision, visualizations
+ */
+(function () {
+    const state = {};      // tema -> datos actuales
+    const versions = {};   // tema -> versión aplicada
+    const epochs = {};     // tema -> época del servidor de esa versión
+    const handlers = {};   // tema -> lista de funciones
+    let announced = [];    // temas enviados en la autenticación de la conexión actual
+    let socket = null;
+
+    function applyPatch(target, patch) {
+        if (patch === null || typeof patch !== 'object' || Array.isArray(patch)) {
+            return patch;
+        }
+        const result = (target && typeof target === 'object' && !Array.isArray(target)) ? Object.assign({}, target) : {};
+        Object.keys(patch).forEach((key) => {
+            if (patch[key] === null) {
+                delete result[key];
+            } else {
+                result[key] = applyPatch(result[key], patch[key]);
+            }
+        });
+        return result;
+    }
+
+    function notify(topic, delta) {
+        (handlers[topic] || []).forEach((handler) => {
+            try {
+                handler(state[topic], delta);
+            } catch (error) {
+                console.error(`Error en el manejador del tema ${topic}:`, error);
+            }
+        });
+    }
+
+    // Lo que ya tiene el cliente de cada tema, para que el servidor envíe solo lo que falta
+    function known() {
+        const result = {};
+        Object.keys(versions).forEach((topic) => {
+            result[topic] = { epoch: epochs[topic], version: versions[topic] };
+        });
+        return result;
+    }
+
+    function connect() {
+        if (socket) {
+            return socket;
+        }
+        socket = io({
+            // Se evalúa en cada (re)conexión: el servidor envía solo lo que falta
+            auth: (cb) => {
+                announced = Object.keys(handlers);
+                cb({ topics: announced, versions: known() });
+            }
+        });
+
+        socket.on('connect', () => {
+            // Temas registrados mientras la conexión ya estaba en curso
+            const pending = Object.keys(handlers).filter((topic) => !announced.includes(topic));
+            if (pending.length) {
+                socket.emit('subscribe', { topics: pending, versions: known() });
+            }
+        });
+
+        socket.on('topic_snapshot', (msg) => {
+            state[msg.topic] = msg.data;
+            versions[msg.topic] = msg.version;
+            epochs[msg.topic] = msg.epoch;
+            notify(msg.topic, null);
+        });
+
+        socket.on('topic_delta', (msg) => {
+            const current = versions[msg.topic];
+            if (epochs[msg.topic] !== msg.epoch) {
+                console.warn(`Tema ${msg.topic} de otra época del servidor, resincronizando`);
+                socket.emit('resync', { topic: msg.topic });
+                return;
+            }
+            if (current !== undefined && msg.version <= current) {
+                return;  // Ya aplicado
+            }
+            if (current !== msg.base_version) {
+                console.warn(`Hueco en el tema ${msg.topic} (${current} -> ${msg.base_version}), resincronizando`);
+                socket.emit('resync', { topic: msg.topic });
+                return;
+            }
+            state[msg.topic] = applyPatch(state[msg.topic], msg.delta);
+            versions[msg.topic] = msg.version;
+            notify(msg.topic, msg.delta);
+        });
+
+        return socket;
+    }
+
+    function subscribe(topic, handler) {
+        const isNew = !handlers[topic];
+        handlers[topic] = handlers[topic] || [];
+        handlers[topic].push(handler);
+
+        if (state[topic] !== undefined) {
+            handler(state[topic], null);
+        }
+        const s = connect();
+        if (isNew && s.connected) {
+            s.emit('subscribe', { topics: [topic], versions: known() });
+        }
+        return s;
+    }
+
+    window.DEMTopics = {
+        connect: connect,
+        subscribe: subscribe,
+        applyPatch: applyPatch,
+        get: (topic) => state[topic],
+        version: (topic) => versions[topic]
+    };
+})();
@@ -0,0 +1,279 @@
+#!/usr/bin/env python
+"""
+Publicación por temas para los clientes Socket.IO.
+
+Cada tema (stats, game_status, runs, vision, visualizations) tiene una sala,
+una versión y la última instantánea publicada. Al publicar solo se envía a los
+suscriptores la diferencia con la versión anterior en formato JSON Merge Patch
+(RFC 7396): las claves nuevas o modificadas llevan su valor y las eliminadas
+llevan null.
+
+Eventos enviados al cliente:
+    topic_snapshot  {"topic", "epoch", "version", "data"}
+    topic_delta     {"topic", "epoch", "version", "base_version", "delta"}
+
+Las versiones vuelven a empezar en 0 al reiniciar el servidor, así que cada
+hub tiene una época (epoch) propia: un cliente que se suscribe con
+{"versions": {tema: {"epoch": ..., "version": n}}} solo recibe deltas si su
+época coincide con la actual; si no, recibe la instantánea completa.
+
+Con varios procesos (store: el estado compartido de shared_state) la época, la
+versión, la instantánea y el historial de cada tema se guardan en store, así
+que todos los procesos numeran igual las versiones y un cliente puede recibir
+deltas publicados por cualquiera de ellos. Sin message_queue cada proceso solo
+emite a sus clientes: forward() les envía lo que publicaron los demás.
+
+Si un cliente recibe un delta de otra época, o cuyo base_version no coincide
+con su versión, perdió mensajes y debe pedir 'resync' para recibir la
+instantánea completa.
+"""
+
+import copy
+import uuid
+import logging
+import threading
+from contextlib import contextmanager
+
+import json_encoding
+
+logger = logging.getLogger(__name__)
+
+TOPICS = ("stats", "game_status", "runs", "vision", "visualizations")
+HISTORY_SIZE = 50          # Deltas guardados por tema para ponerse al día sin instantánea
+LEGACY_ROOM = "legacy"     # Clientes sin suscripción: reciben data_updated y game_status_change completos
+STORE_LOCK_TTL = 10.0      # Cerrojo de un tema en el estado compartido mientras se publica
+STORE_LOCK_TIMEOUT = 5.0
+
+
+def room_name(topic):
+    return f"topic:{topic}"
+
+
+def diff(old, new):
+    """
+    Calcula el merge patch que transforma old en new (None si son iguales).
+    Los diccionarios se comparan recursivamente; el resto de valores se reemplaza.
+    """
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return None if old == new else copy.deepcopy(new)
+    patch = {}
+    for key, value in new.items():
+        if key not in old:
+            patch[key] = copy.deepcopy(value)
+        elif isinstance(value, dict) and isinstance(old[key], dict):
+            nested = diff(old[key], value)
+            if nested is not None:
+                patch[key] = nested
+        elif old[key] != value:
+            patch[key] = copy.deepcopy(value)
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch or None
+
+
+def apply_patch(target, patch):
+    """Aplica un merge patch y devuelve el resultado (no modifica target)"""
+    if not isinstance(patch, dict):
+        return copy.deepcopy(patch)
+    result = copy.deepcopy(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = apply_patch(result.get(key), value)
+    return result
+
+
+class TopicHub:
+    """Estado versionado de cada tema y envío de instantáneas y deltas"""
+
+    def __init__(self, socketio, topics=TOPICS, history_size=HISTORY_SIZE, store=None):
+        self.socketio = socketio
+        self.history_size = history_size
+        self.store = store
+        self._lock = threading.Lock()
+        self._state = {topic: {"version": 0, "data": None, "history": []} for topic in topics}
+        self.epoch = self._shared_epoch() if store is not None else uuid.uuid4().hex[:12]
+        self._emitted = {topic: self.version(topic) for topic in topics}   # última versión emitida aquí
+        self.stats = {"published": 0, "unchanged": 0, "snapshots_sent": 0, "deltas_sent": 0}
+
+    def _shared_epoch(self):
+        """Época común a todos los procesos que comparten store (la crea el primero)"""
+        epoch = self.store.get("topics:epoch")
+        if epoch is None:
+            with self.store.lock("topics:epoch", ttl=STORE_LOCK_TTL, timeout=STORE_LOCK_TIMEOUT):
+                epoch = self.store.get("topics:epoch")
+                if epoch is None:
+                    epoch = uuid.uuid4().hex[:12]
+                    self.store.set("topics:epoch", epoch)
+        return epoch
+
+    @property
+    def topics(self):
+        return tuple(self._state)
+
+    @contextmanager
+    def _locked(self, topic):
+        """Exclusión al publicar en el tema: local y, con store, entre procesos"""
+        with self._lock:
+            if self.store is None:
+                yield
+            else:
+                with self.store.lock(f"topic:{topic}", ttl=STORE_LOCK_TTL, timeout=STORE_LOCK_TIMEOUT):
+                    yield
+
+    def _read(self, topic):
+        """
+        {"version", "data", "history"} del tema: con store, una copia leída de él; si
+        no, el estado local, que publish() reemplaza entero y nunca modifica
+        """
+        if self.store is None:
+            return self._state[topic]
+        return self.store.get(f"topic:{topic}") or {"version": 0, "data": None, "history": []}
+
+    def version(self, topic):
+        if self.store is None:
+            return self._state[topic]["version"]
+        return self.store.counter(f"topic:{topic}")
+
+    def snapshot(self, topic):
+        """Devuelve (versión, datos) del tema"""
+        state = self._read(topic)
+        return state["version"], state["data"]
+
+    def publish(self, topic, data):
+        """
+        Publica una nueva instantánea del tema. Solo se emite el delta respecto a
+        la anterior; si no hay cambios no se emite nada. Devuelve la versión nueva
+        o None si no hubo cambios.
+        """
+        if self.store is not None:
+            # Lo que se guarda en store es JSON: comparar con la misma representación
+            data = json_encoding.loads(json_encoding.dumps(data))
+        try:
+            with self._locked(topic):
+                state = self._read(topic)
+                if state["data"] is None:
+                    delta = copy.deepcopy(data)
+                else:
+                    delta = diff(state["data"], data)
+                if delta is None:
+                    self.stats["unchanged"] += 1
+                    return None
+                base_version = state["version"]
+                version = base_version + 1
+                if self.store is not None:
+                    self.store.incr(f"topic:{topic}")
+                state = {"version": version, "data": copy.deepcopy(data),
+                         "history": (state["history"] + [(version, delta)])[-self.history_size:]}
+                if self.store is None:
+                    self._state[topic] = state
+                else:
+                    self.store.set(f"topic:{topic}", state)
+                self._emitted[topic] = version
+                self.stats["published"] += 1
+        except TimeoutError as e:
+            logger.error(f"No se pudo publicar el tema {topic}: {str(e)}")
+            return None
+
+        payload = {"topic": topic, "epoch": self.epoch, "version": version, "base_version": base_version,
+                   "delta": delta}
+        if base_version == 0:
+            # Primera publicación: los suscriptores aún no tienen estado
+            payload = {"topic": topic, "epoch": self.epoch, "version": version, "data": data}
+            self.socketio.emit('topic_snapshot', payload, room=room_name(topic))
+        else:
+            self.socketio.emit('topic_delta', payload, room=room_name(topic))
+        return version
+
+    def forward(self, topic):
+        """
+        Envía a la sala del tema, en este proceso, las versiones que publicaron
+        otros procesos desde la última que se emitió aquí (sin message_queue las
+        emisiones de un proceso solo llegan a sus clientes). Devuelve cuántos
+        mensajes envió.
+        """
+        emitted = self._emitted[topic]
+        if self.store is None or self.version(topic) == emitted:
+            return 0
+        messages = self.catch_up(topic, emitted, self.epoch)
+        if not messages:
+            return 0
+        with self._lock:
+            self._emitted[topic] = max(self._emitted[topic], messages[-1][1]["version"])
+        for event, payload in messages:
+            self.socketio.emit(event, payload, room=room_name(topic))
+        return len(messages)
+
+    def catch_up(self, topic, known_version, known_epoch=None):
+        """
+        Mensajes para llevar a un cliente desde known_version (de la época known_epoch)
+        a la versión actual: una lista de deltas si están en el historial, o una
+        instantánea. Una versión de otra época no sirve de base: instantánea.
+        """
+        state = self._read(topic)
+        if state["data"] is None:
+            return []
+        if known_epoch != self.epoch:
+            known_version = None
+        if known_version == state["version"]:
+            return []
+        history = state["history"]
+        if known_version and history and history[0][0] <= known_version + 1 <= state["version"]:
+            messages = []
+            base = known_version
+            for version, delta in history:
+                if version > known_version:
+                    messages.append(('topic_delta', {"topic": topic, "epoch": self.epoch, "version": version,
+                                                     "base_version": base, "delta": delta}))
+                    base = version
+            return messages
+        return [('topic_snapshot', {"topic": topic, "epoch": self.epoch, "version": state["version"],
+                                    "data": state["data"]})]
+
+    def subscribe(self, sid, topics, versions=None, join_room=None, leave_room=None):
+        """
+        Suscribe al cliente a los temas indicados y le envía lo necesario para
+        sincronizarse (deltas pendientes o instantánea). versions: {tema: {"epoch",
+        "version"}} de lo que ya tiene el cliente. Devuelve los temas aceptados.
+        join_room / leave_room son las funciones de flask_socketio.
+        """
+        versions = versions or {}
+        accepted = [topic for topic in topics if topic in self._state]
+        if leave_room is not None:
+            leave_room(LEGACY_ROOM, sid=sid)
+        for topic in accepted:
+            if join_room is not None:
+                join_room(room_name(topic), sid=sid)
+            self._send(sid, self.catch_up(topic, *_known_version(versions.get(topic))))
+        return accepted
+
+    def unsubscribe(self, sid, topics, leave_room):
+        for topic in topics:
+            if topic in self._state:
+                leave_room(room_name(topic), sid=sid)
+
+    def resync(self, sid, topic):
+        """Envía la instantánea completa del tema a un cliente que detectó un hueco"""
+        if topic in self._state:
+            self._send(sid, self.catch_up(topic, None))
+
+    def _send(self, sid, messages):
+        for event, payload in messages:
+            self.socketio.emit(event, payload, room=sid)
+            self.stats["snapshots_sent" if event == 'topic_snapshot' else "deltas_sent"] += 1
+
+
+def _as_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _known_version(value):
+    """(versión, época) que indica un cliente; un número sin época no se puede comprobar"""
+    if isinstance(value, dict):
+        return _as_int(value.get("version")), value.get("epoch")
+    return None, None
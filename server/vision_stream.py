@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""
+Transmisión MJPEG (multipart/x-mixed-replace) de los frames del sistema de visión.
+
+FrameBuffer guarda solo el último frame publicado, codificado en JPEG una
+única vez al publicarlo, con un número de secuencia. Cada cliente de
+stream() espera a un frame posterior al último que recibió: si el cliente
+es lento (o max_fps lo limita), los frames intermedios no se le envían, se
+cuentan como descartados y recibe directamente el más reciente. No se
+escribe nada en disco ni se encola nada por cliente.
+
+Los frames se publican como JPEG ya codificado (lo que envía el sistema de
+visión) o como imagen RGB (array de NumPy o imagen de Pillow), que se
+codifica con la calidad configurada. Pillow solo hace falta para esto último.
+"""
+
+import io
+import time
+import logging
+import threading
+from importlib.util import find_spec
+
+import metrics
+
+logger = logging.getLogger(__name__)
+
+HAS_PILLOW = find_spec("PIL") is not None
+
+DEFAULT_QUALITY = 75
+DEFAULT_MAX_FPS = 10
+KEEPALIVE_SECONDS = 10.0  # Reenvío del último frame si no hay nuevos (detecta clientes desconectados)
+BOUNDARY = "frame"
+JPEG_MAGIC = b"\xff\xd8"
+
+FRAME_WIDTH = 800
+FRAME_HEIGHT = 600
+
+
+class Frame:
+    """Frame publicado: secuencia, JPEG y momento de publicación"""
+    __slots__ = ("seq", "jpeg", "timestamp")
+
+    def __init__(self, seq, jpeg, timestamp):
+        self.seq = seq
+        self.jpeg = jpeg
+        self.timestamp = timestamp
+
+
+def encode_jpeg(image, quality=DEFAULT_QUALITY):
+    """JPEG de una imagen RGB (array HxWx3 uint8 o imagen de Pillow) o de otra imagen codificada (PNG...)"""
+    if not HAS_PILLOW:
+        raise RuntimeError("Pillow no está instalado: solo se pueden publicar frames JPEG")
+    from PIL import Image
+    if isinstance(image, (bytes, bytearray)):
+        image = Image.open(io.BytesIO(image))
+    elif not isinstance(image, Image.Image):
+        image = Image.fromarray(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+
+class FrameBuffer:
+    """Último frame del sistema de visión y los clientes que lo transmiten"""
+
+    def __init__(self, quality=DEFAULT_QUALITY, max_fps=DEFAULT_MAX_FPS):
+        self.quality = quality
+        self.max_fps = max_fps
+        self._condition = threading.Condition()
+        self._frame = None
+        self.clients = 0
+        self.stats = {"published": 0, "sent": 0, "dropped": 0}
+
+    def configure(self, quality=None, max_fps=None):
+        if quality is not None:
+            self.quality = quality
+        if max_fps is not None:
+            self.max_fps = max_fps
+
+    def publish(self, image):
+        """Publica un frame (JPEG o imagen a codificar) y despierta a los clientes; devuelve su secuencia"""
+        if isinstance(image, (bytes, bytearray)) and image[:2] == JPEG_MAGIC:
+            jpeg = bytes(image)
+        else:
+            jpeg = encode_jpeg(image, self.quality)
+        return self.publish_jpeg(jpeg)
+
+    def publish_jpeg(self, jpeg):
+        with self._condition:
+            seq = self._frame.seq + 1 if self._frame is not None else 1
+            self._frame = Frame(seq, jpeg, time.time())
+            self.stats["published"] += 1
+            self._condition.notify_all()
+        metrics.VISION_FRAMES.inc(result="published")
+        return seq
+
+    def latest(self):
+        """Último frame publicado, o None"""
+        return self._frame
+
+    def wait(self, after_seq, timeout):
+        """Primer frame con secuencia mayor que after_seq (el último), o None si no llega en timeout"""
+        with self._condition:
+            self._condition.wait_for(lambda: self._frame is not None and self._frame.seq > after_seq, timeout)
+            frame = self._frame
+        return frame if frame is not None and frame.seq > after_seq else None
+
+    def stream(self, max_fps=None):
+        """
+        Generador de partes multipart/x-mixed-replace para un cliente: como mucho
+        max_fps frames por segundo (por defecto el del búfer) y siempre el más reciente
+        """
+        interval = 1.0 / (max_fps or self.max_fps)
+        last_seq = 0
+        next_send = 0.0
+        with self._condition:
+            self.clients += 1
+            metrics.VISION_STREAM_CLIENTS.set(self.clients)
+        try:
+            while True:
+                delay = next_send - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                frame = self.wait(last_seq, KEEPALIVE_SECONDS)
+                if frame is None:
+                    frame = self._frame
+                    if frame is None:
+                        continue
+                elif last_seq and frame.seq > last_seq + 1:
+                    dropped = frame.seq - last_seq - 1
+                    with self._condition:
+                        self.stats["dropped"] += dropped
+                    metrics.VISION_FRAMES.inc(dropped, result="dropped")
+                last_seq = frame.seq
+                next_send = time.monotonic() + interval
+                with self._condition:
+                    self.stats["sent"] += 1
+                metrics.VISION_FRAMES.inc(result="sent")
+                yield (f"--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n"
+                       f"Content-Length: {len(frame.jpeg)}\r\n\r\n").encode() + frame.jpeg + b"\r\n"
+        finally:
+            with self._condition:
+                self.clients -= 1
+                metrics.VISION_STREAM_CLIENTS.set(self.clients)
+
+    def status(self):
+        # Los contadores se cambian desde los hilos de cada cliente: se leen juntos
+        with self._condition:
+            frame = self._frame
+            clients = self.clients
+            stats = dict(self.stats)
+        return {
+            "clients": clients,
+            "quality": self.quality,
+            "max_fps": self.max_fps,
+            "last_seq": frame.seq if frame is not None else 0,
+            "last_frame_at": frame.timestamp if frame is not None else None,
+            "last_frame_bytes": len(frame.jpeg) if frame is not None else 0,
+            "encoder": "pillow" if HAS_PILLOW else None,
+            **stats,
+        }
+
+
+def simulated_frame(now=None, width=FRAME_WIDTH, height=FRAME_HEIGHT):
+    """
+    Frame RGB simulado (mientras no hay un sistema de visión real): jugador,
+    enemigos, un objeto y una puerta que se mueven con el tiempo
+    """
+    import numpy as np
+    now = time.time() if now is None else now
+    frame = np.zeros((height, width, 3), dtype=np.uint8)
+    yy, xx = np.ogrid[:height, :width]
+    scale = width / 8.0
+
+    def circle(x, y, radius, color):
+        # Coordenadas de la escena (8 x 6, origen abajo a la izquierda)
+        cx, cy = x * scale, height - y * scale
+        frame[(xx - cx) ** 2 + (yy - cy) ** 2 <= radius ** 2] = color
+
+    circle(4 + 0.5 * np.sin(now), 3 + 0.3 * np.cos(now * 1.5), 15, (0, 255, 0))
+    circle(2 + 0.7 * np.sin(now * 0.7), 2 + 0.7 * np.cos(now * 0.5), 12, (255, 0, 0))
+    circle(6 + 0.5 * np.sin(now * 0.5), 4 + 0.6 * np.cos(now * 0.7), 12, (255, 0, 0))
+    circle(3.5 + 0.3 * np.sin(now * 0.3), 5 + 0.2 * np.cos(now * 0.3), 8, (0, 255, 255))
+    door_top, door_bottom = int(height - 3.5 * scale), int(height - 2.5 * scale)
+    frame[door_top:door_bottom, int(width - 0.5 * scale):] = (255, 255, 0)
+    return frame
@@ -9,6 +9,7 @@ import logging
 import json
 import argparse
 import threading
+import urllib.request
 import cv2
 import numpy as np
 from pathlib import Path
@@ -73,6 +74,10 @@ class IsaacVisionSystem:
         self.web_frame_path = os.path.join(self.web_output_dir, 'current_frame.jpg')
         self.web_data_path = os.path.join(self.web_output_dir, 'detection_data.json')
         
+        # URL del servidor para publicar los frames en memoria (transmisión MJPEG) en lugar de en disco
+        self.publish_url = self.config.get('publish_url')
+        self.jpeg_quality = self.config.get('jpeg_quality', 75)
+        
         # Crear directorio de templates si no existe
         templates_dir = Path("./vision_module/templates")
         if not templates_dir.exists():
@@ -92,6 +97,8 @@ class IsaacVisionSystem:
             'training_mode': False,  # Modo entrenamiento vs. inferencia
             'detection_frequency': 0.1,  # Segundos entre detecciones
             'web_output_dir': './server/static/vision_output',  # Directorio para salida web
+            'publish_url': None,  # p. ej. http://localhost:5000/api/vision/frame
+            'jpeg_quality': 75,  # Calidad de los frames publicados
             'agent': {
                 'exploration_rate': 0.2,  # Tasa de exploración del agente
                 'model_path': None  # Ruta al modelo pre-entrenado
@@ -204,7 +211,7 @@ class IsaacVisionSystem:
             # Guardar frame (con anotaciones si hay resultados)
             if detection_results:
                 annotated_frame = draw_detection_results(frame, detection_results)
-                cv2.imwrite(self.web_frame_path, annotated_frame)
+                self._write_frame(annotated_frame)
                 
                 # Guardar datos de detección como JSON
                 web_data = {
@@ -221,10 +228,28 @@ class IsaacVisionSystem:
                     json.dump(web_data, f)
             else:
                 # Guardar frame sin anotaciones
-                cv2.imwrite(self.web_frame_path, frame)
+                self._write_frame(frame)
         except Exception as e:
             logger.error(f"Error al guardar salida web: {e}")
     
+    def _write_frame(self, frame):
+        """
+        Publica el frame en el servidor (JPEG codificado una vez, sin tocar el disco)
+        si hay publish_url; si no, lo guarda en web_frame_path
+        """
+        if not self.publish_url:
+            cv2.imwrite(self.web_frame_path, frame)
+            return
+        ok, jpeg = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        if not ok:
+            logger.warning("No se pudo codificar el frame en JPEG")
+            return
+        request = urllib.request.Request(self.publish_url, data=jpeg.tobytes(),
+                                         headers={'Content-Type': 'image/jpeg'}, method='POST')
+        # Tiempo de espera corto: un servidor lento no debe frenar la captura
+        with urllib.request.urlopen(request, timeout=0.5):
+            pass
+    
     def main_loop(self):
         """Bucle principal del sistema de visión"""
         logger.info("Iniciando bucle principal del sistema de visión")